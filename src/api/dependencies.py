@@ -3,9 +3,18 @@ API依赖注入管理
 """
 from pathlib import Path
 import os
+import threading
 from src.core.config_manager import ConfigManager
 from src.services.emotion_analyzer import MultiModelEmotionAnalyzer
 from src.services.emotion_analyzer import ImageEmotionAnalyzerService
+from src.services.image_service import ImageService
+
+# 分析器在 worker 进程内复用：模型由注册表共享，Ark 客户端也不必每个请求重建
+_instances_lock = threading.Lock()
+_emotion_analyzer = None
+_image_emotion_analyzer = None
+_image_service = None
+
 def get_config_manager():
     """获取配置管理器实例"""
     # 使用更稳定的路径查找方式
@@ -15,11 +24,34 @@ def get_config_manager():
     return ConfigManager(str(config_path))
 
 def get_emotion_analyzer():
-    """获取情感分析器实例"""
-    config_manager = get_config_manager()
-    return MultiModelEmotionAnalyzer(config_manager)
+    """获取情感分析器实例（进程内单例）"""
+    global _emotion_analyzer
+    if _emotion_analyzer is None:
+        with _instances_lock:
+            if _emotion_analyzer is None:
+                _emotion_analyzer = MultiModelEmotionAnalyzer(get_config_manager())
+    return _emotion_analyzer
 
 def get_image_emotion_analyzer():
-    """获取图像情感分析器实例"""
-    config_manager = get_config_manager()
-    return ImageEmotionAnalyzerService(config_manager)
+    """获取图像情感分析器实例（进程内单例）"""
+    global _image_emotion_analyzer
+    if _image_emotion_analyzer is None:
+        with _instances_lock:
+            if _image_emotion_analyzer is None:
+                _image_emotion_analyzer = ImageEmotionAnalyzerService(get_config_manager())
+    return _image_emotion_analyzer
+
+def get_image_service():
+    """获取图片服务实例（进程内单例）"""
+    global _image_service
+    if _image_service is None:
+        with _instances_lock:
+            if _image_service is None:
+                _image_service = ImageService(get_config_manager())
+    return _image_service
+
+def purge_image_batch_results() -> int:
+    """清理过期的批量编辑结果记录（随任务队列维护定期调用；图片服务尚未创建时跳过）"""
+    if _image_service is None:
+        return 0
+    return _image_service.purge_batch_results()
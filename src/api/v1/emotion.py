@@ -1,20 +1,118 @@
 """
 情感分析API接口
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form, Body
-from typing import Optional
-from fastapi.responses import JSONResponse
-from pathlib import Path
+import asyncio
+import json
+import logging
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form, Body, WebSocket, WebSocketDisconnect
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from src.core.config_manager import ConfigManager
+from src.core.exceptions import ServiceUnavailableError, MoodCanvasError
+from src.core.executors import run_cpu
 from src.services.emotion_analyzer import MultiModelEmotionAnalyzer
 from src.services.emotion_analyzer import ImageEmotionAnalyzerService
-from src.utils.file_utils import save_upload_file
+from src.utils.audio_utils import TARGET_SAMPLE_RATE, pcm16_to_float32
+from src.utils.image_utils import ImageInput
+from src.utils.response_utils import service_unavailable_exception, format_sse_event, SSE_KEEPALIVE
 from src.api.dependencies import get_config_manager, get_emotion_analyzer, get_image_emotion_analyzer
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/v1/emotion", tags=["emotion"])
 
 
+async def _gather_branches(
+    branches: Dict[str, Awaitable[Any]],
+    timeouts: Dict[str, float]
+) -> Tuple[Dict[str, Any], Dict[str, BaseException]]:
+    """
+    并发执行各模态分支，每个分支有独立超时
+
+    Returns:
+        (成功分支结果, 失败分支异常)；超时的分支记为 asyncio.TimeoutError
+    """
+    names = list(branches)
+    outcomes = await asyncio.gather(
+        *(asyncio.wait_for(branches[name], timeout=timeouts.get(name) or None) for name in names),
+        return_exceptions=True
+    )
+    results: Dict[str, Any] = {}
+    errors: Dict[str, BaseException] = {}
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, BaseException):
+            errors[name] = outcome
+        else:
+            results[name] = outcome
+    return results, errors
+
+
+def _describe_branch_error(error: BaseException) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "超时"
+    return getattr(error, "message", None) or str(error) or error.__class__.__name__
+
+
+def _start_branches(
+    analyzer: MultiModelEmotionAnalyzer,
+    image_analyzer: ImageEmotionAnalyzerService,
+    image: Optional[ImageInput],
+    audio_bytes: Optional[bytes],
+    text: Optional[str]
+) -> Dict[str, Awaitable[Any]]:
+    """按提供的输入构造各模态分支（尚未开始执行）"""
+    branches: Dict[str, Awaitable[Any]] = {}
+    # 图片处理（在内存中校验与编码，生成阶段的 i2i 复用同一个 ImageInput）
+    if image is not None:
+        branches["image_content"] = image_analyzer.analyze_image_bytes(image, intent = "情感分析，表现力更强，同时真实生动", style_preset = "小红书plog风格") #在这里调用了豆包图片分析模型
+    # 语音处理（在内存中解码，不落盘）
+    if audio_bytes:
+        branches["audio"] = analyzer.run_three_stage_analysis(audio_bytes)
+    # 文字处理
+    if text:
+        branches["text"] = analyzer.run_text_emotion_analysis(text)
+    return branches
+
+
+def _branch_payload(name: str, outcome: Any) -> Any:
+    """分支结果中参与后续合并 / 返回的部分"""
+    if name == "image_content":
+        return outcome.get("analysis", {})
+    return outcome
+
+
+def _merge_emotion_tags(result: Dict[str, Any]) -> List[str]:
+    """合并各模态情感标签（去重）"""
+    emotion_tags = []
+    if "image_content" in result and "styles" in result["image_content"]:
+        emotion_tags += result["image_content"].get("styles", [])
+    if "audio" in result and "emotion_analysis" in result["audio"]:
+        emotion_tags += result["audio"]["emotion_analysis"].get("merged_emotion", [])
+    if "text" in result and "emotion_analysis" in result["text"]:
+        emotion_tags += result["text"]["emotion_analysis"].get("text_emotion", [])
+    # 去重
+    return list(set(emotion_tags))
+
+
+def _build_generation_input(result: Dict[str, Any], text: Optional[str]) -> str:
+    """构造生成文案和图片的输入"""
+    # 优先用文字，否则用语音转文字，否则用图片caption
+    # input_text = text or (result.get("audio", {}).get("transcribed_text")) or (result.get("image_content", {}).get("caption")) or ""
+    image_content = result.get('image_content', {})
+    return (
+        f"图片内容描述：{image_content.get('caption', {})}。\n"
+        f"图片关键对象及其属性: {image_content.get('objects', {})}。\n"
+        f"图片风格标签： {image_content.get('styles', {})}。\n"
+        f"图片主要色调: {image_content.get('colors', {})}。\n"
+        f"图片修改该建议：{image_content.get('suggestions', {})}。\n"
+        f"图片编辑提示词：{image_content.get('edit_prompt', {})}。\n"
+        f"图片负面提示词：{image_content.get('negative_prompt', {})}。\n"
+        f"用户当前情绪抒发（语音转文字）：{result.get('audio', {}).get('transcribed_text', '')}。\n"
+        f"用户内心想法或创意（文字输入）：{text or ''}"
+    )
+
+
 # 新增统一入口，支持 image/text/audio 三者任意组合
 @router.post("/analyze_multi")
 async def analyze_multi(
@@ -27,65 +125,44 @@ async def analyze_multi(
 ):
     """
     多模态情感分析：图片、文字、语音三者任意组合，自动跳过缺失项，合并结果后生成文案和图片。
+
+    三个分支相互独立，并发执行，各自有超时（config.json 中 multimodal.branch_timeouts_seconds）。
+    multimodal.partial_results 为 true 时，失败或超时的分支记入 branch_errors，其余分支照常参与生成；
+    为 false 时任一分支失败即整体失败。
     """
     result = {}
+    multimodal_conf = config_manager.config.get("multimodal", {})
+    timeouts = multimodal_conf.get("branch_timeouts_seconds", {})
+    allow_partial = multimodal_conf.get("partial_results", True)
     try:
-        # 图片处理
-        if image_file:
-            temp_dir = Path(config_manager.config["paths"].get("temp_dir", "data/temp"))
-            image_path = save_upload_file(image_file, temp_dir, "emotion_analysis")
-            image_result = image_analyzer.analyze_image_path(str(image_path), intent = "情感分析，表现力更强，同时真实生动", style_preset = "小红书plog风格") #在这里调用了豆包图片分析模型
-            result["image_content"] = image_result.get("analysis", {})
-            
-        # 语音处理
-        if audio_file:
-            temp_dir = Path(config_manager.config["paths"].get("temp_dir", "data/temp"))
-            audio_path = save_upload_file(audio_file, temp_dir, "emotion_analysis")
-            audio_result = await analyzer.run_three_stage_analysis(str(audio_path))
-            result["audio"] = audio_result
-        # 文字处理
-        if text:
-            text_result = await analyzer.run_text_emotion_analysis(text)
-            result["text"] = text_result
-        # 合并情感标签
-        emotion_tags = []
-        if "image_content" in result and "styles" in result["image_content"]:
-            emotion_tags += result["image_content"].get("styles", [])
-        if "audio" in result and "emotion_analysis" in result["audio"]:
-            emotion_tags += result["audio"]["emotion_analysis"].get("merged_emotion", [])
-        if "text" in result and "emotion_analysis" in result["text"]:
-            emotion_tags += result["text"]["emotion_analysis"].get("text_emotion", [])
-        # 去重
-        emotion_tags = list(set(emotion_tags))
-        # 构造生成文案和图片的输入
+        image = ImageInput(await image_file.read(), filename=image_file.filename) if image_file else None
+        audio_bytes = await audio_file.read() if audio_file else None
+        branches = _start_branches(analyzer, image_analyzer, image, audio_bytes, text)
+        if not branches:
+            raise HTTPException(status_code=400, detail="请至少提供图片、文字、语音中的一种")
+
+        branch_results, branch_errors = await _gather_branches(branches, timeouts)
+        for name, error in branch_errors.items():
+            logger.warning(f"analyze_multi 分支 {name} 失败: {_describe_branch_error(error)}")
+        if branch_errors and (not allow_partial or not branch_results):
+            # 不允许部分结果，或所有分支都失败：以第一个失败分支的异常作为整体结果
+            name, error = next(iter(branch_errors.items()))
+            if isinstance(error, asyncio.TimeoutError):
+                raise HTTPException(status_code=504, detail=f"{name} 分析超时")
+            raise error
+
+        for name, outcome in branch_results.items():
+            result[name] = _branch_payload(name, outcome)
+        emotion_tags = _merge_emotion_tags(result)
         gen_text = None
         gen_image_url = None
-        # 优先用文字，否则用语音转文字，否则用图片caption
-        # input_text = text or (result.get("audio", {}).get("transcribed_text")) or (result.get("image_content", {}).get("caption")) or ""
-        image_content = result.get('image_content', {})
-        
-        input_text = (
-            f"图片内容描述：{image_content.get('caption', {})}。\n"
-            f"图片关键对象及其属性: {image_content.get('objects', {})}。\n"
-            f"图片风格标签： {image_content.get('styles', {})}。\n"
-            f"图片主要色调: {image_content.get('colors', {})}。\n"
-            f"图片修改该建议：{image_content.get('suggestions', {})}。\n"
-            f"图片编辑提示词：{image_content.get('edit_prompt', {})}。\n"
-            f"图片负面提示词：{image_content.get('negative_prompt', {})}。\n"
-            f"用户当前情绪抒发（语音转文字）：{result.get('audio', {}).get('transcribed_text', '')}。\n"
-            f"用户内心想法或创意（文字输入）：{text or ''}"
-        )
+        input_text = _build_generation_input(result, text)
         # # 生成文案和图片（调用已有生成内容方法）
         if input_text:
-            gen_content = await analyzer.generate_content(input_text, emotion_tags, image_content, image_path)
+            gen_content = await analyzer.generate_content(input_text, emotion_tags, result.get('image_content', {}), image)
             gen_text = gen_content.get("text")
             gen_image_url = gen_content.get("image_url")
 
-
-        # 清理临时文件
-        image_path.unlink()
-
-
         # 返回结构
         return JSONResponse(content={
             "image_content": result.get("image_content"),
@@ -93,11 +170,184 @@ async def analyze_multi(
             "text": result.get("text"),
             "emotion_tags": emotion_tags,
             "generated_text": gen_text,
-            "generated_image_url": gen_image_url
+            "generated_image_url": gen_image_url,
+            "branch_errors": {name: _describe_branch_error(e) for name, e in branch_errors.items()}
         })
+    except HTTPException:
+        raise
+    except ServiceUnavailableError as e:
+        raise service_unavailable_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+async def _run_multi_pipeline(
+    emit: Callable[[str, Any], Awaitable[None]],
+    branches: Dict[str, Awaitable[Any]],
+    timeouts: Dict[str, float],
+    allow_partial: bool,
+    analyzer: MultiModelEmotionAnalyzer,
+    text: Optional[str],
+    image: Optional[ImageInput]
+) -> None:
+    """analyze_multi 的分阶段版本：每个阶段完成即通过 emit 推送"""
+    async def run_branch(name: str, branch: Awaitable[Any]) -> Tuple[str, Any, Optional[BaseException]]:
+        try:
+            return name, await asyncio.wait_for(branch, timeout=timeouts.get(name) or None), None
+        except Exception as e:
+            return name, None, e
+
+    result: Dict[str, Any] = {}
+    branch_errors: Dict[str, str] = {}
+    tasks = [asyncio.ensure_future(run_branch(name, branch)) for name, branch in branches.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            name, outcome, error = await next_done
+            if error is None:
+                result[name] = _branch_payload(name, outcome)
+                await emit(name, result[name])
+                continue
+            logger.warning(f"analyze_multi/stream 分支 {name} 失败: {_describe_branch_error(error)}")
+            branch_errors[name] = _describe_branch_error(error)
+            await emit("branch_error", {"branch": name, "error": branch_errors[name]})
+            if not allow_partial:
+                await emit("error", {"message": f"{name} 分析失败: {branch_errors[name]}"})
+                return
+    finally:
+        for task in tasks:
+            task.cancel()
+    if not result:
+        await emit("error", {"message": "所有分析分支均失败", "branch_errors": branch_errors})
+        return
+
+    emotion_tags = _merge_emotion_tags(result)
+    await emit("emotion_tags", emotion_tags)
+
+    input_text = _build_generation_input(result, text)
+    stream = analyzer.generate_content_stream(
+        input_text, emotion_tags, result.get("image_content", {}), image
+    )
+    try:
+        async for kind, value in stream:
+            if kind == "copy_delta":
+                await emit("copy_delta", {"text": value})
+            elif kind == "copy":
+                await emit("copy", {"text": value})
+            elif kind == "image":
+                await emit("image", {"image_url": value})
+    finally:
+        await stream.aclose()
+    await emit("done", {"emotion_tags": emotion_tags, "branch_errors": branch_errors})
+
+
+@router.post("/analyze_multi/stream")
+async def analyze_multi_stream(
+    image_file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    audio_file: Optional[UploadFile] = File(None),
+    config_manager: ConfigManager = Depends(get_config_manager),
+    analyzer: MultiModelEmotionAnalyzer = Depends(get_emotion_analyzer),
+    image_analyzer: ImageEmotionAnalyzerService = Depends(get_image_emotion_analyzer)
+):
+    """
+    多模态情感分析（SSE）：参数同 /analyze_multi，各阶段完成即推送事件
+
+    事件依次为：image_content / audio（含 transcribed_text）/ text（按完成先后）、branch_error、
+    emotion_tags、copy_delta（文案逐段）、copy、image、done；失败时推送 error 后结束。
+    空闲期间按 multimodal.sse_keepalive_seconds 发送注释行保活，避免代理超时断开。
+    """
+    multimodal_conf = config_manager.config.get("multimodal", {})
+    timeouts = multimodal_conf.get("branch_timeouts_seconds", {})
+    allow_partial = multimodal_conf.get("partial_results", True)
+    keepalive = float(multimodal_conf.get("sse_keepalive_seconds", 15)) or None
+
+    # 上传内容须在返回响应前读完
+    image = ImageInput(await image_file.read(), filename=image_file.filename) if image_file else None
+    audio_bytes = await audio_file.read() if audio_file else None
+    branches = _start_branches(analyzer, image_analyzer, image, audio_bytes, text)
+    if not branches:
+        raise HTTPException(status_code=400, detail="请至少提供图片、文字、语音中的一种")
+
+    async def event_stream() -> AsyncIterator[str]:
+        queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+        async def emit(event: str, data: Any) -> None:
+            await queue.put(format_sse_event(event, data))
+
+        async def produce() -> None:
+            try:
+                await _run_multi_pipeline(emit, branches, timeouts, allow_partial, analyzer, text, image)
+            except ServiceUnavailableError as e:
+                await emit("error", {"message": e.message, "status_code": 503, **e.details})
+            except Exception as e:
+                logger.error(f"analyze_multi/stream 失败: {e}", exc_info=True)
+                await emit("error", {"message": str(e)})
+            finally:
+                await queue.put(None)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield SSE_KEEPALIVE
+                    continue
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # 客户端断开时停止后续阶段
+            producer.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/generate_text/stream")
+async def generate_text_stream(
+    text: str = Body(..., embed=True),
+    emotion_tags: List[str] = Body([], embed=True),
+    style: Optional[str] = Body(None, embed=True),
+    image_content: Optional[str] = Body(None, embed=True),
+    analyzer: MultiModelEmotionAnalyzer = Depends(get_emotion_analyzer)
+):
+    """
+    流式文案生成：按 DeepSeek 返回的顺序逐段输出纯文本（text/plain），首个片段到达即开始响应
+
+    首个片段之前的失败返回 HTTP 错误；开始输出后的失败只记录日志并结束输出。
+    """
+    if not analyzer.text_generator:
+        raise HTTPException(status_code=503, detail="文案生成服务未初始化")
+    stream = analyzer.text_generator.stream_text(
+        text=text, emotion_tags=emotion_tags, style=style, image_content=image_content
+    )
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = ""
+    except Exception as e:
+        logger.error(f"流式文案生成失败: {e}")
+        raise HTTPException(status_code=502, detail=f"文案生成失败: {e}")
+
+    async def body() -> AsyncIterator[str]:
+        try:
+            yield first
+            async for delta in stream:
+                yield delta
+        except Exception as e:
+            logger.error(f"流式文案生成中断: {e}")
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/analyze_text")
 async def analyze_text_emotion(
     text: str = Body(..., embed=True),
@@ -117,7 +367,7 @@ async def analyze_text_emotion(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/analyze_image")
-def analyze_image_emotion(
+async def analyze_image_emotion(
     image_file: UploadFile = File(...),
     config_manager: ConfigManager = Depends(get_config_manager),
     analyzer: ImageEmotionAnalyzerService = Depends(get_image_emotion_analyzer)
@@ -127,19 +377,104 @@ def analyze_image_emotion(
     图像情感分析：图像情感 + 文案生成 + 图片编辑
     """
     try:
-        # 保存上传的图像文件
-        temp_dir = Path(config_manager.config["paths"].get("temp_dir", "data/temp"))
-        image_path = save_upload_file(image_file, temp_dir, "emotion_analysis")
+        # 上传的图片只在内存中解析一次，不落盘
+        image = ImageInput(await image_file.read(), filename=image_file.filename)
         # 运行图像情感分析
-        results = analyzer.analyze_image_path(str(image_path))
-        # 清理临时文件
-        image_path.unlink()
+        results = await analyzer.analyze_image_bytes(image)
         return JSONResponse(content=results)
+    except ServiceUnavailableError as e:
+        raise service_unavailable_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 
+@router.websocket("/stream")
+async def stream_audio_emotion(
+    websocket: WebSocket,
+    config_manager: ConfigManager = Depends(get_config_manager),
+    analyzer: MultiModelEmotionAnalyzer = Depends(get_emotion_analyzer)
+):
+    """
+    流式语音情感分析（WebSocket）
+
+    协议：
+      - 客户端发送二进制帧：16kHz、16bit 小端、单声道 PCM 分片（大小任意）
+      - 客户端发送文本帧 {"type": "end"}：录音结束；不是 JSON 对象的文本帧回复 error（code 400），连接保持
+      - 服务端推送 {"type": "partial", "text": 新增文字, "transcript": 目前完整转写}
+      - 结束后推送 {"type": "result", "data": 三阶段分析结果}（emotion2vec + 文本情感 + 融合），然后关闭
+      - 出错时推送 {"type": "error", "code", "message"} 后关闭
+    单次录音时长与空闲超时见 config.json 中 streaming 配置。
+    """
+    await websocket.accept()
+    streaming_conf = config_manager.config.get("streaming", {})
+    max_samples = int(float(streaming_conf.get("max_seconds", 120)) * TARGET_SAMPLE_RATE)
+    idle_timeout = float(streaming_conf.get("idle_timeout_seconds", 30)) or None
+
+    async def send_error(code: int, message: str, close_code: int, **extra: Any) -> None:
+        await websocket.send_json({"type": "error", "code": code, "message": message, **extra})
+        await websocket.close(code=close_code)
+
+    try:
+        session = analyzer.create_stream_session()
+    except MoodCanvasError as e:
+        await send_error(503, e.message, 1011)
+        return
+    await websocket.send_json({
+        "type": "ready",
+        "sample_rate": TARGET_SAMPLE_RATE,
+        "chunk_ms": session.model.chunk_stride * 1000 // TARGET_SAMPLE_RATE
+    })
+
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=idle_timeout)
+            except asyncio.TimeoutError:
+                await send_error(408, "等待音频超时", 1000)
+                return
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                samples = pcm16_to_float32(message["bytes"])
+                if session.num_samples + samples.shape[0] > max_samples:
+                    await send_error(413, f"录音时长超过上限 {streaming_conf.get('max_seconds', 120)} 秒", 1009)
+                    return
+                text = await run_cpu(session.feed, samples)
+                if text:
+                    await websocket.send_json({"type": "partial", "text": text, "transcript": session.transcript})
+                continue
+            try:
+                control = json.loads(message.get("text") or "{}")
+            except ValueError:
+                control = None
+            if not isinstance(control, dict):
+                # 无法识别的文本帧：提示协议错误，不中断本次录音
+                await websocket.send_json({"type": "error", "code": 400, "message": "文本帧须为 JSON 对象，如 {\"type\": \"end\"}"})
+                continue
+            if control.get("type") == "end":
+                break
+
+        text = await run_cpu(session.finish)
+        if text:
+            await websocket.send_json({"type": "partial", "text": text, "transcript": session.transcript})
+        if not session.transcript:
+            await send_error(422, "语音识别失败", 1000)
+            return
+        result = await analyzer.run_three_stage_analysis(session.waveform, transcript=session.transcript)
+        await websocket.send_json({"type": "result", "data": result})
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("流式语音分析：客户端断开连接")
+    except ServiceUnavailableError as e:
+        await send_error(503, e.message, 1013, retry_after_seconds=e.details.get("retry_after_seconds"))
+    except (MoodCanvasError, ValueError) as e:
+        await send_error(400, getattr(e, "message", None) or str(e), 1003)
+    except Exception as e:
+        logger.error(f"流式语音分析失败: {e}", exc_info=True)
+        await send_error(500, str(e), 1011)
+
+
 @router.get("/health")
 async def emotion_health():
     """情感分析服务健康检查"""
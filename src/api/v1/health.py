@@ -5,6 +5,8 @@ from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 import psutil
 import os
+from src.core.model_registry import get_model_registry
+from src.core.metrics import get_metrics
 
 router = APIRouter(prefix="/api/v1/health", tags=["health"])
 
@@ -92,10 +94,20 @@ async def models_health():
         
         return {
             "status": "ok",
-            "directories": dir_status
+            "directories": dir_status,
+            "registry": get_model_registry().snapshot()
         }
     except Exception as e:
         return {
             "status": "error",
             "error": str(e)
         }
+
+
+@router.get("/metrics")
+async def metrics_health():
+    """运行时指标（批处理、队列等）"""
+    return {
+        "status": "ok",
+        "metrics": get_metrics().snapshot()
+    }
@@ -2,22 +2,33 @@
 图像生成和编辑API接口
 """
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pathlib import Path
 import shutil
 import os
+import json
+import time
+import uuid
 from src.core.config_manager import ConfigManager
-from src.models.image.image2image import ImageEditor
 from pydantic import BaseModel
-from typing import Optional
-from src.models.image.text2image import ImageGenerator
-from src.api.dependencies import get_config_manager
+from typing import Optional, Dict, Any, List
+from src.api.dependencies import get_config_manager, get_image_service
+from src.core.exceptions import ServiceUnavailableError
+from src.core.job_queue import get_job_queue, JOB_QUEUED, JOB_SUCCEEDED, TERMINAL_STATUSES
+from src.services.image_jobs import run_generate, run_edit, JOB_GENERATE, JOB_EDIT
+from src.services.image_service import ImageService
+from src.utils.image_utils import ImageInput
+from src.utils.response_utils import (
+    service_unavailable_exception, create_processing_status_response,
+    format_sse_event, SSE_KEEPALIVE
+)
 
 router = APIRouter(prefix="/api/v1/images", tags=["images"])
 
 ALLOWED_SUFFIX = {".jpg", ".jpeg", ".png", ".webp"}
 
-def save_upload_temp(upload: UploadFile, tmp_dir: Path) -> Path:
+def save_upload_temp(upload: UploadFile, tmp_dir: Path, name: Optional[str] = None) -> Path:
+    """保存上传图片；name 为不含扩展名的文件名，缺省时按上传文件名命名"""
     try:
         # 确保临时目录存在
         tmp_dir.mkdir(parents=True, exist_ok=True)
@@ -32,8 +43,11 @@ def save_upload_temp(upload: UploadFile, tmp_dir: Path) -> Path:
             )
         
         # 创建安全的临时文件名
-        safe_filename = "".join(c for c in filename if c.isalnum() or c in ('.', '_', '-'))
-        tmp_path = tmp_dir / f"upload_{safe_filename}"
+        if name:
+            tmp_path = tmp_dir / f"{name}{suffix}"
+        else:
+            safe_filename = "".join(c for c in filename if c.isalnum() or c in ('.', '_', '-'))
+            tmp_path = tmp_dir / f"upload_{safe_filename}"
         
         # 保存上传文件
         try:
@@ -93,9 +107,6 @@ async def edit_image(
     - original_text：原始文字，与情感标签配合使用
     """
     try:
-        # 获取图像编辑器实例
-        editor = ImageEditor(config_manager)
-        
         src_path_or_url: str
 
         if image_url:
@@ -108,48 +119,23 @@ async def edit_image(
         else:
             raise HTTPException(status_code=400, detail="请提供 image 或 image_url")
 
-        # 构建增强的提示词
-        enhanced_prompt = prompt
-        if emotion_tags and original_text:
-            try:
-                emotion_list = emotion_tags.split(',') if ',' in emotion_tags else [emotion_tags]
-                emotion_desc = ", ".join(emotion_list)
-                enhanced_prompt = f"基于文字'{original_text}'和情感'{emotion_desc}'，{prompt}"
-            except Exception as e:
-                # 如果情感标签处理失败，使用原始提示词
-                pass
-
-        result = editor.edit_image(
-            src_path_or_url,
-            prompt=enhanced_prompt,
-            guidance_scale=guidance_scale,
-            size=size,
-            seed=seed,
-            watermark=watermark,
-            save_local=save_local
-        )
-
-        payload = {
-            "status": "succeeded", 
-            "outputs": [{
-                "remote_url": result["remote_url"], 
-                "prompt": enhanced_prompt,
-                "original_prompt": prompt,
-                "emotion_tags": emotion_tags,
-                "original_text": original_text
-            }]
-        }
-
-        if save_local and "local_path" in result:
-            gen_dir = Path(editor.out_dir)
-            static_prefix = "/static/generated"  # 默认静态文件前缀
-            rel = Path(result["local_path"]).resolve().relative_to(gen_dir.resolve())
-            url = f"{static_prefix}/{str(rel).replace('\\', '/')}"
-            payload["outputs"][0]["local_url"] = url
+        payload = await run_edit(config_manager, {
+            "source": src_path_or_url,
+            "prompt": prompt,
+            "emotion_tags": emotion_tags,
+            "original_text": original_text,
+            "guidance_scale": guidance_scale,
+            "size": size,
+            "seed": seed,
+            "watermark": watermark,
+            "save_local": save_local
+        })
 
         return JSONResponse(payload)
     except HTTPException:
         raise
+    except ServiceUnavailableError as e:
+        raise service_unavailable_exception(e)
     except Exception as e:
         # 确保异常信息可以被序列化
         error_detail = str(e)
@@ -164,36 +150,11 @@ async def generate_image(
     config_manager: ConfigManager = Depends(get_config_manager)
 ):
     try:
-        # 获取图像生成器实例
-        t2i_gen = ImageGenerator(config_manager)
-        
-        result = t2i_gen.generate(
-            prompt=req.prompt,
-            guidance_scale=req.guidance_scale,
-            size=req.size,
-            seed=req.seed,
-            num_images=req.num_images,
-            watermark=req.watermark,
-            save_local=req.save_local
-        )
-        payload = {"status": "succeeded", "outputs": []}
-
-        gen_dir = Path(t2i_gen.out_dir).resolve()
-        static_prefix = "/static/generated"  # 默认静态文件前缀
-
-        local_urls = []
-        if req.save_local and "local_paths" in result:
-            for lp in result["local_paths"]:
-                rel = Path(lp).resolve().relative_to(gen_dir)
-                local_urls.append(f"{static_prefix}/{str(rel).replace('\\', '/')}")
-
-        for i, rurl in enumerate(result["remote_urls"]):
-            item = {"remote_url": rurl, "prompt": req.prompt}
-            if local_urls:
-                item["local_url"] = local_urls[i]
-            payload["outputs"].append(item)
+        payload = await run_generate(config_manager, req.model_dump())
 
         return payload
+    except ServiceUnavailableError as e:
+        raise service_unavailable_exception(e)
     except Exception as e:
         # 确保异常信息可以被序列化
         error_detail = str(e)
@@ -222,9 +183,6 @@ async def reedit_image(
     - prompt：用户的文字提示词
     """
     try:
-        # 获取图像编辑器实例
-        editor = ImageEditor(config_manager)
-        
         src_path_or_url: str
 
         if image_url:
@@ -237,38 +195,233 @@ async def reedit_image(
         else:
             raise HTTPException(status_code=400, detail="请提供 image 或 image_url")
 
-        result = editor.edit_image(
-            src_path_or_url,
-            prompt=prompt,
-            guidance_scale=guidance_scale,
-            size=size,
-            seed=seed,
-            watermark=watermark,
-            save_local=save_local
-        )
-
-        payload = {
-            "status": "succeeded", 
-            "outputs": [{
-                "remote_url": result["remote_url"], 
-                "prompt": prompt,
-                "type": "reedit"
-            }]
-        }
-
-        if save_local and "local_path" in result:
-            gen_dir = Path(editor.out_dir)
-            static_prefix = "/static/generated"  # 默认静态文件前缀
-            rel = Path(result["local_path"]).resolve().relative_to(gen_dir.resolve())
-            url = f"{static_prefix}/{str(rel).replace('\\', '/')}"
-            payload["outputs"][0]["local_url"] = url
+        payload = await run_edit(config_manager, {
+            "mode": "reedit",
+            "source": src_path_or_url,
+            "prompt": prompt,
+            "guidance_scale": guidance_scale,
+            "size": size,
+            "seed": seed,
+            "watermark": watermark,
+            "save_local": save_local
+        })
 
         return JSONResponse(payload)
     except HTTPException:
         raise
+    except ServiceUnavailableError as e:
+        raise service_unavailable_exception(e)
     except Exception as e:
         # 确保异常信息可以被序列化
         error_detail = str(e)
         if "BufferedReader" in error_detail or "file object" in error_detail:
             error_detail = "图片重新编辑过程中发生错误，请检查输入参数"
         raise HTTPException(status_code=500, detail=error_detail)
+
+@router.post("/batch_edit")
+async def batch_edit_images(
+    images: List[UploadFile] = File(..., description="待编辑的图片，可被多个任务共用"),
+    tasks: str = Form(..., description="任务列表 JSON"),
+    config_manager: ConfigManager = Depends(get_config_manager),
+    image_service: ImageService = Depends(get_image_service)
+):
+    """
+    批量图片编辑接口：
+    - images：上传的图片（多个）
+    - tasks：JSON 数组，每项 {"task_id": "客户端任务ID", "prompt": "...", "image_index": 0,
+      "edit_style": null, "strength": 0.7, "preserve_original": true}；image_index 缺省为任务序号
+
+    子任务以有限并发执行、逐个落库；用相同 task_id 重试时已成功的子任务直接返回记录的结果。
+    """
+    try:
+        task_specs = json.loads(tasks)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"tasks 不是合法的 JSON: {e}")
+    if not isinstance(task_specs, list) or not task_specs:
+        raise HTTPException(status_code=400, detail="tasks 须为非空数组")
+    max_tasks = int(config_manager.config.get("batch_edit", {}).get("max_tasks", 32))
+    if len(task_specs) > max_tasks:
+        raise HTTPException(status_code=400, detail=f"单批最多 {max_tasks} 个任务")
+
+    # 每张图只解析一次，引用同一张图的多个任务共用
+    image_data = [ImageInput(await image.read(), filename=image.filename) for image in images]
+    edit_tasks = []
+    for i, spec in enumerate(task_specs):
+        if not isinstance(spec, dict) or not spec.get("prompt"):
+            raise HTTPException(status_code=400, detail=f"任务 {i+1} 缺少 prompt")
+        index = spec.get("image_index", i)
+        if not isinstance(index, int) or not 0 <= index < len(image_data):
+            raise HTTPException(status_code=400, detail=f"任务 {i+1} 的 image_index 无效: {index}")
+        task = {
+            "original_image_data": image_data[index],
+            "new_prompt": spec["prompt"],
+            "edit_style": spec.get("edit_style"),
+            "preserve_original": spec.get("preserve_original", True),
+            "strength": spec.get("strength", 0.7)
+        }
+        if spec.get("task_id") is not None:
+            task["task_id"] = str(spec["task_id"])
+        edit_tasks.append(task)
+
+    task_ids = [task["task_id"] for task in edit_tasks if "task_id" in task]
+    if len(task_ids) != len(set(task_ids)):
+        raise HTTPException(status_code=400, detail="同一批次内 task_id 不能重复")
+
+    try:
+        return JSONResponse(await image_service.batch_edit_images(edit_tasks))
+    except ServiceUnavailableError as e:
+        raise service_unavailable_exception(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ---------------------------------------------------------------------------
+# 异步任务接口：提交后立即返回 task_id，由任务队列的 worker 执行；
+# 客户端轮询 GET /jobs/{task_id} 或订阅 GET /jobs/{task_id}/events（SSE）获取结果
+# ---------------------------------------------------------------------------
+
+def _job_status_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """任务记录 -> 标准处理状态响应"""
+    status = job["status"]
+    return create_processing_status_response(
+        task_id=job["id"],
+        status=status,
+        progress=100 if status in TERMINAL_STATUSES else (0 if status == JOB_QUEUED else None),
+        result=job["result"] if status == JOB_SUCCEEDED else None,
+        error=job["error"]
+    )
+
+async def _submit_job(kind: str, params: Dict[str, Any], job_id: Optional[str] = None) -> JSONResponse:
+    queue = get_job_queue()
+    job_id = await queue.submit(kind, params, job_id)
+    job = await queue.get(job_id)
+    return JSONResponse(
+        _job_status_response(job),
+        status_code=202,
+        headers={"Location": f"{router.prefix}/jobs/{job_id}"}
+    )
+
+async def _submit_edit_job(
+    params: Dict[str, Any],
+    image: Optional[UploadFile],
+    image_url: Optional[str],
+    config_manager: ConfigManager
+) -> JSONResponse:
+    job_id = uuid.uuid4().hex
+    if image_url:
+        params["source"] = image_url
+    elif image:
+        # 上传文件按任务 ID 命名，任务结束后删除
+        tmp_dir = Path(config_manager.config["paths"].get("temp_dir", "data/temp")) / "jobs"
+        src = save_upload_temp(image, tmp_dir, name=job_id)
+        params["source"] = params["upload_path"] = str(src)
+    else:
+        raise HTTPException(status_code=400, detail="请提供 image 或 image_url")
+    try:
+        return await _submit_job(JOB_EDIT, params, job_id)
+    except Exception:
+        if params.get("upload_path"):
+            Path(params["upload_path"]).unlink(missing_ok=True)
+        raise
+
+@router.post("/jobs/generate", status_code=202)
+async def submit_generate_job(req: GenerateReq):
+    """异步文生图：参数同 /generate，返回 202 与任务状态"""
+    return await _submit_job(JOB_GENERATE, req.model_dump())
+
+@router.post("/jobs/edit", status_code=202)
+async def submit_edit_job(
+    prompt: str = Form(..., description="编辑提示词，描述要如何修改图片"),
+    image: UploadFile = File(None),
+    image_url: str | None = Form(None),
+    emotion_tags: str | None = Form(None),
+    original_text: str | None = Form(None),
+    guidance_scale: float | None = Form(None),
+    size: str | None = Form(None),
+    seed: int | None = Form(None),
+    watermark: bool | None = Form(None),
+    save_local: bool = Form(False),
+    config_manager: ConfigManager = Depends(get_config_manager)
+):
+    """异步图片编辑：参数同 /edit，返回 202 与任务状态"""
+    params = {
+        "prompt": prompt,
+        "emotion_tags": emotion_tags,
+        "original_text": original_text,
+        "guidance_scale": guidance_scale,
+        "size": size,
+        "seed": seed,
+        "watermark": watermark,
+        "save_local": save_local
+    }
+    return await _submit_edit_job(params, image, image_url, config_manager)
+
+@router.post("/jobs/reedit", status_code=202)
+async def submit_reedit_job(
+    prompt: str = Form(..., description="重新编辑提示词，描述要如何修改图片"),
+    image: UploadFile = File(None),
+    image_url: str | None = Form(None),
+    guidance_scale: float | None = Form(None),
+    size: str | None = Form(None),
+    seed: int | None = Form(None),
+    watermark: bool | None = Form(None),
+    save_local: bool = Form(False),
+    config_manager: ConfigManager = Depends(get_config_manager)
+):
+    """异步重新编辑：参数同 /reedit，返回 202 与任务状态"""
+    params = {
+        "mode": "reedit",
+        "prompt": prompt,
+        "guidance_scale": guidance_scale,
+        "size": size,
+        "seed": seed,
+        "watermark": watermark,
+        "save_local": save_local
+    }
+    return await _submit_edit_job(params, image, image_url, config_manager)
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """查询任务状态；成功时 data.result 为与同步接口相同的响应体，失败时 data.error 为原因"""
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return _job_status_response(job)
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    config_manager: ConfigManager = Depends(get_config_manager)
+):
+    """订阅任务状态（SSE）：每次状态变化推送一条 status 事件，任务结束后关闭"""
+    queue = get_job_queue()
+    job = await queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    # 其他进程的 worker 完成的任务不会触发本进程的通知，按轮询间隔重新查询
+    poll_interval = float(queue.settings["poll_interval_seconds"])
+    keepalive = float(config_manager.config.get("multimodal", {}).get("sse_keepalive_seconds", 15))
+
+    async def event_stream():
+        current = job
+        last_status = None
+        # 按实际经过的时间计算空闲：wait_for_change 在状态变化时会提前返回
+        last_sent = time.monotonic()
+        while current is not None:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                last_sent = time.monotonic()
+                yield format_sse_event("status", _job_status_response(current)["data"])
+                if last_status in TERMINAL_STATUSES:
+                    return
+            elif keepalive and time.monotonic() - last_sent >= keepalive:
+                last_sent = time.monotonic()
+                yield SSE_KEEPALIVE
+            await queue.wait_for_change(job_id, poll_interval)
+            current = await queue.get(job_id)
+        yield format_sse_event("error", {"message": "任务不存在或已过期"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,24 @@
+"""
+已发布图片的签名下载API（供 Ark 下载 i2i 源图）
+"""
+import time
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from src.core.publication import PUBLISHED_URL_PREFIX, get_publication_store
+
+router = APIRouter(prefix=PUBLISHED_URL_PREFIX, tags=["published"])
+
+
+@router.get("/{name}")
+async def get_published(name: str, exp: int, sig: str):
+    """按签名 URL 返回已发布的图片；签名无效或已过期返回 403"""
+    store = get_publication_store()
+    if not store.verify(name, exp, sig):
+        raise HTTPException(status_code=403, detail="链接无效或已过期")
+    path = store.path_for(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    max_age = max(0, exp - int(time.time()))
+    return FileResponse(path, headers={"Cache-Control": f"private, max-age={max_age}"})
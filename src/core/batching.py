@@ -0,0 +1,194 @@
+"""
+动态微批处理
+
+把并发请求里的单条推理在很短的时间窗口内攒成一批，做一次批量前向，
+再把结果分发回各自的调用方。适用于 CPU 推理这类"批量开销远小于逐条开销"的场景。
+"""
+import math
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+from src.core.exceptions import ServiceUnavailableError
+from src.core.metrics import get_metrics, DEFAULT_BATCH_SIZE_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingItem:
+    """队列中等待处理的单条请求"""
+
+    __slots__ = ("item", "bucket", "future", "enqueued_at")
+
+    def __init__(self, item: Any, bucket: Hashable = None):
+        self.item = item
+        self.bucket = bucket
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    动态微批处理器
+
+    - 第一条请求到达后最多等待 max_wait_ms，期间到达的请求合并为一批
+    - 批大小达到 max_batch_size 时立即执行
+    - batch_fn 接收条目列表，返回等长的结果列表（顺序一一对应）
+    - bucket_fn（可选）把条目分到不同的桶，只有同桶条目才会合批（如按音频时长分桶以减少 padding）
+    - 准入控制（可选）：积压数超过 max_queue_size，或预计排队时间超过 max_queue_wait_ms（SLO）时，
+      submit 直接抛出 ServiceUnavailableError，而不是让请求在队列里无限等待
+    - 指标：<name>.batch_size / <name>.queue_wait_ms / <name>.batch_latency_ms / <name>.rejected
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        bucket_fn: Optional[Callable[[Any], Hashable]] = None,
+        max_queue_size: int = 0,
+        max_queue_wait_ms: float = 0.0
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.bucket_fn = bucket_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue[_PendingItem]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.max_queue_size = max(0, int(max_queue_size or 0))
+        self.max_queue_wait = max(0.0, float(max_queue_wait_ms or 0)) / 1000.0
+        # 已提交但尚未完成的请求数，以及批处理耗时的指数滑动平均（用于估算排队时间）
+        self._backlog = 0
+        self._backlog_lock = threading.Lock()
+        self._avg_batch_seconds = 0.0
+
+        metrics = get_metrics()
+        self._batch_size_hist = metrics.histogram(f"{name}.batch_size", DEFAULT_BATCH_SIZE_BUCKETS)
+        self._queue_wait_hist = metrics.histogram(f"{name}.queue_wait_ms")
+        self._batch_latency_hist = metrics.histogram(f"{name}.batch_latency_ms")
+        self._rejected = metrics.counter(f"{name}.rejected")
+        # 同名的多个批处理器（如不同设备上的同一模型）积压数求和；仪表只弱引用本实例
+        metrics.gauge(f"{name}.queue_depth", fn=self._queue_depth)
+
+    def _queue_depth(self) -> int:
+        return self._backlog
+
+    def estimated_wait_seconds(self, backlog: Optional[int] = None) -> float:
+        """按当前积压和最近的批处理耗时，估算新请求完成前需要等待的时间"""
+        backlog = self._backlog if backlog is None else backlog
+        batches_ahead = math.ceil((backlog + 1) / self.max_batch_size)
+        return batches_ahead * self._avg_batch_seconds + self.max_wait
+
+    def submit(self, item: Any) -> Future:
+        """
+        提交一条请求，返回 Future（result() 即该条的推理结果）
+
+        Raises:
+            ServiceUnavailableError: 队列已满或预计排队时间超过 SLO
+        """
+        self._ensure_worker()
+        pending = _PendingItem(item, self._bucket_of(item))
+        with self._backlog_lock:
+            self._admit()
+            self._backlog += 1
+        self._queue.put(pending)
+        return pending.future
+
+    def _admit(self) -> None:
+        """准入检查（持有 _backlog_lock 时调用）"""
+        if self.max_queue_size and self._backlog >= self.max_queue_size:
+            self._rejected.inc()
+            raise ServiceUnavailableError(
+                f"{self.name} 队列已满，请稍后重试",
+                details={"queue_depth": self._backlog, "max_queue_size": self.max_queue_size}
+            )
+        if self.max_queue_wait and self._avg_batch_seconds > 0:
+            estimated = self.estimated_wait_seconds(self._backlog)
+            if estimated > self.max_queue_wait:
+                self._rejected.inc()
+                raise ServiceUnavailableError(
+                    f"{self.name} 繁忙，预计等待 {estimated * 1000:.0f}ms 超过上限，请稍后重试",
+                    details={
+                        "queue_depth": self._backlog,
+                        "estimated_wait_ms": round(estimated * 1000, 1),
+                        "max_queue_wait_ms": round(self.max_queue_wait * 1000, 1),
+                        "retry_after_seconds": max(1, math.ceil(estimated))
+                    }
+                )
+
+    def _bucket_of(self, item: Any) -> Hashable:
+        if self.bucket_fn is None:
+            return None
+        try:
+            return self.bucket_fn(item)
+        except Exception as e:
+            logger.warning(f"{self.name} 分桶失败，归入默认桶: {e}")
+            return None
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        """
+        按桶攒批：某个桶攒满 max_batch_size 立即执行；
+        桶内最早的请求等待超过 max_wait_ms 时，不论是否攒满都执行
+        """
+        buckets: Dict[Hashable, List[_PendingItem]] = {}
+        while True:
+            timeout = None
+            if buckets:
+                oldest = min(items[0].enqueued_at for items in buckets.values())
+                timeout = max(0.0, oldest + self.max_wait - time.perf_counter())
+            try:
+                pending = self._queue.get(timeout=timeout)
+                items = buckets.setdefault(pending.bucket, [])
+                items.append(pending)
+                if len(items) >= self.max_batch_size:
+                    self._execute(buckets.pop(pending.bucket))
+                    continue
+            except queue.Empty:
+                pass
+
+            now = time.perf_counter()
+            for key in [k for k, items in buckets.items() if now - items[0].enqueued_at >= self.max_wait]:
+                self._execute(buckets.pop(key))
+
+    def _execute(self, batch: List[_PendingItem]) -> None:
+        started = time.perf_counter()
+        for pending in batch:
+            self._queue_wait_hist.observe((started - pending.enqueued_at) * 1000)
+        self._batch_size_hist.observe(len(batch))
+
+        try:
+            results = list(self.batch_fn([p.item for p in batch]))
+            if len(results) != len(batch):
+                raise RuntimeError(f"批处理结果数量不匹配: 期望 {len(batch)}，实际 {len(results)}")
+        except Exception as e:
+            logger.error(f"{self.name} 批处理失败（批大小 {len(batch)}）: {e}")
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        finally:
+            elapsed = time.perf_counter() - started
+            self._batch_latency_hist.observe(elapsed * 1000)
+            with self._backlog_lock:
+                self._backlog -= len(batch)
+                self._avg_batch_seconds = (
+                    elapsed if self._avg_batch_seconds == 0 else 0.8 * self._avg_batch_seconds + 0.2 * elapsed
+                )
+
+        for pending, result in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(result)
@@ -0,0 +1,360 @@
+"""
+结果缓存（内存 LRU + 磁盘 / SQLite，多级，按 TTL 过期）
+
+用于缓存慢速远程调用的结果（如豆包 VLM 图像理解、DeepSeek 文案生成）。缓存值须可 JSON 序列化。
+每个 TieredCache 导出 cache.<name>.hits / .misses / .hits.<tier> 指标。
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+import time
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """把若干字段拼成定长缓存键（sha256），字段顺序有意义"""
+    raw = "\x1f".join("" if p is None else str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def normalize_cache_text(text: str) -> str:
+    """用于缓存键的文本归一化：NFKC（全角转半角等）+ 合并空白"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+class MemoryCache:
+    """线程安全的内存 LRU 缓存，条目可带 TTL"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds or 0)
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def _expires_at(self, ttl: Optional[float]) -> float:
+        ttl = self.ttl_seconds if ttl is None else ttl
+        return time.time() + ttl if ttl and ttl > 0 else 0.0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (value, expires_at)，expires_at 为 0 表示不过期"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value, expires_at
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (self._expires_at(ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def scan(self) -> Iterator[Tuple[str, Any]]:
+        """遍历未过期的 (key, value)（调用时的快照）"""
+        now = time.time()
+        with self._lock:
+            items = [(k, v) for k, (expires_at, v) in self._data.items() if not expires_at or expires_at >= now]
+        return iter(items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    磁盘缓存：每个键一个 JSON 文件（按键前两位分目录），写入为原子替换
+
+    过期条目在读取时删除，也可调用 purge_expired() 批量清理。
+    """
+
+    name = "disk"
+
+    def __init__(self, directory: str, ttl_seconds: float = 0, purge_every: int = 256):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = float(ttl_seconds or 0)
+        self.purge_every = max(0, int(purge_every))
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (value, expires_at)，expires_at 为 0 表示不过期"""
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取磁盘缓存失败，已丢弃: {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        expires_at = entry.get("expires_at") or 0
+        if expires_at and expires_at < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return entry.get("value"), expires_at
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl is None else ttl
+        entry = {"expires_at": time.time() + ttl if ttl and ttl > 0 else 0, "value": value}
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception as e:
+            tmp.unlink(missing_ok=True)
+            logger.warning(f"写入磁盘缓存失败: {path}: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            purge = self.purge_every and self._writes % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def scan(self) -> Iterator[Tuple[str, Any]]:
+        """遍历未过期的 (key, value)，跳过读取失败的条目"""
+        now = time.time()
+        for path in self.directory.glob("*/*.json"):
+            try:
+                with path.open("r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except Exception:
+                continue
+            expires_at = entry.get("expires_at") or 0
+            if not expires_at or expires_at >= now:
+                yield path.stem, entry.get("value")
+
+    def purge_expired(self) -> int:
+        """删除所有已过期的条目，返回删除数量"""
+        now = time.time()
+        removed = 0
+        for path in self.directory.glob("*/*.json"):
+            try:
+                with path.open("r", encoding="utf-8") as f:
+                    expires_at = json.load(f).get("expires_at") or 0
+            except Exception:
+                expires_at = -1
+            if expires_at and expires_at < now:
+                path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logger.info(f"磁盘缓存清理过期条目 {removed} 个: {self.directory}")
+        return removed
+
+
+class SQLiteCache:
+    """
+    SQLite 缓存：单文件持久化，适合条目多、需要跨重启保留的场景
+
+    超过 max_entries（>0 时生效）时按最近写入时间淘汰最旧条目。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl_seconds: float = 0, max_entries: int = 0, purge_every: int = 256):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.ttl_seconds = float(ttl_seconds or 0)
+        self.max_entries = max(0, int(max_entries or 0))
+        self.purge_every = max(0, int(purge_every))
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_updated_at ON cache(updated_at)")
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (value, expires_at)，expires_at 为 0 表示不过期"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at and expires_at < time.time():
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+        return json.loads(value), expires_at
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl is None else ttl
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now + ttl if ttl and ttl > 0 else 0, now)
+            )
+            self._writes += 1
+            purge = self.purge_every and self._writes % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def scan(self, batch_size: int = 1000) -> Iterator[Tuple[str, Any]]:
+        """遍历未过期的 (key, value)；按 rowid 分批读取，不在整个遍历期间占用连接"""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, key, value FROM cache WHERE rowid > ? AND (expires_at = 0 OR expires_at >= ?) "
+                    "ORDER BY rowid LIMIT ?",
+                    (last_rowid, time.time(), batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for last_rowid, key, value in rows:
+                yield key, json.loads(value)
+
+    def purge_expired(self) -> int:
+        """删除过期条目，并把条目数裁剪到 max_entries，返回删除数量"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM cache WHERE expires_at > 0 AND expires_at < ?", (time.time(),)
+            ).rowcount
+            if self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    "SELECT key FROM cache ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                ).rowcount
+        if removed:
+            logger.info(f"SQLite 缓存清理条目 {removed} 个: {self.path}")
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """
+    多级缓存：按顺序查询各级，命中后以剩余有效期回填到更靠前的级别；写入时写所有级别
+    """
+
+    def __init__(self, name: str, tiers: List[Any]):
+        self.name = name
+        self.tiers = tiers
+        metrics = get_metrics()
+        self._hits = metrics.counter(f"cache.{name}.hits")
+        self._misses = metrics.counter(f"cache.{name}.misses")
+        self._tier_hits = {tier.name: metrics.counter(f"cache.{name}.hits.{tier.name}") for tier in tiers}
+
+    def get(self, key: str) -> Optional[Any]:
+        for i, tier in enumerate(self.tiers):
+            try:
+                entry = tier.get_entry(key)
+            except Exception as e:
+                logger.warning(f"缓存 {self.name}/{tier.name} 读取失败: {e}")
+                continue
+            if entry is not None and entry[0] is not None:
+                value, expires_at = entry
+                self._hits.inc()
+                self._tier_hits[tier.name].inc()
+                # 回填沿用下层条目的剩余有效期（0 表示不过期），不重新计满 TTL
+                ttl = expires_at - time.time() if expires_at else 0
+                if expires_at and ttl <= 0:
+                    return value
+                for upper in self.tiers[:i]:
+                    upper.set(key, value, ttl)
+                return value
+        self._misses.inc()
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        for tier in self.tiers:
+            try:
+                tier.set(key, value, ttl)
+            except Exception as e:
+                logger.warning(f"缓存 {self.name}/{tier.name} 写入失败: {e}")
+
+    def delete(self, key: str) -> None:
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def scan(self) -> Iterator[Tuple[str, Any]]:
+        """遍历最后一级（写入时写所有级别，最后一级是最完整的持久化级别）中未过期的 (key, value)"""
+        return self.tiers[-1].scan()
+
+
+def build_tiered_cache(name: str, settings: Optional[Dict[str, Any]]) -> Optional[TieredCache]:
+    """
+    按 config.json 中 cache.<name> 配置构建多级缓存，未启用时返回 None
+
+    Args:
+        settings: {"enabled", "ttl_seconds", "memory_max_entries", "disk_dir",
+                   "sqlite_path", "sqlite_max_entries"}（disk_dir / sqlite_path 均为空则只用内存）
+    """
+    settings = settings or {}
+    if not settings.get("enabled", False):
+        return None
+    ttl = float(settings.get("ttl_seconds", 0) or 0)
+    tiers: List[Any] = [MemoryCache(settings.get("memory_max_entries", 1024), ttl)]
+    if settings.get("disk_dir"):
+        tiers.append(DiskCache(settings["disk_dir"], ttl))
+    if settings.get("sqlite_path"):
+        tiers.append(SQLiteCache(settings["sqlite_path"], ttl, settings.get("sqlite_max_entries", 0)))
+    return TieredCache(name, tiers)
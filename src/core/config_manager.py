@@ -116,12 +116,90 @@ class ConfigManager:
                 "cache_models": True,
                 "batch_size": 1,
                 "granularity": "utterance",
-                "extract_embedding": False
+                "extract_embedding": False,
+                "pipelined_audio_analysis": False
             },
             "audio_files": {
                 "default": "test.wav",
                 "available": ["asr_example.wav", "hive-0001.wav", "test.wav"]
             },
+            "model_registry": {
+                "lazy_loading": False,
+                "idle_timeout_seconds": 0,
+                "memory_budget_mb": 0,
+                "reaper_interval_seconds": 60
+            },
+            "execution": {
+                "cpu_workers": 8,
+                "cpu_max_queue": 0,
+                "io_workers": 32,
+                "io_max_queue": 0
+            },
+            "http_client": {
+                "max_connections": 100,
+                "max_keepalive_connections": 20,
+                "keepalive_expiry_seconds": 30,
+                "per_host_limit": 16,
+                "host_limits": {},
+                "http2": True,
+                "timeouts": {"connect": 10, "read": 120, "write": 60, "pool": 30}
+            },
+            "image_preprocessing": {
+                "enabled": True,
+                "cache_max_entries": 256,
+                "targets": {
+                    "vlm": {"max_side": 1024, "format": "WEBP", "quality": 85},
+                    "i2i": {"max_side": 2048, "format": "JPEG", "quality": 90}
+                }
+            },
+            "publication": {
+                "root": "data/published",
+                "ttl_seconds": 900,
+                "sweep_interval_seconds": 300,
+                "secret": ""
+            },
+            "jobs": {
+                "db_path": "data/jobs/jobs.sqlite3",
+                "workers": 4,
+                "poll_interval_seconds": 1.0,
+                "lease_seconds": 60,
+                "max_attempts": 3,
+                "retention_hours": 24
+            },
+            "batch_edit": {
+                "max_concurrency": 4,
+                "max_tasks": 32,
+                "results_db": "data/jobs/batch_edit.sqlite3",
+                "retention_hours": 168
+            },
+            "streaming": {
+                "max_seconds": 120,
+                "idle_timeout_seconds": 30
+            },
+            "multimodal": {
+                "partial_results": True,
+                "sse_keepalive_seconds": 15,
+                "branch_timeouts_seconds": {"image_content": 60, "audio": 60, "text": 15}
+            },
+            "cache": {
+                "vlm": {
+                    "enabled": False,
+                    "ttl_seconds": 604800,
+                    "memory_max_entries": 512,
+                    "disk_dir": "data/cache/vlm",
+                    "perceptual": {"enabled": False, "max_distance": 6, "max_entries": 1000000}
+                },
+                "text_generation": {
+                    "enabled": False,
+                    "policy": "deterministic",
+                    "variants": 1,
+                    "ttl_seconds": 2592000,
+                    "memory_max_entries": 1024,
+                    "sqlite_path": "data/cache/text_generation.sqlite3",
+                    "sqlite_max_entries": 200000
+                },
+                "three_stage": {"enabled": False, "ttl_seconds": 3600, "memory_max_entries": 2048}
+            },
             "output_format": {
                 "include_timestamp": True,
                 "include_raw_data": True,
@@ -0,0 +1,196 @@
+"""
+阻塞调用的执行层
+
+async 接口里不能直接调用阻塞代码（本地模型推理、同步 HTTP 请求），否则一个慢调用
+会卡住整个 uvicorn worker 的事件循环。这里提供两个相互隔离的有界线程池：
+
+- cpu：本地模型推理（Paraformer / emotion2vec / 文本情感）。线程数即同时在途的推理请求数；
+  实际前向由各模型的微批处理线程执行，因此线程数应不小于批大小，批才攒得起来
+- io：阻塞 I/O（文件读写、同步 SDK 调用），线程数多，主要在等待；
+  豆包 / Ark 的远程调用已改用共享异步 HTTP 客户端（见 src/core/http_client.py），不占用此池
+
+两个池都可以限制排队长度，超过上限时抛出 ServiceUnavailableError；
+池的活跃线程、排队数、饱和度与排队/执行耗时通过 /api/v1/health/metrics 导出。
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from src.core.exceptions import ServiceUnavailableError
+from src.core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedExecutor:
+    """带排队上限和饱和度指标的线程池"""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = 0):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue or 0))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+
+        metrics = get_metrics()
+        prefix = f"executor.{name}"
+        self._submitted = metrics.counter(f"{prefix}.submitted")
+        self._rejected = metrics.counter(f"{prefix}.rejected")
+        self._queue_wait_hist = metrics.histogram(f"{prefix}.queue_wait_ms")
+        self._run_hist = metrics.histogram(f"{prefix}.run_ms")
+
+    def saturation(self) -> float:
+        """饱和度：(运行中 + 排队中) / 线程数，大于 1 表示已有任务在排队"""
+        return round((self._active + self._queued) / self.max_workers, 3)
+
+    def _wrap(self, fn: Callable[..., Any], enqueued_at: float) -> Callable[[], Any]:
+        def run() -> Any:
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            self._queue_wait_hist.observe((started - enqueued_at) * 1000)
+            try:
+                return fn()
+            finally:
+                with self._lock:
+                    self._active -= 1
+                self._run_hist.observe((time.perf_counter() - started) * 1000)
+        return run
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        在线程池中执行阻塞函数并等待结果（保留调用方的 contextvars）
+
+        Raises:
+            ServiceUnavailableError: 排队数达到 max_queue
+        """
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                self._rejected.inc()
+                raise ServiceUnavailableError(
+                    f"{self.name} 线程池繁忙，请稍后重试",
+                    details={"queued": self._queued, "max_queue": self.max_queue, "retry_after_seconds": 1}
+                )
+            self._queued += 1
+        self._submitted.inc()
+
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, functools.partial(fn, *args, **kwargs))
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, self._wrap(call, time.perf_counter()))
+        except RuntimeError:
+            # 线程池已关闭（进程退出中）
+            with self._lock:
+                self._queued -= 1
+            raise
+        return await future
+
+    def shutdown(self, wait: bool = False) -> None:
+        # 不取消已排队的任务：重新配置时旧池中的任务照常执行完
+        self._executor.shutdown(wait=wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queued": self._queued,
+            "saturation": self.saturation()
+        }
+
+
+class ExecutionLayer:
+    """进程级执行层：按 config.json 中的 execution 配置创建 cpu / io 两个线程池"""
+
+    DEFAULTS = {"cpu_workers": 8, "cpu_max_queue": 0, "io_workers": 32, "io_max_queue": 0}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.settings: Dict[str, Any] = dict(self.DEFAULTS)
+        self._cpu: Optional[BoundedExecutor] = None
+        self._io: Optional[BoundedExecutor] = None
+
+        # 仪表绑定到执行层而不是具体线程池，重新配置后仍指向当前的池
+        metrics = get_metrics()
+        for name in ("cpu", "io"):
+            for field in ("max_workers", "active", "queued", "saturation"):
+                metrics.gauge(f"executor.{name}.{field}", fn=functools.partial(self._pool_stat, name, field))
+
+    def _pool_stat(self, name: str, field: str) -> float:
+        pool = self._cpu if name == "cpu" else self._io
+        return pool.snapshot()[field] if pool is not None else 0
+
+    def configure(self, settings: Optional[Dict[str, Any]]) -> None:
+        """
+        应用 execution 配置（重新配置会替换已有线程池，旧池中的任务继续执行完）
+
+        Args:
+            settings: {"cpu_workers", "cpu_max_queue", "io_workers", "io_max_queue"}
+        """
+        merged = dict(self.DEFAULTS)
+        merged.update({k: v for k, v in (settings or {}).items() if v is not None})
+        with self._lock:
+            old = [p for p in (self._cpu, self._io) if p is not None]
+            self.settings = merged
+            self._cpu = None
+            self._io = None
+        for pool in old:
+            pool.shutdown(wait=False)
+        logger.info(f"执行层配置: {merged}")
+
+    @property
+    def cpu(self) -> BoundedExecutor:
+        if self._cpu is None:
+            with self._lock:
+                if self._cpu is None:
+                    self._cpu = BoundedExecutor("cpu", self.settings["cpu_workers"], self.settings["cpu_max_queue"])
+        return self._cpu
+
+    @property
+    def io(self) -> BoundedExecutor:
+        if self._io is None:
+            with self._lock:
+                if self._io is None:
+                    self._io = BoundedExecutor("io", self.settings["io_workers"], self.settings["io_max_queue"])
+        return self._io
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            pools = [p for p in (self._cpu, self._io) if p is not None]
+            self._cpu = None
+            self._io = None
+        for pool in pools:
+            pool.shutdown(wait=wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "cpu": self._cpu.snapshot() if self._cpu is not None else None,
+            "io": self._io.snapshot() if self._io is not None else None
+        }
+
+
+_execution = ExecutionLayer()
+
+
+def get_execution_layer() -> ExecutionLayer:
+    """获取当前进程的执行层"""
+    return _execution
+
+
+async def run_cpu(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """在 CPU 池中执行阻塞函数（本地模型推理）"""
+    return await _execution.cpu.run(fn, *args, **kwargs)
+
+
+async def run_io(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """在 I/O 池中执行阻塞函数（文件读写等）"""
+    return await _execution.io.run(fn, *args, **kwargs)
@@ -0,0 +1,271 @@
+"""
+共享异步 HTTP 客户端
+
+所有调用豆包 / Ark 的远程请求（VLM 图像理解、文生图、图生图、结果图片下载）共用同一个
+httpx.AsyncClient：
+
+- 连接池 + keep-alive：TCP/TLS 连接在请求之间复用
+- HTTP/2：http2 配置开启时启用（同一连接上多路复用），依赖 httpx[http2] 带上的 h2，缺失时告警并退回 HTTP/1.1
+- 按主机限制并发：避免某个上游被打满后拖住整个连接池
+- 超时：connect / read / write / pool 均可在 config.json 的 http_client.timeouts 中配置
+
+客户端与事件循环绑定：同一事件循环内复用同一实例，事件循环变化（如测试中多次 asyncio.run）时重新创建。
+
+请求体中内嵌图片（data URL）时用 StreamingJSONBody：base64 在发送时分块编码写入请求体，
+不再先拼出完整的 base64 字符串与 json.dumps 结果。
+"""
+import asyncio
+import base64
+import importlib.util
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+
+import httpx
+
+from src.core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """响应体读完（或关闭）时释放主机并发名额"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """按主机限制同时在途请求数的传输层（名额覆盖到响应体读取完毕）"""
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        per_host_limit: int = 16,
+        host_limits: Optional[Dict[str, int]] = None
+    ):
+        self._transport = transport
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.host_limits = {k.lower(): max(1, int(v)) for k, v in (host_limits or {}).items()}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        metrics = get_metrics()
+        self._requests = metrics.counter("http.requests")
+        self._errors = metrics.counter("http.errors")
+        self._latency_hist = metrics.histogram("http.response_headers_ms")
+        self._host_wait_hist = metrics.histogram("http.host_wait_ms")
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.host_limits.get(host, self.per_host_limit))
+            self._semaphores[host] = sem
+        return sem
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        sem = self._semaphore(request.url.host.lower())
+        wait_start = time.perf_counter()
+        await sem.acquire()
+        started = time.perf_counter()
+        self._host_wait_hist.observe((started - wait_start) * 1000)
+        self._requests.inc()
+
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                sem.release()
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._errors.inc()
+            release()
+            raise
+        self._latency_hist.observe((time.perf_counter() - started) * 1000)
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class InlineDataURL:
+    """请求体中的内嵌图片：序列化时展开为 data:<mime>;base64,... 字符串"""
+
+    def __init__(self, data: bytes, mime: str):
+        self.data = data
+        self.mime = mime
+
+    @property
+    def prefix(self) -> bytes:
+        return f"data:{self.mime};base64,".encode("ascii")
+
+    @property
+    def encoded_length(self) -> int:
+        """展开后的字节数（前缀 + base64）"""
+        return len(self.prefix) + 4 * ((len(self.data) + 2) // 3)
+
+
+class StreamingJSONBody:
+    """
+    流式 JSON 请求体：与 json.dumps(payload) 的结果逐字节一致，但其中的 InlineDataURL
+    在发送时按块 base64 编码，峰值内存只多出一个块，而不是图片的数倍。
+
+    用法：
+        body = StreamingJSONBody({"image": InlineDataURL(data, "image/png"), ...})
+        await client.post(url, content=body, headers={**auth_headers, **body.headers})
+
+    headers 中带 Content-Length（长度可预先算出），服务端无需支持分块传输编码；
+    可重复迭代，重定向或重试时会重新生成请求体。
+    """
+
+    # 3 的倍数：分块编码结果与整体编码一致（中间块不产生填充）
+    CHUNK_SIZE = 48 * 1024
+
+    def __init__(self, payload: Any):
+        inline: Dict[str, InlineDataURL] = {}
+        nonce = uuid.uuid4().hex
+
+        def placeholder(obj: Any) -> str:
+            if not isinstance(obj, InlineDataURL):
+                raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+            token = f"@@inline-{len(inline)}-{nonce}@@"
+            inline[token] = obj
+            return token
+
+        text = json.dumps(payload, default=placeholder)
+        self._parts: List[Union[bytes, InlineDataURL]] = []
+        for token, item in inline.items():
+            head, text = text.split(f'"{token}"', 1)
+            self._parts.append(f'{head}"'.encode("utf-8"))
+            self._parts.append(item)
+            text = '"' + text
+        self._parts.append(text.encode("utf-8"))
+
+    @property
+    def content_length(self) -> int:
+        return sum(len(p) if isinstance(p, bytes) else p.encoded_length for p in self._parts)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json", "Content-Length": str(self.content_length)}
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            yield part.prefix
+            view = memoryview(part.data)
+            for start in range(0, len(view), self.CHUNK_SIZE):
+                yield base64.b64encode(view[start:start + self.CHUNK_SIZE])
+
+
+class HttpClientManager:
+    """进程级共享 HTTP 客户端管理"""
+
+    DEFAULTS: Dict[str, Any] = {
+        "max_connections": 100,
+        "max_keepalive_connections": 20,
+        "keepalive_expiry_seconds": 30,
+        "per_host_limit": 16,
+        "host_limits": {},
+        "http2": True,
+        "timeouts": {"connect": 10, "read": 120, "write": 60, "pool": 30}
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.settings: Dict[str, Any] = dict(self.DEFAULTS)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def configure(self, settings: Optional[Dict[str, Any]]) -> None:
+        """
+        应用 config.json 中的 http_client 配置（对之后新建的客户端生效）
+
+        Args:
+            settings: {"max_connections", "max_keepalive_connections", "keepalive_expiry_seconds",
+                       "per_host_limit", "host_limits", "http2", "timeouts"}
+        """
+        merged = dict(self.DEFAULTS)
+        merged.update({k: v for k, v in (settings or {}).items() if v is not None})
+        merged["timeouts"] = {**self.DEFAULTS["timeouts"], **(merged.get("timeouts") or {})}
+        with self._lock:
+            self.settings = merged
+            self._client = None
+            self._loop = None
+        logger.info(f"HTTP 客户端配置: {merged}")
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        t = self.settings["timeouts"]
+        return httpx.Timeout(connect=t["connect"], read=t["read"], write=t["write"], pool=t["pool"])
+
+    @property
+    def http2_enabled(self) -> bool:
+        if not self.settings.get("http2"):
+            return False
+        if importlib.util.find_spec("h2") is None:
+            logger.warning("配置启用了 HTTP/2，但未安装 h2（pip install 'httpx[http2]'），改用 HTTP/1.1")
+            return False
+        return True
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=self.settings["max_connections"],
+            max_keepalive_connections=self.settings["max_keepalive_connections"],
+            keepalive_expiry=self.settings["keepalive_expiry_seconds"]
+        )
+        transport = HostLimitedTransport(
+            httpx.AsyncHTTPTransport(limits=limits, http2=self.http2_enabled),
+            per_host_limit=self.settings["per_host_limit"],
+            host_limits=self.settings.get("host_limits")
+        )
+        return httpx.AsyncClient(transport=transport, timeout=self.timeout, follow_redirects=True)
+
+    def get_client(self) -> httpx.AsyncClient:
+        """获取当前事件循环的共享客户端（须在事件循环中调用）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._client is None or self._loop is not loop or self._client.is_closed:
+                self._client = self._build_client()
+                self._loop = loop
+            return self._client
+
+    async def aclose(self) -> None:
+        """关闭共享客户端（应用退出时调用）"""
+        with self._lock:
+            client, self._client, self._loop = self._client, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+
+_manager = HttpClientManager()
+
+
+def get_http_client_manager() -> HttpClientManager:
+    """获取当前进程的 HTTP 客户端管理器"""
+    return _manager
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享的异步 HTTP 客户端"""
+    return _manager.get_client()
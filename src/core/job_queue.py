@@ -0,0 +1,435 @@
+"""
+持久化异步任务队列（SQLite）
+
+提交任务立即返回 job_id；worker（事件循环内的协程）从 SQLite 队列领取任务执行，
+客户端轮询或订阅状态变化。
+
+- 领取任务在 BEGIN IMMEDIATE 事务内完成，多进程（多个 uvicorn worker）共享同一数据库也不会重复领取
+- 任务执行期间定期续租；进程崩溃后租约过期的 running 任务会被重新放回队列（超过 max_attempts 则置为失败）
+- 已结束的任务保留 retention_hours 小时后清理
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.core.executors import run_io
+from src.core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+TERMINAL_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class JobStore:
+    """任务表的 SQLite 存取（线程安全，调用方在 io 线程池中使用）"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+                "payload TEXT NOT NULL, result TEXT, error TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL NOT NULL DEFAULT 0, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)")
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def submit(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, JOB_QUEUED, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def claim(self, kinds: List[str], lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """原子地领取最早的一个排队任务并置为 running"""
+        if not kinds:
+            return None
+        now = time.time()
+        placeholders = ",".join("?" * len(kinds))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT id FROM jobs WHERE status = ? AND kind IN ({placeholders}) "
+                    "ORDER BY created_at LIMIT 1",
+                    (JOB_QUEUED, *kinds)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, "
+                    "started_at = ?, updated_at = ? WHERE id = ?",
+                    (JOB_RUNNING, now + lease_seconds, now, now, row["id"])
+                )
+                job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._to_dict(job)
+
+    def renew(self, job_id: str, lease_seconds: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (now + lease_seconds, now, job_id, JOB_RUNNING)
+            )
+
+    def finish(self, job_id: str, result: Any = None, error: Optional[str] = None) -> None:
+        now = time.time()
+        status = JOB_FAILED if error is not None else JOB_SUCCEEDED
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = 0, "
+                "finished_at = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, now, now, job_id)
+            )
+
+    def recover_expired(self, max_attempts: int) -> int:
+        """把租约过期的 running 任务放回队列；已达重试上限的置为失败。返回处理的数量"""
+        now = time.time()
+        with self._lock:
+            failed = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (JOB_FAILED, "任务执行中断且重试次数已达上限", now, now, JOB_RUNNING, now, max_attempts)
+            ).rowcount
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = 0, updated_at = ? "
+                "WHERE status = ? AND lease_until < ?",
+                (JOB_QUEUED, now, JOB_RUNNING, now)
+            ).rowcount
+        if failed or requeued:
+            logger.warning(f"任务队列恢复：重新排队 {requeued} 个，置为失败 {failed} 个")
+        return failed + requeued
+
+    def purge_finished(self, older_than_seconds: float) -> List[Dict[str, Any]]:
+        """删除结束超过指定时长的任务，返回被删除的任务（供清理其输入文件）"""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (*TERMINAL_STATUSES, cutoff)
+            ).fetchall()
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (*TERMINAL_STATUSES, cutoff)
+            )
+        return [self._to_dict(row) for row in rows]
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TaskResultStore:
+    """
+    按客户端任务 ID 记录结果的幂等表（SQLite）
+
+    每个子任务完成即写入一行；重试同一批次时，已成功且输入指纹一致的子任务直接返回记录的结果。
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_results ("
+                "scope TEXT NOT NULL, task_id TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+                "status TEXT NOT NULL, result TEXT, error TEXT, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (scope, task_id))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_task_results_updated_at ON task_results(updated_at)")
+
+    def get(self, scope: str, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM task_results WHERE scope = ? AND task_id = ?", (scope, task_id)
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["result"] = json.loads(record["result"]) if record["result"] is not None else None
+        return record
+
+    def put(
+        self,
+        scope: str,
+        task_id: str,
+        fingerprint: str,
+        status: str,
+        result: Any = None,
+        error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO task_results "
+                "(scope, task_id, fingerprint, status, result, error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scope, task_id, fingerprint, status,
+                 json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time())
+            )
+
+    def purge(self, older_than_seconds: float) -> int:
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            return self._conn.execute("DELETE FROM task_results WHERE updated_at < ?", (cutoff,)).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """任务队列：注册各类任务的处理函数，启动 worker 协程执行"""
+
+    DEFAULTS: Dict[str, Any] = {
+        "db_path": "data/jobs/jobs.sqlite3",
+        "workers": 4,
+        "poll_interval_seconds": 1.0,
+        "lease_seconds": 60,
+        "max_attempts": 3,
+        "retention_hours": 24
+    }
+
+    def __init__(self):
+        self.settings: Dict[str, Any] = dict(self.DEFAULTS)
+        self.store: Optional[JobStore] = None
+        self._handlers: Dict[str, JobHandler] = {}
+        self._cleanup: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._maintenance_hooks: List[Callable[[], Any]] = []
+        self._workers: List[asyncio.Task] = []
+        self._maintenance: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # job_id -> [事件, 等待者数量]
+        self._changed: Dict[str, List[Any]] = {}
+
+        metrics = get_metrics()
+        self._submitted = metrics.counter("jobs.submitted")
+        self._succeeded = metrics.counter("jobs.succeeded")
+        self._failed = metrics.counter("jobs.failed")
+        self._run_hist = metrics.histogram("jobs.run_ms")
+        self._wait_hist = metrics.histogram("jobs.queue_wait_ms")
+
+    def configure(self, settings: Optional[Dict[str, Any]]) -> None:
+        """应用 config.json 中的 jobs 配置（须在 start 之前调用）"""
+        merged = dict(self.DEFAULTS)
+        merged.update({k: v for k, v in (settings or {}).items() if v is not None})
+        self.settings = merged
+        if self.store is not None:
+            self.store.close()
+        self.store = JobStore(merged["db_path"])
+
+    def register(
+        self,
+        kind: str,
+        handler: JobHandler,
+        cleanup: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> None:
+        """
+        注册任务处理函数
+
+        Args:
+            kind: 任务类型
+            handler: async handler(payload) -> 可 JSON 序列化的结果；抛出异常则任务失败
+            cleanup: 任务结束（成功 / 失败）后调用，参数为 payload，用于删除输入文件等
+        """
+        self._handlers[kind] = handler
+        if cleanup is not None:
+            self._cleanup[kind] = cleanup
+
+    def add_maintenance(self, hook: Callable[[], Any]) -> None:
+        """注册随队列维护定期执行的清理函数（阻塞调用，在 io 线程池中执行）"""
+        self._maintenance_hooks.append(hook)
+
+    def _require_store(self) -> JobStore:
+        if self.store is None:
+            self.configure(None)
+        return self.store
+
+    async def submit(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> str:
+        """提交任务，立即返回 job_id"""
+        if kind not in self._handlers:
+            raise ValueError(f"未注册的任务类型: {kind}")
+        job_id = await run_io(self._require_store().submit, kind, payload, job_id)
+        self._submitted.inc()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await run_io(self._require_store().get, job_id)
+
+    async def wait_for_change(self, job_id: str, timeout: float) -> None:
+        """等待本进程内该任务状态变化（或超时）；跨进程的变化靠调用方超时后重新查询"""
+        entry = self._changed.get(job_id)
+        if entry is None:
+            entry = self._changed[job_id] = [asyncio.Event(), 0]
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            entry[1] -= 1
+            # 最后一个等待者离开时移除：变化发生在其他进程或一直没有变化的任务不会累积
+            if entry[1] == 0 and self._changed.get(job_id) is entry:
+                del self._changed[job_id]
+
+    def _notify(self, job_id: str) -> None:
+        entry = self._changed.pop(job_id, None)
+        if entry is not None:
+            entry[0].set()
+
+    async def start(self) -> None:
+        """恢复中断的任务并启动 worker"""
+        if self._workers:
+            return
+        store = self._require_store()
+        await run_io(store.recover_expired, int(self.settings["max_attempts"]))
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.ensure_future(self._worker(i)) for i in range(max(1, int(self.settings["workers"])))
+        ]
+        self._maintenance = asyncio.ensure_future(self._maintain())
+        logger.info(f"任务队列已启动: {self.settings}")
+
+    async def stop(self) -> None:
+        """停止 worker；正在执行的任务保持 running，租约过期后由下次启动重新排队"""
+        tasks = self._workers + ([self._maintenance] if self._maintenance else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._maintenance = None
+
+    async def _worker(self, index: int) -> None:
+        store = self._require_store()
+        lease = float(self.settings["lease_seconds"])
+        while True:
+            job = await run_io(store.claim, list(self._handlers), lease)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=float(self.settings["poll_interval_seconds"]))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(store, job, lease)
+
+    async def _execute(self, store: JobStore, job: Dict[str, Any], lease: float) -> None:
+        job_id = job["id"]
+        self._wait_hist.observe((job["started_at"] - job["created_at"]) * 1000)
+        self._notify(job_id)
+
+        async def keep_lease() -> None:
+            while True:
+                await asyncio.sleep(lease / 3)
+                await run_io(store.renew, job_id, lease)
+
+        renewer = asyncio.ensure_future(keep_lease())
+        started = time.perf_counter()
+        try:
+            result = await self._handlers[job["kind"]](job["payload"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"任务 {job_id}（{job['kind']}）失败: {e}")
+            self._failed.inc()
+            await run_io(store.finish, job_id, None, getattr(e, "message", None) or str(e) or e.__class__.__name__)
+        else:
+            self._succeeded.inc()
+            await run_io(store.finish, job_id, result)
+        finally:
+            renewer.cancel()
+            self._run_hist.observe((time.perf_counter() - started) * 1000)
+        self._notify(job_id)
+        cleanup = self._cleanup.get(job["kind"])
+        if cleanup is not None:
+            try:
+                await run_io(cleanup, job["payload"])
+            except Exception as e:
+                logger.warning(f"任务 {job_id} 清理失败: {e}")
+
+    async def _maintain(self) -> None:
+        """定期执行维护"""
+        interval = max(1.0, float(self.settings["lease_seconds"]) / 2)
+        while True:
+            await asyncio.sleep(interval)
+            await self.run_maintenance()
+
+    async def run_maintenance(self) -> None:
+        """恢复租约过期的任务、清理过期的已结束任务，并执行 add_maintenance 注册的清理函数"""
+        store = self._require_store()
+        try:
+            if await run_io(store.recover_expired, int(self.settings["max_attempts"])):
+                if self._wakeup is not None:
+                    self._wakeup.set()
+            purged = await run_io(store.purge_finished, float(self.settings["retention_hours"]) * 3600)
+            for job in purged:
+                cleanup = self._cleanup.get(job["kind"])
+                if cleanup is not None:
+                    await run_io(cleanup, job["payload"])
+        except Exception as e:
+            logger.warning(f"任务队列维护失败: {e}")
+        for hook in self._maintenance_hooks:
+            try:
+                await run_io(hook)
+            except Exception as e:
+                logger.warning(f"任务队列维护函数 {getattr(hook, '__name__', hook)} 失败: {e}")
+
+
+_queue = JobQueue()
+
+
+def get_job_queue() -> JobQueue:
+    """获取当前进程的任务队列"""
+    return _queue
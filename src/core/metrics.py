@@ -0,0 +1,178 @@
+"""
+进程内轻量指标（计数器 / 仪表 / 直方图）
+
+通过 /api/v1/health/metrics 导出，便于观察批处理、线程池、缓存等运行状态。
+"""
+import bisect
+import inspect
+import threading
+import weakref
+from typing import Dict, Any, List, Optional, Sequence, Callable
+
+# 默认直方图分桶（毫秒级延迟）
+DEFAULT_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# 批大小分桶
+DEFAULT_BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "counter", "value": self._value}
+
+
+class Gauge:
+    """
+    可增可减的仪表，也可绑定取值函数
+
+    同名仪表可绑定多个取值函数（如同一类批处理器的多个实例），取值为各函数结果之和。
+    绑定方法只保留弱引用：对象被回收后自动移除，仪表不会让它一直存活。
+    """
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self._lock = threading.Lock()
+        self._value = 0
+        self._fns: Optional[List[Callable[[], Optional[Callable[[], float]]]]] = None
+        if fn is not None:
+            self.add_fn(fn)
+
+    def add_fn(self, fn: Callable[[], float]) -> None:
+        """追加一个取值函数"""
+        ref = weakref.WeakMethod(fn) if inspect.ismethod(fn) else (lambda: fn)
+        with self._lock:
+            if self._fns is None:
+                self._fns = []
+            self._fns.append(ref)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        if self._fns is None:
+            return self._value
+        total = 0
+        with self._lock:
+            fns = [ref() for ref in self._fns]
+            # 丢弃已被回收的对象的方法
+            self._fns = [ref for ref, fn in zip(self._fns, fns) if fn is not None]
+        for fn in fns:
+            if fn is None:
+                continue
+            try:
+                total += fn()
+            except Exception:
+                pass
+        return total
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "gauge", "value": self.value}
+
+
+class Histogram:
+    """分桶直方图（累计分桶，最后一个桶为 +Inf）"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS):
+        self._lock = threading.Lock()
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._min: Optional[float] = None
+        self._max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._sum += value
+            self._min = value if self._min is None else min(self._min, value)
+            self._max = value if self._max is None else max(self._max, value)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, n in zip(list(self.buckets) + ["+Inf"], self._counts):
+                cumulative += n
+                buckets[str(bound)] = cumulative
+            return {
+                "type": "histogram",
+                "count": self._count,
+                "sum": round(self._sum, 3),
+                "avg": round(self._sum / self._count, 3) if self._count else 0.0,
+                "min": self._min,
+                "max": self._max,
+                "buckets": buckets
+            }
+
+
+class MetricsRegistry:
+    """指标注册表：按名称获取（不存在则创建）指标"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+
+    def _get_or_create(self, name: str, factory: Callable[[], Any]) -> Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = factory()
+                    self._metrics[name] = metric
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get_or_create(name, Counter)
+
+    def gauge(self, name: str, fn: Optional[Callable[[], float]] = None) -> Gauge:
+        """获取仪表；给出 fn 时追加为取值函数（同名的多个取值函数求和）"""
+        gauge = self._get_or_create(name, Gauge)
+        if fn is not None:
+            gauge.add_fn(fn)
+        return gauge
+
+    def histogram(self, name: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(buckets))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            items = sorted(self._metrics.items())
+        return {name: metric.snapshot() for name, metric in items}
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """获取当前进程的指标注册表"""
+    return _metrics
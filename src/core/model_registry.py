@@ -0,0 +1,306 @@
+"""
+进程级模型注册表
+
+每个 worker 进程内，同一个本地模型（按 类型 / model_id / local_path / device 区分）
+只加载一次，所有请求共享同一个模型实例。模型实例自身带推理锁（见各模型基类），
+因此注册表分发出去的句柄可以被多个请求线程安全地复用。
+
+懒加载模式（config.json 中 model_registry.lazy_loading）下模型在首次使用时才加载；
+空闲超过 idle_timeout_seconds 的模型会被卸载，加载后总内存超过 memory_budget_mb 时
+按最近最少使用（LRU）顺序卸载其它模型。被卸载的模型下次使用时自动重新加载。
+"""
+import gc
+import os
+import sys
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Tuple, Callable, List
+
+logger = logging.getLogger(__name__)
+
+ModelKey = Tuple[str, str, str, str]
+
+
+def _process_rss_bytes() -> int:
+    """当前进程常驻内存（字节），psutil 不可用时返回 0"""
+    try:
+        import psutil
+        return int(psutil.Process(os.getpid()).memory_info().rss)
+    except Exception:
+        return 0
+
+
+def _torch_module_bytes(obj: Any) -> int:
+    """统计 torch 模块参数与缓冲区占用的字节数，非 torch 模块返回 0"""
+    if obj is None or not hasattr(obj, "parameters"):
+        return 0
+    try:
+        total = sum(p.numel() * p.element_size() for p in obj.parameters())
+        if hasattr(obj, "buffers"):
+            total += sum(b.numel() * b.element_size() for b in obj.buffers())
+        return int(total)
+    except Exception:
+        return 0
+
+
+def estimate_model_bytes(model: Any) -> int:
+    """
+    估算模型实例的内存占用
+
+    - transformers 模型：model.model 本身是 torch 模块
+    - FunASR AutoModel：model.model.model 是 torch 模块
+    """
+    inner = getattr(model, "model", None)
+    size = _torch_module_bytes(inner)
+    if size == 0 and inner is not None:
+        size = _torch_module_bytes(getattr(inner, "model", None))
+    return size
+
+
+class ModelEntry:
+    """注册表中的单个模型条目"""
+
+    def __init__(self, key: ModelKey, model: Any):
+        self.key = key
+        self.model = model
+        self.lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.memory_bytes: int = 0
+        self.loaded_at: Optional[str] = None
+        self.load_count: int = 0
+        self.evict_count: int = 0
+        self.error: Optional[str] = None
+
+    @property
+    def kind(self) -> str:
+        return self.key[0]
+
+    @property
+    def loaded(self) -> bool:
+        return bool(getattr(self.model, "is_loaded", False))
+
+    @property
+    def last_used(self) -> float:
+        return getattr(self.model, "last_used", None) or 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        kind, model_id, local_path, device = self.key
+        idle = time.monotonic() - self.last_used if self.last_used else None
+        return {
+            "kind": kind,
+            "model_id": model_id,
+            "local_path": local_path,
+            "device": device,
+            "loaded": self.loaded,
+            "load_count": self.load_count,
+            "evict_count": self.evict_count,
+            "idle_seconds": round(idle, 1) if idle is not None else None,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "memory_mb": round(self.memory_bytes / (1024 * 1024), 2),
+            "loaded_at": self.loaded_at,
+            "error": self.error
+        }
+
+
+class ModelRegistry:
+    """进程级模型注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[ModelKey, ModelEntry] = {}
+        self.lazy_loading = False
+        self.idle_timeout_seconds = 0.0
+        self.memory_budget_bytes = 0
+        self.reaper_interval_seconds = 60.0
+        self._reaper: Optional[threading.Thread] = None
+
+    def configure(self, settings: Optional[Dict[str, Any]]) -> None:
+        """
+        应用 config.json 中的 model_registry 配置
+
+        Args:
+            settings: {"lazy_loading", "idle_timeout_seconds", "memory_budget_mb", "reaper_interval_seconds"}
+        """
+        settings = settings or {}
+        self.lazy_loading = bool(settings.get("lazy_loading", False))
+        self.idle_timeout_seconds = float(settings.get("idle_timeout_seconds", 0) or 0)
+        self.memory_budget_bytes = int(float(settings.get("memory_budget_mb", 0) or 0) * 1024 * 1024)
+        self.reaper_interval_seconds = float(settings.get("reaper_interval_seconds", 60) or 60)
+        if self.idle_timeout_seconds > 0:
+            self._start_reaper()
+
+    @staticmethod
+    def make_key(kind: str, config: Dict[str, Any]) -> ModelKey:
+        """根据模型配置生成注册表键"""
+        model_id = str(config.get("model_id") or config.get("name") or "")
+        local_path = config.get("local_path") or ""
+        if local_path and config.get("use_local_models", True):
+            local_path = os.path.abspath(local_path)
+        else:
+            local_path = ""
+        device = str(config.get("device") or "auto")
+        return (kind, model_id, local_path, device)
+
+    def get_model(
+        self,
+        kind: str,
+        config: Dict[str, Any],
+        factory: Callable[[Dict[str, Any]], Any],
+        load: Optional[bool] = None
+    ) -> Any:
+        """
+        获取共享模型实例，不存在时用 factory(config) 创建
+
+        Args:
+            kind: 模型类型（paraformer / text_emotion / emotion2vec）
+            config: 模型配置
+            factory: 模型构造函数
+            load: 是否立即加载模型；默认懒加载模式下不加载，否则立即加载
+
+        Returns:
+            共享的模型实例
+        """
+        key = self.make_key(kind, config)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                model = factory(config)
+                entry = ModelEntry(key, model)
+                # 模型按需加载时（ensure_loaded）也由注册表接管，保证统计与内存预算生效
+                model._load_listener = lambda m, e=entry: self._load_entry(e)
+                self._entries[key] = entry
+                logger.info(f"模型已注册: {key}")
+        if load is None:
+            load = not self.lazy_loading
+        if load:
+            entry.model.ensure_loaded()
+        return entry.model
+
+    def _load_entry(self, entry: ModelEntry) -> bool:
+        """加载条目对应的模型（由模型的 ensure_loaded 在持有模型锁时调用）"""
+        if entry.loaded:
+            return True
+        with entry.lock:
+            if entry.loaded:
+                return True
+            # 重新加载时已知模型大小，先腾出空间
+            if entry.memory_bytes:
+                self._enforce_budget(exclude=entry, incoming_bytes=entry.memory_bytes)
+
+            rss_before = _process_rss_bytes()
+            start = time.perf_counter()
+            try:
+                ok = bool(entry.model.load_model())
+            except Exception as e:
+                ok = False
+                entry.error = str(e)
+            entry.load_seconds = time.perf_counter() - start
+            if not ok:
+                entry.error = entry.error or "load_model 返回 False"
+                logger.error(f"模型加载失败: {entry.key}: {entry.error}")
+                return False
+
+            entry.error = None
+            entry.load_count += 1
+            entry.loaded_at = datetime.now(timezone.utc).isoformat()
+            entry.memory_bytes = estimate_model_bytes(entry.model) or max(0, _process_rss_bytes() - rss_before)
+            logger.info(
+                f"模型加载完成: {entry.key}, 耗时 {entry.load_seconds:.2f}s, "
+                f"内存约 {entry.memory_bytes / (1024 * 1024):.1f}MB"
+            )
+        self._enforce_budget(exclude=entry)
+        return True
+
+    def _unload_entry(self, entry: ModelEntry, reason: str) -> bool:
+        """卸载条目（模型正在推理时跳过）"""
+        if not entry.model.unload_model(blocking=False):
+            return False
+        entry.evict_count += 1
+        logger.info(f"模型已卸载({reason}): {entry.key}, 释放约 {entry.memory_bytes / (1024 * 1024):.1f}MB")
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            try:
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except Exception:
+                pass
+        return True
+
+    def _enforce_budget(self, exclude: Optional[ModelEntry] = None, incoming_bytes: int = 0) -> int:
+        """超出内存预算时按 LRU 顺序卸载其它模型，返回卸载数量"""
+        if self.memory_budget_bytes <= 0:
+            return 0
+        loaded = [e for e in self.entries() if e.loaded and e is not exclude]
+        used = sum(e.memory_bytes for e in loaded) + incoming_bytes
+        if exclude is not None and exclude.loaded:
+            used += exclude.memory_bytes
+        evicted = 0
+        for entry in sorted(loaded, key=lambda e: e.last_used):
+            if used <= self.memory_budget_bytes:
+                break
+            if self._unload_entry(entry, "超出内存预算"):
+                used -= entry.memory_bytes
+                evicted += 1
+        if used > self.memory_budget_bytes:
+            logger.warning(
+                f"模型内存 {used / (1024 * 1024):.1f}MB 仍超出预算 "
+                f"{self.memory_budget_bytes / (1024 * 1024):.1f}MB（其余模型正在使用）"
+            )
+        return evicted
+
+    def evict_idle(self) -> int:
+        """卸载空闲超时的模型，返回卸载数量"""
+        if self.idle_timeout_seconds <= 0:
+            return 0
+        now = time.monotonic()
+        evicted = 0
+        for entry in self.entries():
+            if entry.loaded and entry.last_used and now - entry.last_used > self.idle_timeout_seconds:
+                if self._unload_entry(entry, "空闲超时"):
+                    evicted += 1
+        return evicted
+
+    def _start_reaper(self) -> None:
+        """启动后台线程定期淘汰空闲模型"""
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="model-registry-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        while self.idle_timeout_seconds > 0:
+            time.sleep(self.reaper_interval_seconds)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logger.warning(f"空闲模型淘汰失败: {e}")
+
+    def entries(self) -> List[ModelEntry]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出注册表状态，供健康检查使用"""
+        entries = self.entries()
+        loaded = [e for e in entries if e.loaded]
+        return {
+            "models": [e.to_dict() for e in entries],
+            "loaded_count": len(loaded),
+            "total_memory_mb": round(sum(e.memory_bytes for e in loaded) / (1024 * 1024), 2),
+            "process_rss_mb": round(_process_rss_bytes() / (1024 * 1024), 2),
+            "lazy_loading": self.lazy_loading,
+            "idle_timeout_seconds": self.idle_timeout_seconds,
+            "memory_budget_mb": round(self.memory_budget_bytes / (1024 * 1024), 2)
+        }
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    """获取当前进程的模型注册表"""
+    return _registry
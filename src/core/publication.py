@@ -0,0 +1,231 @@
+"""
+内容寻址的图片发布目录（短时签名 URL）
+
+i2i 调用需要 Ark 能下载到的源图 URL。图片按内容 sha256 命名放进发布目录，
+用硬链接引用原文件（原文件之后被删除也不影响），不支持硬链接时才复制；内存中的图片直接写入。
+同一内容重复发布只刷新有效期，不再写盘。
+
+- 下载地址为 /api/v1/published/{sha256}.{ext}?exp=...&sig=...，签名为 HMAC-SHA256，过期后拒绝访问
+- 文件在最后一次发布 ttl_seconds 之后由后台定期清理（签名 URL 的有效期不会超过文件保留时间）
+- 签名密钥取 config 中的 secret 或环境变量 PUBLICATION_SECRET；都未设置时在发布目录下生成并持久化，
+  同一主机上的多个 worker 共用
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.core.executors import run_io
+from src.core.metrics import get_metrics
+from src.utils.image_utils import ImageInput
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED_URL_PREFIX = "/api/v1/published"
+
+_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,8}$")
+_SECRET_FILE = ".secret"
+_STAMP_SUFFIX = ".published"
+
+
+class PublicationStore:
+    """发布图片并签发短时有效的下载 URL"""
+
+    DEFAULTS: Dict[str, Any] = {
+        "root": "data/published",
+        "ttl_seconds": 900,
+        "sweep_interval_seconds": 300,
+        "secret": ""
+    }
+
+    def __init__(self):
+        self.settings: Dict[str, Any] = dict(self.DEFAULTS)
+        self.root = Path(self.DEFAULTS["root"])
+        self._secret: Optional[bytes] = None
+        self._sweeper: Optional[asyncio.Task] = None
+
+        metrics = get_metrics()
+        self._published = metrics.counter("publication.published")
+        self._reused = metrics.counter("publication.reused")
+        self._copied = metrics.counter("publication.copied")
+        self._expired = metrics.counter("publication.expired")
+
+    def configure(self, settings: Optional[Dict[str, Any]]) -> None:
+        """应用 config.json 中的 publication 配置"""
+        merged = dict(self.DEFAULTS)
+        merged.update({k: v for k, v in (settings or {}).items() if v is not None})
+        self.settings = merged
+        self.root = Path(merged["root"])
+        self._secret = None
+
+    @property
+    def ttl(self) -> float:
+        return float(self.settings["ttl_seconds"])
+
+    def _secret_key(self) -> bytes:
+        if self._secret is None:
+            secret = self.settings.get("secret") or os.getenv("PUBLICATION_SECRET")
+            self._secret = secret.encode("utf-8") if secret else self._load_secret_file()
+        return self._secret
+
+    def _load_secret_file(self) -> bytes:
+        path = self.root / _SECRET_FILE
+        self.root.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return path.read_bytes()
+        with os.fdopen(fd, "wb") as f:
+            secret = os.urandom(32).hex().encode("ascii")
+            f.write(secret)
+        return secret
+
+    def _path(self, name: str) -> Path:
+        return self.root / name[:2] / name
+
+    def _stamp_path(self, name: str) -> Path:
+        return self.root / name[:2] / f"{name}{_STAMP_SUFFIX}"
+
+    def publish(self, image: ImageInput) -> str:
+        """
+        发布图片，返回发布名 {sha256}.{ext}（阻塞调用，异步代码中经 run_io 调用）
+
+        image 带有本地路径时硬链接该文件（不支持时复制），否则写入内存中的字节。
+        最后发布时间记在旁边的 .published 标记文件上，不修改内容文件（硬链接时即原文件）的 mtime。
+        先刷新标记再确认内容存在：与 sweep 并发时内容要么被 sweep 恢复，要么在这里重新生成。
+        """
+        name = f"{hashlib.sha256(image.data).hexdigest()}.{image.ext}"
+        dst = self._path(name)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        self._stamp_path(name).touch()
+        if dst.exists():
+            self._reused.inc()
+            return name
+        tmp = dst.with_name(f".{uuid.uuid4().hex}.tmp")
+        try:
+            self._materialize(image, tmp)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+        self._published.inc()
+        return name
+
+    def _materialize(self, image: ImageInput, tmp: Path) -> None:
+        src = image.path
+        if src:
+            try:
+                os.link(src, tmp)
+                return
+            except FileNotFoundError:
+                # 原文件已被删除（如任务清理了上传文件）：改用内存中的字节
+                pass
+            except OSError:
+                logger.info(f"发布目录不支持硬链接，复制文件: {src}")
+                self._copied.inc()
+                try:
+                    shutil.copyfile(src, tmp)
+                    return
+                except FileNotFoundError:
+                    pass
+        tmp.write_bytes(image.data)
+
+    def _sign(self, name: str, expires_at: int) -> str:
+        return hmac.new(self._secret_key(), f"{name}:{expires_at}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def signed_path(self, name: str) -> str:
+        """签名下载路径（不含主机部分），ttl_seconds 后过期"""
+        expires_at = int(time.time() + self.ttl)
+        return f"{PUBLISHED_URL_PREFIX}/{name}?exp={expires_at}&sig={self._sign(name, expires_at)}"
+
+    def verify(self, name: str, expires_at: int, sig: str) -> bool:
+        """校验发布名、有效期与签名"""
+        if not _NAME_PATTERN.match(name) or expires_at < time.time():
+            return False
+        return hmac.compare_digest(self._sign(name, expires_at), sig or "")
+
+    def path_for(self, name: str) -> Optional[Path]:
+        """已发布文件的路径；已清理时返回 None"""
+        if not _NAME_PATTERN.match(name):
+            return None
+        path = self._path(name)
+        return path if path.is_file() else None
+
+    def sweep(self) -> int:
+        """删除最后一次发布已超过有效期的文件（含残留的临时文件与标记），返回删除的图片数量"""
+        if not self.root.is_dir():
+            return 0
+        deadline = time.time() - self.ttl
+        removed = 0
+        for entry in self.root.glob("*/*"):
+            try:
+                if _NAME_PATTERN.match(entry.name):
+                    if self._expire(entry, self._stamp_path(entry.name), deadline):
+                        removed += 1
+                elif entry.name.endswith(".tmp") or (
+                    entry.name.endswith(_STAMP_SUFFIX) and not entry.with_name(entry.name[:-len(_STAMP_SUFFIX)]).exists()
+                ):
+                    # 中断留下的临时文件、内容已删除的标记
+                    if entry.lstat().st_mtime < deadline:
+                        entry.unlink()
+            except FileNotFoundError:
+                continue
+        if removed:
+            self._expired.inc(removed)
+            logger.info(f"已清理过期发布文件 {removed} 个")
+        return removed
+
+    @staticmethod
+    def _expire(path: Path, stamp: Path, deadline: float) -> bool:
+        try:
+            if stamp.stat().st_mtime >= deadline:
+                return False
+        except FileNotFoundError:
+            # 没有标记（如进程在发布中途退出）：从现在开始计时
+            stamp.touch()
+            return False
+        # 先移走再复查标记：期间被重新发布则放回，避免刚签发的 URL 指向已删除的文件
+        doomed = path.with_name(f".{uuid.uuid4().hex}.tmp")
+        os.rename(path, doomed)
+        if stamp.stat().st_mtime >= deadline:
+            os.replace(doomed, path)
+            return False
+        os.unlink(doomed)
+        # 之后若被重新发布，标记缺失只会让计时从头开始
+        stamp.unlink(missing_ok=True)
+        return True
+
+    async def start(self) -> None:
+        """启动后台清理"""
+        if self._sweeper is None:
+            self._sweeper = asyncio.ensure_future(self._sweep_loop())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    async def _sweep_loop(self) -> None:
+        interval = max(1.0, float(self.settings["sweep_interval_seconds"]))
+        while True:
+            try:
+                await run_io(self.sweep)
+            except Exception as e:
+                logger.warning(f"清理发布目录失败: {e}")
+            await asyncio.sleep(interval)
+
+
+_store = PublicationStore()
+
+
+def get_publication_store() -> PublicationStore:
+    """获取当前进程的图片发布目录"""
+    return _store
@@ -9,7 +9,14 @@ import logging
 from src.api.v1.image import router as image_router
 from src.api.v1.emotion import router as emotion_router
 from src.api.v1.health import router as health_router
-from src.api.dependencies import get_config_manager
+from src.api.v1.published import router as published_router
+from src.api.dependencies import get_config_manager, purge_image_batch_results
+from src.core.executors import get_execution_layer
+from src.core.http_client import get_http_client_manager
+from src.core.job_queue import get_job_queue
+from src.core.publication import get_publication_store
+from src.services.image_jobs import register_image_jobs
+from src.utils.image_preprocessing import get_image_preprocessor
 
 # 配置日志
 def setup_logging():
@@ -68,8 +75,39 @@ async def startup_event():
     static_prefix = config_manager.config["paths"].get("static_url_prefix", "/static/generated")
     app.mount(static_prefix, StaticFiles(directory=str(gen_dir)), name="generated_images")
 
+    # 阻塞调用的 cpu / io 线程池
+    get_execution_layer().configure(config_manager.config.get("execution", {}))
+
+    # 豆包 / Ark 远程调用共用的 HTTP 连接池
+    get_http_client_manager().configure(config_manager.config.get("http_client", {}))
+
+    # VLM / i2i 上传前的图片缩放与重编码
+    get_image_preprocessor().configure(config_manager.config.get("image_preprocessing", {}))
+
+    # i2i 源图的发布目录（签名 URL，过期文件定期清理）
+    publication = get_publication_store()
+    publication.configure(config_manager.config.get("publication", {}))
+    await publication.start()
+
+    # 图像生成 / 编辑的异步任务队列（启动时恢复上次中断的任务）
+    job_queue = get_job_queue()
+    job_queue.configure(config_manager.config.get("jobs", {}))
+    register_image_jobs(job_queue, config_manager)
+    # 批量编辑幂等表按 batch_edit.retention_hours 定期清理
+    job_queue.add_maintenance(purge_image_batch_results)
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用退出时停止任务队列与发布目录清理，关闭线程池与 HTTP 连接池"""
+    await get_job_queue().stop()
+    await get_publication_store().stop()
+    await get_http_client_manager().aclose()
+    get_execution_layer().shutdown(wait=False)
+
 # 注册API路由
 app.include_router(health_router)
+app.include_router(published_router)
 app.include_router(image_router)
 app.include_router(emotion_router)
 
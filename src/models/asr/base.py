@@ -1,6 +1,8 @@
 """
 ASR模型基类
 """
+import threading
+import time
 from abc import ABC, abstractmethod
 from typing import Optional, Dict, Any
 from pathlib import Path
@@ -12,6 +14,12 @@ class BaseASRModel(ABC):
         self.config = config
         self.model = None
         self.is_loaded = False
+        # 推理锁：同一模型实例会被注册表共享给多个请求线程
+        self._lock = threading.RLock()
+        # 最近一次使用时间（monotonic），供注册表做空闲淘汰
+        self.last_used: Optional[float] = None
+        # 由模型注册表设置：接管加载过程以便统计耗时、内存并执行内存预算
+        self._load_listener = None
     
     @abstractmethod
     def load_model(self) -> bool:
@@ -27,6 +35,40 @@ class BaseASRModel(ABC):
         """检查模型是否已加载"""
         return self.is_loaded
     
+    def ensure_loaded(self) -> bool:
+        """确保模型已加载（线程安全，避免并发重复加载）；被淘汰后会按需重新加载"""
+        self.last_used = time.monotonic()
+        if self.is_loaded:
+            return True
+        with self._lock:
+            if self.is_loaded:
+                return True
+            if self._load_listener is not None:
+                return self._load_listener(self)
+            return self.load_model()
+    
+    def unload_model(self, blocking: bool = True) -> bool:
+        """
+        卸载模型释放内存，下次使用时自动重新加载
+        
+        Args:
+            blocking: 为 False 时若模型正在推理则直接放弃卸载
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            if not self.is_loaded:
+                return False
+            self._release_model()
+            self.is_loaded = False
+            return True
+        finally:
+            self._lock.release()
+    
+    def _release_model(self) -> None:
+        """释放模型对象引用，子类持有额外对象时可覆盖"""
+        self.model = None
+    
     def get_model_info(self) -> Dict[str, Any]:
         """获取模型信息"""
         return {
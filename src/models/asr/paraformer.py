@@ -4,13 +4,17 @@ Paraformer ASR模型实现
 import os
 import sys
 from pathlib import Path
-from typing import Optional, Dict, Any
+import numpy as np
+from typing import Optional, Dict, Any, List, Union
 
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent.parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from src.models.asr.base import BaseASRModel
+from src.core.batching import MicroBatcher
+from src.core.exceptions import ServiceUnavailableError
+from src.utils.audio_utils import estimate_audio_seconds
 from funasr import AutoModel
 
 class ParaformerModel(BaseASRModel):
@@ -21,6 +25,23 @@ class ParaformerModel(BaseASRModel):
         self.model_name = "paraformer"
         self.model_path = config.get("local_path")
         self.use_local = config.get("use_local_models", True)
+        self.device = config.get("device")
+
+        # 批量转写：并发请求按时长分桶后合批送入 generate；
+        # 排队积压或预计等待超过 max_queue_wait_ms 时拒绝新请求（背压）
+        batching = config.get("batching", {}) or {}
+        self.batcher = None
+        self.bucket_seconds = float(batching.get("bucket_seconds", 5.0) or 5.0)
+        if batching.get("enabled", False):
+            self.batcher = MicroBatcher(
+                "paraformer",
+                self._transcribe_batch,
+                max_batch_size=batching.get("max_batch_size", 8),
+                max_wait_ms=batching.get("max_wait_ms", 20),
+                bucket_fn=self._length_bucket,
+                max_queue_size=batching.get("max_queue_size", 0),
+                max_queue_wait_ms=batching.get("max_queue_wait_ms", 0)
+            )
     
     def load_model(self) -> bool:
         """加载Paraformer模型"""
@@ -28,11 +49,12 @@ class ParaformerModel(BaseASRModel):
             if self.use_local and self.model_path:
                 # 使用本地模型
                 model_abs_path = os.path.abspath(self.model_path)
-                self.model = AutoModel(model=model_abs_path)
+                self.model = AutoModel(model=model_abs_path, **self._device_kwargs())
             else:
                 # 使用在线模型
                 self.model = AutoModel(
-                    model="iic/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch"
+                    model="iic/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-pytorch",
+                    **self._device_kwargs()
                 )
             
             self.is_loaded = True
@@ -41,24 +63,58 @@ class ParaformerModel(BaseASRModel):
             print(f"Paraformer模型加载失败: {e}")
             return False
     
-    def transcribe(self, audio_path: str) -> Optional[str]:
-        """转录音频文件"""
-        if not self.is_model_ready():
-            if not self.load_model():
-                return None
+    def _device_kwargs(self) -> Dict[str, Any]:
+        """未显式配置 device 时交给 FunASR 自行选择"""
+        return {"device": self.device} if self.device else {}
+    
+    def _length_bucket(self, audio_input: Any) -> int:
+        """按音频时长分桶：时长相近的音频合批，padding 更少"""
+        return int(estimate_audio_seconds(audio_input) // self.bucket_seconds)
+
+    def _transcribe_batch(self, audio_inputs: List[Any]) -> List[Optional[str]]:
+        """批量转写：一次 generate 处理整批音频，结果与输入一一对应"""
+        with self._lock:
+            # 加载与推理在同一临界区：检查之后不会被空闲回收 / 内存预算淘汰卸载
+            if not self.ensure_loaded():
+                raise RuntimeError("Paraformer模型未加载")
+            results = self.model.generate(
+                list(audio_inputs),
+                output_dir=None,
+                batch_size=len(audio_inputs)
+            )
+        results = list(results or [])
+        if len(results) != len(audio_inputs):
+            raise RuntimeError(f"ASR批量结果数量不匹配: 期望 {len(audio_inputs)}，实际 {len(results)}")
+        return [(r.get('text', '') or '').strip() or None for r in results]
+    
+    def transcribe(self, audio_path: Union[str, np.ndarray]) -> Optional[str]:
+        """
+        转录音频（文件路径，或 decode_audio 得到的 16kHz 单声道 float32 波形）
         
+        Raises:
+            ServiceUnavailableError: 启用批处理且排队超过 SLO 时
+        """
         try:
-            result = self.model.generate(
-                audio_path,
-                output_dir="./data/temp",
-                batch_size=1
-            )
+            if self.batcher is not None:
+                # 加载见 _transcribe_batch
+                return self.batcher.submit(audio_path).result()
+            
+            with self._lock:
+                if not self.ensure_loaded():
+                    return None
+                result = self.model.generate(
+                    audio_path,
+                    output_dir=None,
+                    batch_size=1
+                )
             
             if result and len(result) > 0:
                 transcription = result[0].get('text', '').strip()
                 return transcription if transcription else None
             
             return None
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             print(f"ASR转录失败: {e}")
             return None
@@ -0,0 +1,143 @@
+"""
+Paraformer 流式 ASR 模型实现
+"""
+import os
+import numpy as np
+from typing import Optional, Dict, Any, List, Union
+
+from src.models.asr.base import BaseASRModel
+from funasr import AutoModel
+
+
+class StreamingASRSession:
+    """
+    一路流式识别会话
+
+    保存 FunASR 的 cache 字典与不足一个 chunk 的采样；feed 每凑满一个 chunk 就识别一次，
+    返回本次新增的文字。会话同时保留完整波形，结束后交给 emotion2vec。
+    一个会话只应在同一时刻被一个调用方使用。
+    """
+
+    def __init__(self, model: "ParaformerStreamingModel"):
+        self.model = model
+        self.cache: Dict[str, Any] = {}
+        self.finished = False
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._chunks: List[np.ndarray] = []
+        self._texts: List[str] = []
+
+    @property
+    def transcript(self) -> str:
+        return "".join(self._texts)
+
+    @property
+    def num_samples(self) -> int:
+        return sum(chunk.shape[0] for chunk in self._chunks)
+
+    @property
+    def waveform(self) -> np.ndarray:
+        """目前为止收到的完整波形（16kHz 单声道 float32）"""
+        if not self._chunks:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(self._chunks)
+
+    def feed(self, samples: np.ndarray) -> str:
+        """送入一段波形，返回新识别出的文字（可能为空）"""
+        if self.finished:
+            raise RuntimeError("流式识别会话已结束")
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        self._chunks.append(samples)
+        self._pending = np.concatenate([self._pending, samples]) if self._pending.size else samples
+
+        stride = self.model.chunk_stride
+        new_texts = []
+        while self._pending.shape[0] >= stride:
+            chunk, self._pending = self._pending[:stride], self._pending[stride:]
+            new_texts.append(self.model.recognize_chunk(chunk, self.cache, is_final=False))
+        return self._commit(new_texts)
+
+    def finish(self) -> str:
+        """送入剩余采样并结束识别，返回最后新增的文字"""
+        if self.finished:
+            return ""
+        self.finished = True
+        text = self.model.recognize_chunk(self._pending, self.cache, is_final=True)
+        self._pending = np.zeros(0, dtype=np.float32)
+        return self._commit([text])
+
+    def _commit(self, texts: List[str]) -> str:
+        text = "".join(t for t in texts if t)
+        if text:
+            self._texts.append(text)
+        return text
+
+
+class ParaformerStreamingModel(BaseASRModel):
+    """Paraformer-zh-streaming 流式 ASR 模型"""
+
+    ONLINE_MODEL = "iic/speech_paraformer-large_asr_nat-zh-cn-16k-common-vocab8404-online"
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.model_name = "paraformer_streaming"
+        self.model_path = config.get("local_path")
+        self.model_id = config.get("model_id") or self.ONLINE_MODEL
+        self.use_local = config.get("use_local_models", True)
+        self.device = config.get("device")
+        # chunk_size=[0, 10, 5]：每次送入 600ms，向后看 300ms
+        self.chunk_size = list(config.get("chunk_size", [0, 10, 5]))
+        self.encoder_chunk_look_back = int(config.get("encoder_chunk_look_back", 4))
+        self.decoder_chunk_look_back = int(config.get("decoder_chunk_look_back", 1))
+
+    @property
+    def chunk_stride(self) -> int:
+        """每次识别的采样数（chunk_size[1] 个 60ms 帧，16kHz）"""
+        return self.chunk_size[1] * 960
+
+    def load_model(self) -> bool:
+        """加载流式 Paraformer 模型"""
+        try:
+            kwargs = {"device": self.device} if self.device else {}
+            if self.use_local and self.model_path and os.path.isdir(self.model_path):
+                self.model = AutoModel(model=os.path.abspath(self.model_path), **kwargs)
+            else:
+                # 本地目录不存在时从模型仓库下载
+                self.model = AutoModel(model=self.model_id, **kwargs)
+            self.is_loaded = True
+            return True
+        except Exception as e:
+            print(f"Paraformer流式模型加载失败: {e}")
+            return False
+
+    def create_session(self) -> StreamingASRSession:
+        """新建一路流式识别会话"""
+        if not self.ensure_loaded():
+            raise RuntimeError("Paraformer流式模型未加载")
+        return StreamingASRSession(self)
+
+    def recognize_chunk(self, chunk: np.ndarray, cache: Dict[str, Any], is_final: bool) -> str:
+        """识别一个 chunk；cache 在同一会话的多次调用间传递"""
+        with self._lock:
+            # 加载与推理在同一临界区：检查之后不会被空闲回收卸载
+            if not self.ensure_loaded():
+                raise RuntimeError("Paraformer流式模型未加载")
+            result = self.model.generate(
+                input=chunk,
+                cache=cache,
+                is_final=is_final,
+                chunk_size=self.chunk_size,
+                encoder_chunk_look_back=self.encoder_chunk_look_back,
+                decoder_chunk_look_back=self.decoder_chunk_look_back
+            )
+        if result and len(result) > 0:
+            return (result[0].get('text', '') or '').strip()
+        return ""
+
+    def transcribe(self, audio_path: Union[str, np.ndarray]) -> Optional[str]:
+        """整段转录（逐 chunk 送入流式模型），仅接受 16kHz 单声道波形"""
+        if not isinstance(audio_path, np.ndarray):
+            raise TypeError("流式模型只接受已解码的波形数组")
+        session = self.create_session()
+        session.feed(audio_path)
+        session.finish()
+        return session.transcript or None
@@ -2,8 +2,11 @@
 音频情感分析模型
 """
 import os
-from typing import List, Dict, Any
+import numpy as np
+from typing import List, Dict, Any, Union
 from src.models.emotion.base import BaseEmotionModel
+from src.core.batching import MicroBatcher
+from src.utils.audio_utils import estimate_audio_seconds
 from funasr import AutoModel
 
 class AudioEmotionModel(BaseEmotionModel):
@@ -14,6 +17,20 @@ class AudioEmotionModel(BaseEmotionModel):
         self.model_name = "emotion2vec"
         self.model_path = config.get("local_path")
         self.use_local = config.get("use_local_models", True)
+        self.device = config.get("device")
+
+        # 动态微批处理：并发请求的音频按时长分桶，同桶内合并为一次批量推理，减少 padding 浪费
+        batching = config.get("batching", {}) or {}
+        self.batcher = None
+        self.bucket_seconds = float(batching.get("bucket_seconds", 2.0) or 2.0)
+        if batching.get("enabled", False):
+            self.batcher = MicroBatcher(
+                "emotion2vec",
+                self._analyze_batch,
+                max_batch_size=batching.get("max_batch_size", 8),
+                max_wait_ms=batching.get("max_wait_ms", 20),
+                bucket_fn=self._length_bucket
+            )
     
     def load_model(self) -> bool:
         """加载emotion2vec模型"""
@@ -21,10 +38,10 @@ class AudioEmotionModel(BaseEmotionModel):
             if self.use_local and self.model_path:
                 # 使用本地模型
                 model_abs_path = os.path.abspath(self.model_path)
-                self.model = AutoModel(model=model_abs_path)
+                self.model = AutoModel(model=model_abs_path, **self._device_kwargs())
             else:
                 # 使用在线模型
-                self.model = AutoModel(model="iic/emotion2vec_plus_large")
+                self.model = AutoModel(model="iic/emotion2vec_plus_large", **self._device_kwargs())
             
             self.is_loaded = True
             return True
@@ -32,19 +49,46 @@ class AudioEmotionModel(BaseEmotionModel):
             print(f"emotion2vec模型加载失败: {e}")
             return False
     
-    def analyze(self, audio_path: str) -> List[Dict[str, Any]]:
-        """分析音频情感"""
-        if not self.is_model_ready():
-            if not self.load_model():
-                return []
-        
-        try:
-            result = self.model.generate(
-                audio_path,
-                output_dir="./data/temp",
+    def _device_kwargs(self) -> Dict[str, Any]:
+        """未显式配置 device 时交给 FunASR 自行选择"""
+        return {"device": self.device} if self.device else {}
+    
+    def _length_bucket(self, audio_input: Any) -> int:
+        """按音频时长分桶：时长相近的音频合批，padding 更少"""
+        return int(estimate_audio_seconds(audio_input) // self.bucket_seconds)
+
+    def _analyze_batch(self, audio_inputs: List[Any]) -> List[Any]:
+        """批量推理：一次 generate 处理整批音频，结果与输入一一对应"""
+        with self._lock:
+            # 加载与推理在同一临界区：检查之后不会被空闲回收 / 内存预算淘汰卸载
+            if not self.ensure_loaded():
+                raise RuntimeError("emotion2vec模型未加载")
+            results = self.model.generate(
+                list(audio_inputs),
+                output_dir=None,
                 granularity="utterance",
-                extract_embedding=False
+                extract_embedding=False,
+                batch_size=len(audio_inputs)
             )
+        return list(results or [])
+
+    def analyze(self, audio_path: Union[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """分析音频情感（文件路径，或 decode_audio 得到的 16kHz 单声道 float32 波形）"""
+        try:
+            if self.batcher is not None:
+                # 从批结果中拆出本请求的一条，保持与单条调用相同的返回结构（加载见 _analyze_batch）
+                item = self.batcher.submit(audio_path).result()
+                result = [item] if item else []
+            else:
+                with self._lock:
+                    if not self.ensure_loaded():
+                        return []
+                    result = self.model.generate(
+                        audio_path,
+                        output_dir=None,
+                        granularity="utterance",
+                        extract_embedding=False
+                    )
             
             # 返回原始结果，让调用者处理
             return [{"raw_result": result}] if result else []
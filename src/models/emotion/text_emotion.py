@@ -2,22 +2,49 @@
 文本情感分析模型
 """
 import os
+import copy
 from typing import List, Dict, Any
 from src.models.emotion.base import BaseEmotionModel
+from src.core.batching import MicroBatcher
+from src.core.cache import MemoryCache, TieredCache, make_cache_key, normalize_cache_text
 from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 
 class TextEmotionModel(BaseEmotionModel):
     """文本情感分析模型"""
 
+    ONLINE_MODEL_NAME = "uer/roberta-base-finetuned-jd-binary-chinese"
+
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.model_name = "text_emotion"
         self.model_path = config.get("local_path")
         self.use_local = config.get("use_local_models", True)
+        self.device = config.get("device")
         self.tokenizer = None
         self.model = None
         self.pipeline = None
 
+        # 动态微批处理：并发请求在 max_wait_ms 内合并为一次带 padding 的前向
+        batching = config.get("batching", {}) or {}
+        self.batcher = None
+        if batching.get("enabled", False):
+            self.batcher = MicroBatcher(
+                "text_emotion",
+                self._analyze_batch,
+                max_batch_size=batching.get("max_batch_size", 16),
+                max_wait_ms=batching.get("max_wait_ms", 5)
+            )
+
+        # 结果记忆化：键为 模型版本 + 归一化文本（NFKC、合并空白），换模型后旧结果自然失效
+        self.model_version = config.get("version") or (
+            f"{config.get('name', '')}@{self.model_path}" if self.use_local and self.model_path
+            else self.ONLINE_MODEL_NAME
+        )
+        memo = config.get("memo", {}) or {}
+        self.memo = None
+        if memo.get("enabled", False):
+            self.memo = TieredCache("text_emotion", [MemoryCache(memo.get("max_entries", 4096))])
+
     def load_model(self) -> bool:
         """加载文本情感分析模型"""
         try:
@@ -28,15 +55,17 @@ class TextEmotionModel(BaseEmotionModel):
                 self.model = AutoModelForSequenceClassification.from_pretrained(model_abs_path)
             else:
                 # 使用在线模型
-                model_name = "uer/roberta-base-finetuned-jd-binary-chinese"
+                model_name = self.ONLINE_MODEL_NAME
                 self.tokenizer = AutoTokenizer.from_pretrained(model_name)
                 self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
 
             # 创建pipeline
+            pipeline_kwargs = {"device": self.device} if self.device else {}
             self.pipeline = pipeline(
                 "text-classification",
                 model=self.model,
-                tokenizer=self.tokenizer
+                tokenizer=self.tokenizer,
+                **pipeline_kwargs
             )
 
             self.is_loaded = True
@@ -45,14 +74,44 @@ class TextEmotionModel(BaseEmotionModel):
             print(f"文本情感分析模型加载失败: {e}")
             return False
 
+    def _release_model(self) -> None:
+        """释放 pipeline / tokenizer / 模型"""
+        self.pipeline = None
+        self.tokenizer = None
+        self.model = None
+
+    def _analyze_batch(self, texts: List[str]) -> List[Any]:
+        """批量推理：一次前向处理整批文本，结果与输入一一对应"""
+        with self._lock:
+            # 加载与推理在同一临界区：检查之后不会被空闲回收 / 内存预算淘汰卸载
+            if not self.ensure_loaded():
+                raise RuntimeError("文本情感分析模型未加载")
+            return self.pipeline(list(texts), batch_size=len(texts), truncation=True)
+
     def analyze(self, text: str) -> List[Dict[str, Any]]:
-        """分析文本情感"""
-        if not self.is_model_ready():
-            if not self.load_model():
-                return []
+        """分析文本情感（相同文本命中记忆化缓存时不再推理）"""
+        if self.memo is None:
+            return self._analyze(text)
+
+        key = make_cache_key(self.model_version, normalize_cache_text(text))
+        cached = self.memo.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        result = self._analyze(text)
+        if result:
+            self.memo.set(key, copy.deepcopy(result))
+        return result
 
+    def _analyze(self, text: str) -> List[Dict[str, Any]]:
         try:
-            result = self.pipeline(text)
+            if self.batcher is not None:
+                # 加载在批处理线程的临界区内完成（见 _analyze_batch）
+                result = self.batcher.submit(text).result()
+            else:
+                with self._lock:
+                    if not self.ensure_loaded():
+                        return []
+                    result = self.pipeline(text)
             
             # 标准化输出格式
             if isinstance(result, list):
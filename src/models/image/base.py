@@ -2,9 +2,14 @@
 图像模型基类
 """
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, List
+from typing import Dict, Any
 from pathlib import Path
 
+from volcenginesdkarkruntime import AsyncArk
+
+from src.core.executors import run_io
+from src.core.http_client import get_http_client, get_http_client_manager
+
 class BaseImageModel(ABC):
     """图像模型基类"""
     
@@ -23,6 +28,26 @@ class BaseImageModel(ABC):
         """生成图像"""
         pass
     
+    def _ark_client(self) -> AsyncArk:
+        """
+        基于共享 HTTP 客户端构建 Ark 客户端（连接池在请求之间复用）
+
+        需要子类设置 self.base_url / self.api_key
+        """
+        return AsyncArk(
+            base_url=self.base_url,
+            api_key=self.api_key,
+            http_client=get_http_client(),
+            timeout=get_http_client_manager().timeout
+        )
+
+    async def _download(self, url: str, out_path: Path) -> str:
+        """用共享 HTTP 客户端下载远程图片到本地，返回绝对路径"""
+        resp = await get_http_client().get(url)
+        resp.raise_for_status()
+        await run_io(Path(out_path).write_bytes, resp.content)
+        return str(Path(out_path).resolve())
+    
     def is_model_ready(self) -> bool:
         """检查模型是否已加载"""
         return self.is_loaded
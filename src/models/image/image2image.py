@@ -1,16 +1,16 @@
 import os
 import logging
-import mimetypes
 import socket
-import shutil
-import base64
-import requests
 from pathlib import Path
-from volcenginesdkarkruntime import Ark
 import uuid
-from typing import Optional
+from typing import Optional, Union
 from src.core.config_manager import ConfigManager
 from src.models.image.base import BaseImageModel
+from src.core.executors import run_io
+from src.core.http_client import InlineDataURL, StreamingJSONBody, get_http_client
+from src.core.publication import get_publication_store
+from src.utils.image_utils import ImageInput
+from src.utils.image_preprocessing import get_image_preprocessor
 
 # 设置日志记录器
 logger = logging.getLogger(__name__)
@@ -52,8 +52,7 @@ class ImageEditor(BaseImageModel):
         
         logger.info(f"模型名称: {self.model_name}, 默认参数: guidance_scale={self.dft_guidance_scale}, size={self.dft_size}, watermark={self.dft_watermark}")
 
-        "sdk"
-        self.client = Ark(base_url=self.base_url, api_key=self.api_key)
+        # Ark 客户端在调用时基于共享 HTTP 客户端构建（见 BaseImageModel._ark_client）
         self.is_loaded = True
         logger.info("ImageEditor初始化完成")
     
@@ -64,11 +63,6 @@ class ImageEditor(BaseImageModel):
     def _gen_name(self, suffix=".png") -> Path:
         return self.out_dir / f"edit_{uuid.uuid4().hex}{suffix}"
 
-    @staticmethod
-    def _guess_mime(p: Path) -> str:
-        mime, _ = mimetypes.guess_type(p.name)
-        return mime or "image/png"
-
     def _get_local_ip(self) -> str:
         # 更可靠的本机内网 IP 获取（不会真的发包）
         try:
@@ -98,58 +92,53 @@ class ImageEditor(BaseImageModel):
         is_loopback = host in ("127.0.0.1", "localhost")
         return base, is_loopback
     
-    def _ensure_under_static(self, src: Path, static_root: Path) -> Path:
-        """
-        确保文件位于静态目录下；若不在，则复制进去并返回目标路径
-        """
-        try:
-            src_rel = src.resolve().relative_to(static_root.resolve())
-            # 已在静态目录
-            return src
-        except Exception:
-            static_root.mkdir(parents=True, exist_ok=True)
-            dst = static_root / src.name
-            # 避免重名覆盖，简单去重
-            i = 1
-            stem, suf = dst.stem, dst.suffix
-            while dst.exists():
-                dst = static_root / f"{stem}_{i}{suf}"
-                i += 1
-            shutil.copy2(src, dst)
-            return dst
-    
-    def _to_data_url(self, p: Path) -> str:
-        mime = self._guess_mime(p)
-        b64 = base64.b64encode(p.read_bytes()).decode("ascii")
-        return f"data:{mime};base64,{b64}"
-    
-    def _build_data_url_from_source(self, src_path: Optional[Path] = None, src_url: Optional[str] = None) -> str:
+    async def _load_fallback_image(
+        self,
+        src_url: Optional[str] = None,
+        src_image: Optional[ImageInput] = None
+    ) -> ImageInput:
         """
-        将本地文件或远程 URL 转为 data URL（data:image/<fmt>;base64,...）
-        优先使用 src_path，其次 src_url。
+        取得回退 base64 时要内嵌的图片
+        优先使用 src_image（本地图片，已预处理，不再读盘），否则下载 src_url
+        并按 i2i 目标摆正、缩小并重编码（见 image_preprocessing）。
         会检查 10MB 限制。
         """
-        if src_path and src_path.exists():
-            data = src_path.read_bytes()
-            mime = self._guess_mime(src_path)
-        elif src_url:
-            resp = requests.get(src_url, timeout=20)
-            resp.raise_for_status()
-            data = resp.content
-            ct = (resp.headers.get("Content-Type") or "").split(";")[0].strip().lower()
-            mime = ct if ct.startswith("image/") else "image/png"
+        if src_image is not None:
+            image = src_image
         else:
-            raise ValueError("既没有有效的本地路径，也没有可用的 URL，无法构建 base64。")
+            if not src_url:
+                raise ValueError("既没有本地图片，也没有可用的 URL，无法构建 base64。")
+            resp = await get_http_client().get(src_url, timeout=20)
+            resp.raise_for_status()
+            image = await get_image_preprocessor().prepare(ImageInput(resp.content), "i2i")
 
-        if len(data) > 10 * 1024 * 1024:
+        if len(image.data) > 10 * 1024 * 1024:
             raise ValueError("回退到 base64 失败：图片超过 10MB 限制")
+        return image
+
+    async def _generate_inline(self, image: ImageInput, **params) -> dict:
+        """
+        以 base64 data URL 内嵌图片直接调用 Ark 图片生成接口
 
-        b64 = base64.b64encode(data).decode("ascii")
-        return f"data:{mime};base64,{b64}"
+        不经过 SDK：SDK 需要先拼出完整的 data URL 字符串再整体序列化，
+        这里用 StreamingJSONBody 在发送时分块编码，峰值内存不随图片大小成倍增长。
+        """
+        payload = {
+            "model": self.model_name,
+            "image": InlineDataURL(image.data, image.mime),
+            "response_format": "url",
+            **{k: v for k, v in params.items() if v is not None}
+        }
+        body = StreamingJSONBody(payload)
+        headers = {"Authorization": f"Bearer {self.api_key}", **body.headers}
+        resp = await get_http_client().post(f"{self.base_url.rstrip('/')}/images/generations", headers=headers, content=body)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"Ark API 调用异常: HTTP {resp.status_code} {resp.text[:500]}")
+        return resp.json()
     
-    def edit_image(
+    async def edit_image(
         self,
-        input_path_or_url: str,
+        input_path_or_url: Union[str, ImageInput],
         prompt: str,
         guidance_scale: Optional[float] = None,
         size: Optional[str] = None,
@@ -158,20 +147,24 @@ class ImageEditor(BaseImageModel):
         save_local: bool = False
     ) -> dict:
         """
-        - input_path_or_url: 本地路径或公网URL（推荐URL，最稳定）
+        - input_path_or_url: 本地路径、公网URL（推荐URL，最稳定）或已解析的 ImageInput
         - prompt: 文本编辑指令
         - guidance_scale/size/seed/watermark: 覆盖默认参数
         - save_local: 是否下载远端图片到本地 static 目录
         规则：
-        * 如果是本地路径 -> 优先转换为本机IP静态URL；若 base_url 是 127.0.0.1/localhost，则转成 base64 data URL
+        * 如果是本地路径 / ImageInput -> 发布到内容寻址目录（硬链接 / 符号链接，不复制），
+          构造本机地址上的短时签名 URL（见 src.core.publication）；Ark 无法下载时回退 base64
         * 如果是 URL -> 直接透传
-        需要配置（可选）：
-        self.static_root: 静态文件物理根目录（Path 或 str），默认 "static"
-        self.static_mount: 静态路由前缀（如 "/static"），默认 "/static"
+        * 回退 base64 时直接用内存中的字节，不再读盘
         """
 
+        src_image: Optional[ImageInput] = None
+        if isinstance(input_path_or_url, ImageInput):
+            # 先摆正、缩小并重编码：Ark 下载静态 URL 与 base64 回退都用派生图
+            src_image = await get_image_preprocessor().prepare(input_path_or_url, "i2i")
+            input_path_or_url = src_image.path or ""
         input_path_or_url = str(input_path_or_url)  # 统一为 str
-        logger.info(f"开始图片编辑，输入: {input_path_or_url}, 提示词: {prompt}")
+        logger.info(f"开始图片编辑，输入: {input_path_or_url or src_image.filename or '内存图片'}, 提示词: {prompt}")
 
         guidance_scale = float(guidance_scale or self.dft_guidance_scale)
         size = size or self.dft_size
@@ -179,56 +172,64 @@ class ImageEditor(BaseImageModel):
 
         logger.info(f"使用参数: guidance_scale={guidance_scale}, size={size}, watermark={watermark}")
 
-        # 静态目录与 mount（若未设置则给默认）
-        static_root = Path(getattr(self, "static_root", "static"))
-        static_mount = getattr(self, "static_mount", "/static").rstrip("/")
-
         is_url = input_path_or_url.lower().startswith(("http://", "https://"))
 
-        src_path: Optional[Path] = None
         src_url: Optional[str] = None
 
-        # 计算 image 参数（只能是 URL 或 base64 字符串）
+        # 计算 image 参数（URL；回退时替换为 ImageInput，以 base64 内嵌发送）
         if is_url:
             logger.info(f"处理URL图片: {input_path_or_url}")
             image_param = input_path_or_url
             src_url = image_param  # 记录原始 URL，供回退使用
         else:
-            p = Path(input_path_or_url)
-            if not (p.exists() and p.is_file()):
-                error_msg = f"Input image not found: {p}"
-                logger.error(error_msg)
-                raise FileNotFoundError(error_msg)
+            if src_image is None:
+                p = Path(input_path_or_url)
+                if not (p.exists() and p.is_file()):
+                    error_msg = f"Input image not found: {p}"
+                    logger.error(error_msg)
+                    raise FileNotFoundError(error_msg)
+                # 本地文件同样先预处理，Ark 下载的是缩小后的派生图
+                src_image = await get_image_preprocessor().prepare(await run_io(ImageInput.from_path, str(p)), "i2i")
 
-            # 1) 先把本地文件确保放进静态目录
-            p_in_static = self._ensure_under_static(p, static_root)
+            # 1) 发布：原图无需处理时链接本地文件，派生图 / 内存中的图片写入一次；同一内容只刷新有效期
+            publication = get_publication_store()
+            name = await run_io(publication.publish, src_image)
 
-            # 2) 构造可访问的静态 URL（无论 base_url 是公网还是本机/私网，都先尝试 URL）
+            # 2) 构造短时有效的签名 URL（无论 base_url 是公网还是本机/私网，都先尝试 URL）
             base_url, _ = self._get_public_base_url()
             base_url = (base_url or "").rstrip("/")
+            image_param = f"{base_url}{publication.signed_path(name)}"
 
-            rel = p_in_static.resolve().relative_to(static_root.resolve()).as_posix()
-            image_param = f"{base_url}{static_mount}/{rel}"
-
-            # 记录回退源：优先用本地静态文件，必要时也用该 URL
-            src_path = p_in_static
+            # 回退 base64 时直接用 src_image
             src_url = image_param
 
-            logger.info(f"本地图片已放入静态目录并构造 URL: {image_param}")
+            logger.info(f"本地图片已发布并构造签名 URL: {image_param}")
 
+        client = self._ark_client()
         first_error = None
         for attempt in (1, 2):
             try:
                 logger.info(f"调用Ark API（第 {attempt} 次），模型: {self.model_name}")
-                resp = self.client.images.generate(
-                    model=self.model_name,
-                    prompt=prompt,
-                    image=image_param,   # 第一次用 URL 或 data URL；必要时回退替换为 base64 再重试
-                    seed=seed,
-                    guidance_scale=guidance_scale,
-                    size=size,
-                    watermark=watermark
-                )
+                if isinstance(image_param, ImageInput):
+                    # 回退：图片以 base64 内嵌在请求体中，发送时分块编码
+                    resp = await self._generate_inline(
+                        image_param,
+                        prompt=prompt,
+                        seed=seed,
+                        guidance_scale=guidance_scale,
+                        size=size,
+                        watermark=watermark
+                    )
+                else:
+                    resp = await client.images.generate(
+                        model=self.model_name,
+                        prompt=prompt,
+                        image=image_param,   # 第一次用 URL；必要时回退为 base64 再重试
+                        seed=seed,
+                        guidance_scale=guidance_scale,
+                        size=size,
+                        watermark=watermark
+                    )
                 logger.info("Ark API调用成功")
                 break  # 成功，跳出循环
 
@@ -251,10 +252,12 @@ class ImageEditor(BaseImageModel):
                 if retryable:
                     try:
                         logger.warning("远端无法下载该 URL，回退为 base64 data URL 并重试一次")
-                        image_param = self._build_data_url_from_source(src_path=src_path, src_url=src_url)
+                        image_param = await self._load_fallback_image(
+                            src_url=src_url, src_image=src_image
+                        )
                         continue
                     except Exception as conv_err:
-                        logger.error(f"构建 base64 data URL 失败：{conv_err}")
+                        logger.error(f"读取回退图片失败：{conv_err}")
                         raise first_error
 
                 # 非可重试场景或已重试过：抛出最初的错误，便于观测
@@ -263,7 +266,7 @@ class ImageEditor(BaseImageModel):
 
         # —— 解析返回 —— #
         try:
-            remote_url = resp.data[0].url
+            remote_url = resp["data"][0]["url"] if isinstance(resp, dict) else resp.data[0].url
             logger.info(f"获取到远程URL: {remote_url}")
         except Exception as e:
             error_msg = f"Ark API 响应解析失败: {str(e)}"
@@ -278,16 +281,12 @@ class ImageEditor(BaseImageModel):
 
         if save_local:
             logger.info("开始下载图片到本地")
-            r = requests.get(remote_url, timeout=60)
-            r.raise_for_status()
-            out_path = self._gen_name(".png")
-            Path(out_path).write_bytes(r.content)
-            result["output_path"] = str(Path(out_path).resolve())
+            result["output_path"] = await self._download(remote_url, self._gen_name(".png"))
             logger.info(f"图片已保存到本地: {result['output_path']}")
 
         logger.info("图片编辑完成")
         return result
     
-    def generate(self, **kwargs) -> dict:
+    async def generate(self, **kwargs) -> dict:
         """实现基类的generate方法"""
-        return self.edit_image(**kwargs)
\ No newline at end of file
+        return await self.edit_image(**kwargs)
\ No newline at end of file
@@ -1,13 +1,15 @@
 # moodcanvas/text2image_t2i.py
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, Dict, Any
+import asyncio
+import logging
 import uuid
 import os
-from volcenginesdkarkruntime import Ark
-import requests
 from src.core.config_manager import ConfigManager
 from src.models.image.base import BaseImageModel
 
+logger = logging.getLogger(__name__)
+
 class ImageGenerator(BaseImageModel):
     """
     Doubao-Seedream-3.0-t2i（Ark API）文生图
@@ -35,8 +37,10 @@ class ImageGenerator(BaseImageModel):
         self.dft_size = dft.get("size", "1024x1024")   # t2i 用具体分辨率
         self.dft_num_images = int(dft.get("num_images", 1))
         self.dft_watermark = bool(dft.get("watermark", True))
+        # 多张图并发生成时的并发上限（同时在途的 Ark 调用数）
+        self.max_concurrency = max(1, int(self.cfg.get("max_concurrency", 4)))
 
-        self.client = Ark(base_url=self.base_url, api_key=self.api_key)
+        # Ark 客户端在调用时基于共享 HTTP 客户端构建（见 BaseImageModel._ark_client）
         self.is_loaded = True
 
     def load_model(self) -> bool:
@@ -46,11 +50,11 @@ class ImageGenerator(BaseImageModel):
     def _gen_name(self, idx: int, suffix=".png") -> Path:
         return self.out_dir / f"t2i_{uuid.uuid4().hex}_{idx}{suffix}"
 
-    def _one_call(self, prompt: str, guidance_scale: float, size: str,
-                  seed: Optional[int], watermark: bool):
+    async def _one_call(self, client, prompt: str, guidance_scale: float, size: str,
+                        seed: Optional[int], watermark: bool):
         # 有的 SDK 不支持 n 参数；稳妥：单次只取一张
         try:
-            resp = self.client.images.generate(
+            resp = await client.images.generate(
                 model=self.model_name,
                 prompt=prompt,
                 seed=seed,
@@ -69,7 +73,7 @@ class ImageGenerator(BaseImageModel):
             detail = getattr(resp, "__dict__", str(resp))
             raise RuntimeError(f"Ark API 响应解析失败: {e}. resp={detail}")
 
-    def generate(
+    async def generate(
         self,
         prompt: str,
         guidance_scale: Optional[float] = None,
@@ -79,26 +83,60 @@ class ImageGenerator(BaseImageModel):
         watermark: Optional[bool] = None,
         save_local: bool = False
     ) -> dict:
+        """
+        生成 num_images 张图片（并发调用，单张失败不影响其它图片）
+
+        Returns:
+            {"remote_urls", "outputs": [{"index", "remote_url", "local_path"?}],
+             "local_paths"（save_local 时，仅下载成功的）, "errors"?: [{"index", "stage", "error"}]}
+            stage 为 "generate"（生成失败）或 "download"（已生成、下载失败，remote_url 仍在 outputs 中）
+        """
         guidance_scale = float(guidance_scale or self.dft_guidance_scale)
         size = size or self.dft_size
         watermark = self.dft_watermark if watermark is None else bool(watermark)
         n = int(num_images or self.dft_num_images)
 
-        remote_urls: List[str] = []
-        for _ in range(max(1, n)):
-            url = self._one_call(prompt, guidance_scale, size, seed, watermark)
-            remote_urls.append(url)
+        client = self._ark_client()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def one_image(idx: int) -> Dict[str, Any]:
+            # 单张图：生成 +（可选）下载；失败只影响这一张
+            async with semaphore:
+                url = await self._one_call(client, prompt, guidance_scale, size, seed, watermark)
+                item: Dict[str, Any] = {"index": idx, "remote_url": url}
+                if save_local:
+                    # 图片已生成（已计费）：下载失败时仍返回 remote_url，错误单独记录
+                    try:
+                        item["local_path"] = await self._download(url, self._gen_name(idx, ".png"))
+                    except Exception as e:
+                        item["download_error"] = f"图片下载失败: {e}"
+                return item
 
-        result = {"remote_urls": remote_urls}
+        outcomes = await asyncio.gather(*(one_image(i) for i in range(max(1, n))), return_exceptions=True)
 
+        items = [o for o in outcomes if not isinstance(o, BaseException)]
+        if not items:
+            # 全部生成失败：抛出第一张的错误
+            raise next(o for o in outcomes if isinstance(o, BaseException))
+        errors = [
+            {"index": i, "stage": "generate", "error": str(o)}
+            for i, o in enumerate(outcomes) if isinstance(o, BaseException)
+        ]
+        errors += [
+            {"index": item["index"], "stage": "download", "error": item.pop("download_error")}
+            for item in items if "download_error" in item
+        ]
+        errors.sort(key=lambda err: err["index"])
+        for err in errors:
+            logger.warning(f"第 {err['index'] + 1}/{len(outcomes)} 张图片失败（{err['stage']}）: {err['error']}")
+
+        result: Dict[str, Any] = {
+            "remote_urls": [item["remote_url"] for item in items],
+            "outputs": items
+        }
         if save_local:
-            local_paths: List[str] = []
-            for i, url in enumerate(remote_urls):
-                out_path = self._gen_name(i, ".png")
-                r = requests.get(url, timeout=60)
-                r.raise_for_status()
-                out_path.write_bytes(r.content)
-                local_paths.append(str(out_path.resolve()))
-            result["local_paths"] = local_paths
-
-        return result
\ No newline at end of file
+            result["local_paths"] = [item["local_path"] for item in items if "local_path" in item]
+        if errors:
+            result["errors"] = errors
+
+        return result
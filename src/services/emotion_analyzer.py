@@ -3,17 +3,18 @@
 """
 import os
 import json
+import asyncio
 import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Tuple, Union
-from PIL import Image
-import io
+from typing import Dict, Any, List, Optional, Tuple, Union, Awaitable, AsyncIterator
+import numpy as np
 
 import logging
 from datetime import datetime, timezone
 import time
-import base64
-import requests
+import hashlib
+import copy
+import threading
 
 from src.models.emotion.text_emotion import TextEmotionModel
 from src.models.emotion.audio_emotion import AudioEmotionModel
@@ -21,12 +22,20 @@ from src.models.image.image2image import ImageEditor
 from src.models.image.text2image import ImageGenerator
 from src.services.text_generator import TextGenerator
 from src.models.asr.paraformer import ParaformerModel
-from src.utils.file_utils import save_upload_file
+from src.models.asr.paraformer_streaming import ParaformerStreamingModel, StreamingASRSession
+from src.utils.audio_utils import decode_audio
 
 from src.core.config_manager import ConfigManager
-from src.core.exceptions import EmotionAnalysisError, AudioProcessingError, GenerationError, ImageProcessingError, FileValidationError
+from src.core.model_registry import get_model_registry
+from src.core.executors import run_cpu, run_io
+from src.core.http_client import InlineDataURL, StreamingJSONBody, get_http_client
+from src.core.cache import build_tiered_cache, make_cache_key
+from src.core.exceptions import EmotionAnalysisError, AudioProcessingError, GenerationError, ImageProcessingError, FileValidationError, ServiceUnavailableError
 from src.services.text_generator import TextGenerator
-from src.utils.image_utils import validate_image_file
+from src.utils.image_utils import ImageInput, validate_image_file, dhash
+from src.utils.image_preprocessing import get_image_preprocessor
+from src.utils.perceptual_hash import PerceptualHashIndex
+from src.core.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -49,15 +58,23 @@ class MultiModelEmotionAnalyzer:
         self.asr_model = None
         self.text_emotion_model = None
         self.audio_emotion_model = None
+        self.streaming_asr_model = None  # 流式 Paraformer（可选，供 WebSocket 流式识别使用）
         self.image_generator = ImageGenerator(config_manager)
         self.image_editor = ImageEditor(config_manager)
         self.text_generator = TextGenerator(config_manager)
+        # 三阶段结果缓存：客户端重传同一段语音时，按解码后 PCM 的哈希直接返回上次结果
+        self.three_stage_cache = build_tiered_cache(
+            "three_stage", (config_manager.config.get("cache", {}) or {}).get("three_stage")
+        )
         self.setup_models()
     
     def setup_models(self):
-        """初始化三个模型"""
+        """初始化三个模型（从进程级注册表获取，已加载的模型直接复用）"""
         print("🚀 正在初始化三阶段情感分析模型...")
         use_local = self.config_manager.config.get("settings", {}).get("use_local_models", True)
+        registry = get_model_registry()
+        registry.configure(self.config_manager.config.get("model_registry", {}))
+        lazy = registry.lazy_loading
         
         # 阶段1: Paraformer-zh ASR
         try:
@@ -69,15 +86,13 @@ class MultiModelEmotionAnalyzer:
             if model_id:
                 paraformer_config["model_id"] = model_id
             
-            self.asr_model = ParaformerModel(paraformer_config)
-            # 检查模型是否有load_model方法，如果没有则跳过
-            if hasattr(self.asr_model, 'load_model'):
-                if self.asr_model.load_model():
-                    print("✅ 阶段1: Paraformer-zh ASR 模型加载成功")
-                else:
-                    print("❌ 阶段1: Paraformer-zh ASR 模型加载失败")
+            self.asr_model = registry.get_model("paraformer", paraformer_config, ParaformerModel)
+            if lazy and not self.asr_model.is_model_ready():
+                print("⏳ 阶段1: Paraformer-zh ASR 模型已注册，首次使用时加载")
+            elif self.asr_model.is_model_ready():
+                print("✅ 阶段1: Paraformer-zh ASR 模型加载成功")
             else:
-                print("⚠️  阶段1: Paraformer-zh ASR 模型初始化完成（无load_model方法）")
+                print("❌ 阶段1: Paraformer-zh ASR 模型加载失败")
         except Exception as e:
             print(f"❌ 阶段1: Paraformer-zh ASR 模型初始化失败: {e}")
             self.asr_model = None
@@ -92,14 +107,13 @@ class MultiModelEmotionAnalyzer:
             if model_id:
                 text_emotion_config["model_id"] = model_id
             
-            self.text_emotion_model = TextEmotionModel(text_emotion_config)
-            if hasattr(self.text_emotion_model, 'load_model'):
-                if self.text_emotion_model.load_model():
-                    print("✅ 阶段2: 文本情感分类模型加载成功")
-                else:
-                    print("❌ 阶段2: 文本情感分类模型加载失败")
+            self.text_emotion_model = registry.get_model("text_emotion", text_emotion_config, TextEmotionModel)
+            if lazy and not self.text_emotion_model.is_model_ready():
+                print("⏳ 阶段2: 文本情感分类模型已注册，首次使用时加载")
+            elif self.text_emotion_model.is_model_ready():
+                print("✅ 阶段2: 文本情感分类模型加载成功")
             else:
-                print("⚠️  阶段2: 文本情感分类模型初始化完成（无load_model方法）")
+                print("❌ 阶段2: 文本情感分类模型加载失败")
         except Exception as e:
             print(f"❌ 阶段2: 文本情感分类模型初始化失败: {e}")
             self.text_emotion_model = None
@@ -114,29 +128,55 @@ class MultiModelEmotionAnalyzer:
             if model_id:
                 audio_emotion_config["model_id"] = model_id
             
-            self.audio_emotion_model = AudioEmotionModel(audio_emotion_config)
-            if hasattr(self.audio_emotion_model, 'load_model'):
-                if self.audio_emotion_model.load_model():
-                    print("✅ 阶段3: emotion2vec 声学情感分析模型加载成功")
-                else:
-                    print("❌ 阶段3: emotion2vec 声学情感分析模型初始化失败")
+            self.audio_emotion_model = registry.get_model("emotion2vec", audio_emotion_config, AudioEmotionModel)
+            if lazy and not self.audio_emotion_model.is_model_ready():
+                print("⏳ 阶段3: emotion2vec 声学情感分析模型已注册，首次使用时加载")
+            elif self.audio_emotion_model.is_model_ready():
+                print("✅ 阶段3: emotion2vec 声学情感分析模型加载成功")
             else:
-                print("⚠️  阶段3: emotion2vec 声学情感分析模型初始化完成（无load_model方法）")
+                print("❌ 阶段3: emotion2vec 声学情感分析模型初始化失败")
         except Exception as e:
             print(f"❌ 阶段3: emotion2vec 声学情感分析模型初始化失败: {e}")
             self.audio_emotion_model = None
 
+        # 可选: 流式 Paraformer（边说边出字）
+        streaming_config = self.config_manager.config.get("models", {}).get("paraformer_streaming", {})
+        if streaming_config.get("enabled", False):
+            try:
+                streaming_config["use_local_models"] = use_local
+                self.streaming_asr_model = registry.get_model(
+                    "paraformer_streaming", streaming_config, ParaformerStreamingModel
+                )
+                if lazy and not self.streaming_asr_model.is_model_ready():
+                    print("⏳ 流式 Paraformer 模型已注册，首次使用时加载")
+                elif self.streaming_asr_model.is_model_ready():
+                    print("✅ 流式 Paraformer 模型加载成功")
+                else:
+                    print("❌ 流式 Paraformer 模型加载失败")
+            except Exception as e:
+                print(f"❌ 流式 Paraformer 模型初始化失败: {e}")
+                self.streaming_asr_model = None
+
+    def create_stream_session(self) -> StreamingASRSession:
+        """新建一路流式识别会话（流式模型未启用或加载失败时抛出 AudioProcessingError）"""
+        if not self.streaming_asr_model:
+            raise AudioProcessingError("流式ASR模型未启用")
+        try:
+            return self.streaming_asr_model.create_session()
+        except Exception as e:
+            raise AudioProcessingError(f"流式ASR会话创建失败: {e}")
+
     def _load_models(self):
         """加载所有模型（兼容性方法）"""
         try:
-            if self.text_emotion_model and hasattr(self.text_emotion_model, 'load_model'):
-                if not self.text_emotion_model.load_model():
+            if self.text_emotion_model and hasattr(self.text_emotion_model, 'ensure_loaded'):
+                if not self.text_emotion_model.ensure_loaded():
                     logger.warning("文本情感分析模型加载失败")
-            if self.audio_emotion_model and hasattr(self.audio_emotion_model, 'load_model'):
-                if not self.audio_emotion_model.load_model():
+            if self.audio_emotion_model and hasattr(self.audio_emotion_model, 'ensure_loaded'):
+                if not self.audio_emotion_model.ensure_loaded():
                     logger.warning("音频情感分析模型加载失败")
-            if self.asr_model and hasattr(self.asr_model, 'load_model'):
-                if not self.asr_model.load_model():
+            if self.asr_model and hasattr(self.asr_model, 'ensure_loaded'):
+                if not self.asr_model.ensure_loaded():
                     logger.warning("ASR模型加载失败")
             logger.info("模型加载完成")
         except Exception as e:
@@ -150,7 +190,7 @@ class MultiModelEmotionAnalyzer:
                 raise EmotionAnalysisError("文本情感分析模型未初始化")
             
             # 1. 执行情感分析
-            emotion_result = self.text_emotion_model.analyze(text)
+            emotion_result = await run_cpu(self.text_emotion_model.analyze, text)
             if not emotion_result:
                 raise EmotionAnalysisError("文本情感分析失败，未获得有效结果")
             
@@ -161,10 +201,7 @@ class MultiModelEmotionAnalyzer:
             
             # 3. 调用第三方API生成图片
             image_prompt = self._build_image_prompt(text, emotion_tags, generated_text)
-            image_result = await self.image_service.generate_image_service(
-                prompt=image_prompt,
-                style=style_preference or 'default'
-            )
+            image_result = await self.image_generator.generate(prompt=image_prompt)
             
             # 4. 组装结果
             processing_time = time.time() - start_time
@@ -172,7 +209,7 @@ class MultiModelEmotionAnalyzer:
             result = {
                 'generated_content': {
                     'text': generated_text,
-                    'image_url': image_result['generation_result']['remote_urls'],
+                    'image_url': image_result['remote_urls'],
                     'style': style_preference or 'default',
                     'metadata': {
                         'language': language,
@@ -189,32 +226,13 @@ class MultiModelEmotionAnalyzer:
     
     async def process_audio_service(self, audio_data: bytes, language: str = "zh", enable_dual_analysis: bool = True, fusion_strategy: str = "weighted") -> Dict[str, Any]:
         start_time = time.time()
-        temp_audio_path = None
         try:
-            temp_audio_path = self._save_temp_audio(audio_data)
-            
-            if not self.asr_model:
-                raise AudioProcessingError("ASR模型未初始化")
-            
-            transcribed_text = self.asr_model.transcribe(temp_audio_path)
-            if not transcribed_text:
-                raise AudioProcessingError("语音识别失败")
+            # 在内存中解码一次，ASR 与音频情感共享同一份波形
+            waveform = await self._decode_audio_input(audio_data)
             
-            audio_emotion_tags = ['neutral']  # 默认值
-            if self.audio_emotion_model:
-                try:
-                    audio_emotion_result = self.audio_emotion_model.analyze(temp_audio_path)
-                    audio_emotion_tags = self._extract_audio_emotion_tags(audio_emotion_result)
-                except Exception as e:
-                    logger.warning(f"音频情感分析失败: {e}")
-            
-            text_emotion_tags = ['neutral']  # 默认值
-            if self.text_emotion_model:
-                try:
-                    text_emotion_result = self.text_emotion_model.analyze(transcribed_text)
-                    text_emotion_tags = self._extract_text_emotion_tags(text_emotion_result)
-                except Exception as e:
-                    logger.warning(f"文本情感分析失败: {e}")
+            transcribed_text = await self._asr_stage(waveform)
+            audio_emotion_tags = await self._audio_emotion_stage(waveform)
+            text_emotion_tags = await self._text_emotion_stage(transcribed_text)
             
             merged_emotion = self._fuse_emotions(audio_emotion_tags, text_emotion_tags, fusion_strategy)
             generated_text = await self._generate_text_with_llm(transcribed_text, merged_emotion, None, language)
@@ -223,7 +241,7 @@ class MultiModelEmotionAnalyzer:
             if self.image_generator:
                 try:
                     image_prompt = self._build_image_prompt(transcribed_text, merged_emotion, generated_text)
-                    image_result = self.image_generator.generate(prompt=image_prompt, save_local=True)
+                    image_result = await self.image_generator.generate(prompt=image_prompt, save_local=True)
                     image_path = image_result['local_paths'][0] if image_result and image_result.get('local_paths') else None
                 except Exception as e:
                     logger.warning(f"图片生成失败: {e}")
@@ -267,12 +285,11 @@ class MultiModelEmotionAnalyzer:
                 'status': 'success'
             }
             return result
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             logger.error(f"音频处理服务失败: {str(e)}", exc_info=True)
             raise AudioProcessingError(f"音频处理失败: {str(e)}")
-        finally:
-            if temp_audio_path and os.path.exists(temp_audio_path):
-                self._cleanup_temp_file(temp_audio_path)
 
     def _extract_audio_emotion_tags(self, emotion_result: List[Dict[str, Any]]) -> List[str]:
         tags = []
@@ -352,70 +369,179 @@ class MultiModelEmotionAnalyzer:
         style_desc = f"风格：{style}" if style else ""
         return f"基于您的情感'{emotion_desc}'，我为'{text}'创作了这段文案：在{emotion_desc}的旋律中，{text}仿佛有了新的生命..."
 
-    def _save_temp_audio(self, audio_data: bytes) -> str:
-        import tempfile
-        temp_dir = "data/temp"
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_file = tempfile.NamedTemporaryFile(dir=temp_dir, suffix=".wav", delete=False)
-        temp_file.write(audio_data)
-        temp_file.close()
-        return temp_file.name
-
-    def _cleanup_temp_file(self, file_path: str):
+    @staticmethod
+    async def _timed_stage(stage_timings: Dict[str, float], stage: str, awaitable: Awaitable[Any]) -> Any:
+        """执行一个阶段并记录耗时（毫秒）"""
+        stage_start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            stage_timings[stage] = round((time.perf_counter() - stage_start) * 1000, 1)
+
+    async def _asr_stage(self, audio_input: Any) -> str:
+        """阶段：ASR 转录"""
+        if not self.asr_model:
+            raise AudioProcessingError("ASR模型未初始化")
+        transcribed_text = await run_cpu(self.asr_model.transcribe, audio_input)
+        if not transcribed_text:
+            raise AudioProcessingError("语音识别失败")
+        return transcribed_text
+
+    async def _text_emotion_stage(self, text: str, failures: Optional[List[str]] = None) -> List[str]:
+        """阶段：文本情感分析，失败时回退为 neutral（并记入 failures）"""
+        if not self.text_emotion_model:
+            return ['neutral']
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"临时文件已清理: {file_path}")
+            text_emotion_result = await run_cpu(self.text_emotion_model.analyze, text)
+            # 模型内部出错时返回空列表：同样按失败处理，避免 neutral 回退被写入缓存
+            if not isinstance(text_emotion_result, list) or not text_emotion_result:
+                raise EmotionAnalysisError("文本情感分析未获得有效结果")
+            return self._extract_text_emotion_tags(text_emotion_result)
+        except ServiceUnavailableError:
+            raise
+        except Exception as e:
+            logger.warning(f"文本情感分析失败: {e}")
+            if failures is not None:
+                failures.append("text_emotion")
+            return ['neutral']
+
+    async def _audio_emotion_stage(self, audio_input: Any, failures: Optional[List[str]] = None) -> List[str]:
+        """阶段：音频情感分析（emotion2vec），失败时回退为 neutral（并记入 failures）"""
+        if not self.audio_emotion_model:
+            return ['neutral']
+        try:
+            audio_emotion_result = await run_cpu(self.audio_emotion_model.analyze, audio_input)
+            if not isinstance(audio_emotion_result, list) or not audio_emotion_result:
+                raise AudioProcessingError("音频情感分析未获得有效结果")
+            return self._extract_audio_emotion_tags(audio_emotion_result)
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
-            logger.warning(f"清理临时文件失败: {str(e)}")
+            logger.warning(f"音频情感分析失败: {e}")
+            if failures is not None:
+                failures.append("audio_emotion")
+            return ['neutral']
 
-    async def run_three_stage_analysis(self, audio_path: str) -> Dict[str, Any]:
-        """运行三阶段情感分析"""
+    @staticmethod
+    def _fingerprint_waveform(waveform: np.ndarray) -> str:
+        """解码后 PCM 的内容哈希（blake2b），与原始文件的容器 / 编码无关"""
+        data = np.ascontiguousarray(waveform, dtype=np.float32)
+        return hashlib.blake2b(memoryview(data).cast("B"), digest_size=16).hexdigest()
+
+    async def _decode_audio_input(self, audio: Union[str, bytes, np.ndarray]) -> np.ndarray:
+        """把上传数据 / 文件路径统一解码为 16kHz 单声道 float32 波形（已是波形则原样返回）"""
+        if isinstance(audio, np.ndarray):
+            return audio
+        if isinstance(audio, (str, Path)):
+            audio = await run_io(Path(audio).read_bytes)
+        return await run_cpu(decode_audio, audio)
+
+    async def run_three_stage_analysis(
+        self,
+        audio: Union[str, bytes, np.ndarray],
+        transcript: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        运行三阶段情感分析
+
+        transcript 不为空时（如流式识别已得到转写）跳过 ASR 阶段直接使用该文本，也不走结果缓存。
+
+        音频只解码一次（内存中重采样为 16kHz 单声道 float32），
+        同一份波形数组同时交给 Paraformer 和 emotion2vec，不再写临时文件。
+
+        流水线模式（settings.pipelined_audio_analysis）下，emotion2vec 不依赖转写结果，
+        与 ASR 同时开始；文本情感在转写完成后立即开始。否则按 ASR → 文本情感 → 音频情感 顺序执行。
+        各阶段耗时（毫秒）在 stage_timings 中返回。
+
+        启用 cache.three_stage 时，先对解码后的 PCM 计算哈希；命中则直接返回缓存的转写与情感结果
+        （cached=True），不再运行 Paraformer / emotion2vec。有阶段回退为 neutral 的结果不写入缓存。
+        """
         start_time = time.time()
+        stage_timings: Dict[str, float] = {}
+        failures: List[str] = []
+        pipelined = self.config_manager.config.get("settings", {}).get("pipelined_audio_analysis", False)
         try:
-            # 阶段1: ASR转录
-            if not self.asr_model:
-                raise AudioProcessingError("ASR模型未初始化")
-            
-            transcribed_text = self.asr_model.transcribe(audio_path)
-            if not transcribed_text:
-                raise AudioProcessingError("语音识别失败")
-            
-            # 阶段2: 文本情感分析
-            text_emotion_tags = ['neutral']  # 默认值
-            if self.text_emotion_model:
-                try:
-                    text_emotion_result = self.text_emotion_model.analyze(transcribed_text)
-                    text_emotion_tags = self._extract_text_emotion_tags(text_emotion_result)
-                except Exception as e:
-                    logger.warning(f"文本情感分析失败: {e}")
-            
-            # 阶段3: 音频情感分析
-            audio_emotion_tags = ['neutral']  # 默认值
-            if self.audio_emotion_model:
+            waveform = await self._timed_stage(stage_timings, "decode_ms", self._decode_audio_input(audio))
+
+            cache_key = None
+            if self.three_stage_cache is not None and not transcript:
+                fingerprint = await self._timed_stage(
+                    stage_timings, "fingerprint_ms", run_cpu(self._fingerprint_waveform, waveform)
+                )
+                cache_key = make_cache_key("three_stage", fingerprint)
+                cached = self.three_stage_cache.get(cache_key)
+                if cached is not None:
+                    return {
+                        'transcribed_text': cached['transcribed_text'],
+                        'emotion_analysis': copy.deepcopy(cached['emotion_analysis']),
+                        'processing_time': round(time.time() - start_time, 3),
+                        'stage_timings': stage_timings,
+                        'pipelined': pipelined,
+                        'cached': True,
+                        'status': 'success'
+                    }
+
+            if pipelined:
+                audio_task = asyncio.ensure_future(
+                    self._timed_stage(stage_timings, "audio_emotion_ms", self._audio_emotion_stage(waveform, failures))
+                )
                 try:
-                    audio_emotion_result = self.audio_emotion_model.analyze(audio_path)
-                    audio_emotion_tags = self._extract_audio_emotion_tags(audio_emotion_result)
-                except Exception as e:
-                    logger.warning(f"音频情感分析失败: {e}")
+                    transcribed_text = transcript or await self._timed_stage(
+                        stage_timings, "asr_ms", self._asr_stage(waveform)
+                    )
+                    text_emotion_tags = await self._timed_stage(
+                        stage_timings, "text_emotion_ms", self._text_emotion_stage(transcribed_text, failures)
+                    )
+                    audio_emotion_tags = await audio_task
+                finally:
+                    # ASR 失败时不再等待音频情感；已结束的任务取走异常，避免未检索告警
+                    if not audio_task.done():
+                        audio_task.cancel()
+                    elif not audio_task.cancelled():
+                        audio_task.exception()
+            else:
+                # 阶段1: ASR转录
+                transcribed_text = transcript or await self._timed_stage(
+                    stage_timings, "asr_ms", self._asr_stage(waveform)
+                )
+                # 阶段2: 文本情感分析
+                text_emotion_tags = await self._timed_stage(
+                    stage_timings, "text_emotion_ms", self._text_emotion_stage(transcribed_text, failures)
+                )
+                # 阶段3: 音频情感分析
+                audio_emotion_tags = await self._timed_stage(
+                    stage_timings, "audio_emotion_ms", self._audio_emotion_stage(waveform, failures)
+                )
             
             # 融合情感标签
             merged_emotion = self._fuse_emotions(audio_emotion_tags, text_emotion_tags, "weighted")
+            emotion_analysis = {
+                'audio_emotion': audio_emotion_tags,
+                'text_emotion': text_emotion_tags,
+                'merged_emotion': merged_emotion,
+                'fusion_strategy': 'weighted'
+            }
+            if cache_key is not None and not failures:
+                self.three_stage_cache.set(cache_key, {
+                    'transcribed_text': transcribed_text,
+                    'emotion_analysis': copy.deepcopy(emotion_analysis)
+                })
             
             processing_time = time.time() - start_time
             
             return {
                 'transcribed_text': transcribed_text,
-                'emotion_analysis': {
-                    'audio_emotion': audio_emotion_tags,
-                    'text_emotion': text_emotion_tags,
-                    'merged_emotion': merged_emotion,
-                    'fusion_strategy': 'weighted'
-                },
+                'emotion_analysis': emotion_analysis,
                 'processing_time': round(processing_time, 3),
+                'stage_timings': stage_timings,
+                'pipelined': pipelined,
+                'cached': False,
                 'status': 'success'
             }
             
+        except ServiceUnavailableError:
+            # 排队超过 SLO 的背压信号，交给接口层返回 503
+            raise
         except Exception as e:
             logger.error(f"三阶段情感分析失败: {str(e)}", exc_info=True)
             raise EmotionAnalysisError(f"情感分析失败: {str(e)}")
@@ -428,7 +554,7 @@ class MultiModelEmotionAnalyzer:
             if not self.text_emotion_model:
                 raise EmotionAnalysisError("文本情感分析模型未初始化")
             
-            text_emotion_result = self.text_emotion_model.analyze(text)
+            text_emotion_result = await run_cpu(self.text_emotion_model.analyze, text)
             text_emotion_tags = self._extract_text_emotion_tags(text_emotion_result)
             
             
@@ -450,69 +576,151 @@ class MultiModelEmotionAnalyzer:
 
 
 
-    async def generate_content(self, text: str, emotion_tags: List[str], image_content: dict = None, image_path: Optional[str] = None) -> Dict[str, Any]:
+    def _build_copy_prompt(self, text: str, emotion_tags: List[str], image_content: Optional[dict]) -> str:
+        """文案生成提示词"""
+        image_desc = image_content.get("caption") if image_content else ""
+        return f"请根据图片内容'{image_desc}'、情感标签'{', '.join(emotion_tags)}'和原始文字'{text}'，生成一段富有感染力的文案，可适当使用夸张、比喻等修辞,用于PLOG内容"
+
+    def _build_multimodal_image_prompt(
+        self,
+        text: str,
+        emotion_tags: List[str],
+        image_content: Optional[dict],
+        image_path: Optional[Union[str, ImageInput]]
+    ) -> str:
+        """图片编辑 / 生成提示词"""
+        if image_path:
+            # 有原图，编辑提示词更夸张/比喻
+            return f"你是一位专业的PLOG图片编辑师，小红书高赞博主，当前用户拍摄者情绪为 {emotion_tags},{(image_content or {}).get('edit_prompt', {})}\n"
+        # 无原图，直接生成
+        return f"你是一位专业的PLOG图片编辑师，小红书高赞博主,根据用户思路{text}和情感标签'{', '.join(emotion_tags)}'生成一张富有冲击力的PLOG图片。"
+
+    async def generate_copy(self, text: str, emotion_tags: List[str], image_content: dict = None) -> str:
+        """生成文案；失败时返回以“文案生成失败”开头的说明文字"""
+        text_prompt = self._build_copy_prompt(text, emotion_tags, image_content)
+        if not self.text_generator:
+            return text_prompt
+        try:
+            return await self.text_generator.generate_text(
+                text=text,
+                emotion_tags=emotion_tags,
+                style=None,
+                image_content=image_content.get("caption") if image_content else "",
+                custom_prompt=text_prompt
+            )
+        except Exception as e:
+            logger.warning(f"文案生成失败: {e}")
+            return f"文案生成失败: {str(e)}"
+
+    async def generate_image(
+        self,
+        text: str,
+        emotion_tags: List[str],
+        image_content: dict = None,
+        image_path: Optional[Union[str, ImageInput]] = None,
+        caption_line: str = ""
+    ) -> Optional[str]:
         """
-        统一生成逻辑：输入图/文/音至少一种，情感分析后合并，统一传给第三方API生成文，最终只返回第三方API生成的文。
+        有原图时编辑原图（并把 caption_line 写到图上），否则文生图；返回静态访问 URL，失败返回 None
+
+        image_path 可以是本地路径，也可以是分析阶段已解析的 ImageInput（直接提交，不再读盘）
         """
+        if not self.image_generator:
+            return None
+        image_prompt = self._build_multimodal_image_prompt(text, emotion_tags, image_content, image_path)
         try:
-            
-            # 构建第三方API输入
-            image_desc = image_content.get("caption") if image_content else ""
-            
-            # 构造图片编辑/生成提示词
             if image_path:
-                # 有原图，编辑提示词更夸张/比喻
-                image_prompt = f"你是一位专业的PLOG图片编辑师，小红书高赞博主，当前用户拍摄者情绪为 {emotion_tags},{image_content.get('edit_prompt', {})}\n"
-            else:  # 无原图，直接生成
-                image_prompt = f"你是一位专业的PLOG图片编辑师，小红书高赞博主,根据用户思路{text}和情感标签'{', '.join(emotion_tags)}'生成一张富有冲击力的PLOG图片。"
+                # 编辑原图
+                image_prompt = image_prompt + f",并在图片上合适位置加入文案'{caption_line}'"
+                image_result = await self.image_editor.edit_image(
+                    input_path_or_url=image_path,
+                    prompt=image_prompt,
+                    guidance_scale=7.5,
+                    save_local=True
+                )
+                generated_image_path = image_result['output_path'] if image_result and image_result.get('output_path') else None
+            else:
+                # 生成新图
+                image_result = await self.image_generator.generate(prompt=image_prompt, save_local=True)
+                generated_image_path = image_result['local_paths'][0] if image_result and image_result.get('local_paths') else None
+            # 构建图片URL
+            if generated_image_path:
+                static_prefix = "/static/generated"
+                abs_image_path = Path(generated_image_path).resolve()
+                abs_gen_dir = Path("data/generated_images").resolve()
+                rel_path = abs_image_path.relative_to(abs_gen_dir)
+                return f"{static_prefix}/{str(rel_path).replace('\\', '/')}"
+        except Exception as e:
+            logger.warning(f"图片生成失败: {e}")
+        return None
+
+    async def generate_content_stream(
+        self,
+        text: str,
+        emotion_tags: List[str],
+        image_content: dict = None,
+        image_path: Optional[Union[str, ImageInput]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        流式版 generate_content：依次产出 ("copy_delta", 文字片段)、("copy", 完整文案)、("image", 图片 URL)
 
-            # 文案生成提示词
-            text_prompt = f"请根据图片内容'{image_desc}'、情感标签'{', '.join(emotion_tags)}'和原始文字'{text}'，生成一段富有感染力的文案，可适当使用夸张、比喻等修辞,用于PLOG内容"
+        图片不必等文案写完：文生图不依赖文案，一开始就启动；编辑原图只需要文案第一行，
+        第一行一出现就启动。
+        """
+        def start_image(caption_line: str = "") -> "asyncio.Future":
+            return asyncio.ensure_future(
+                self.generate_image(text, emotion_tags, image_content, image_path, caption_line=caption_line)
+            )
 
-            # 统一调用第三方API（假设 text_generator/image_generator 支持传入图片路径和自定义prompt）
+        image_task = None if image_path else start_image()
+        try:
             generated_text = ""
-            generated_image_path = None
-            generated_image_url = None
             if self.text_generator:
+                text_prompt = self._build_copy_prompt(text, emotion_tags, image_content)
+                parts: List[str] = []
                 try:
-                    generated_text = await self.text_generator.generate_text(
+                    async for delta in self.text_generator.stream_text(
                         text=text,
                         emotion_tags=emotion_tags,
                         style=None,
-                        image_content=image_desc,
+                        image_content=image_content.get("caption") if image_content else "",
                         custom_prompt=text_prompt
-                    )
+                    ):
+                        parts.append(delta)
+                        yield "copy_delta", delta
+                        if image_task is None:
+                            head = "".join(parts).lstrip()
+                            if '\n' in head:
+                                image_task = start_image(head.split('\n')[0])
+                    generated_text = "".join(parts).strip()
                 except Exception as e:
                     logger.warning(f"文案生成失败: {e}")
                     generated_text = f"文案生成失败: {str(e)}"
+                    if image_task is None:
+                        image_task = start_image()
             else:
-                generated_text = text_prompt
+                generated_text = self._build_copy_prompt(text, emotion_tags, image_content)
+            yield "copy", generated_text
 
-            if self.image_generator:
-                try:
-                    if image_path:
-                        # 编辑原图
-                        image_prompt = image_prompt + f",并在图片上合适位置加入文案'{generated_text.split('\n')[0]}'"
-                        image_result = self.image_editor.edit_image(
-                            input_path_or_url=image_path,
-                            prompt=image_prompt,
-                            guidance_scale=7.5,
-                            save_local=True
-                        )
-                        generated_image_path = image_result['output_path'] if image_result and image_result.get('output_path') else None
-                    else:
-                        # 生成新图
-                        image_result = self.image_generator.generate(prompt=image_prompt, save_local=True)
-                        generated_image_path = image_result['local_paths'][0] if image_result and image_result.get('local_paths') else None
-                    # 构建图片URL
-                    if generated_image_path:
-                        static_prefix = "/static/generated"
-                        abs_image_path = Path(generated_image_path).resolve()
-                        abs_gen_dir = Path("data/generated_images").resolve()
-                        rel_path = abs_image_path.relative_to(abs_gen_dir)
-                        generated_image_url = f"{static_prefix}/{str(rel_path).replace('\\', '/')}"
-                except Exception as e:
-                    logger.warning(f"图片生成失败: {e}")
+            if image_task is None:
+                # 文案只有一行
+                image_task = start_image(generated_text.split('\n')[0])
+            yield "image", await image_task
+        finally:
+            if image_task is not None and not image_task.done():
+                image_task.cancel()
+
+    async def generate_content(self, text: str, emotion_tags: List[str], image_content: dict = None, image_path: Optional[Union[str, ImageInput]] = None) -> Dict[str, Any]:
+        """
+        统一生成逻辑：输入图/文/音至少一种，情感分析后合并，统一传给第三方API生成文，最终只返回第三方API生成的文。
+
+        先生成文案，再用文案第一行生成 / 编辑图片（分步调用见 generate_copy / generate_image）。
+        """
+        try:
+            generated_text = await self.generate_copy(text, emotion_tags, image_content)
+            generated_image_url = await self.generate_image(
+                text, emotion_tags, image_content, image_path, caption_line=generated_text.split('\n')[0]
+            )
 
             # 只返回第三方API生成的图和文
             return {
@@ -585,23 +793,15 @@ class DoubaoVLMClient:
             raise
     
     @staticmethod
-    def _guess_mime(image_bytes: bytes) -> Tuple[str, str]:
-        """简单判断 mime（便于多模态上传）"""
-        try:
-            with Image.open(io.BytesIO(image_bytes)) as im:
-                fmt = (im.format or "PNG").upper()
-                if fmt == "JPG":
-                    fmt = "JPEG"
-                mime = f"image/{fmt.lower()}"
-                ext = fmt.lower()
-                return mime, ext
-        except Exception:
-            return "image/png", "png"
+    def _guess_mime(image_bytes: Union[bytes, ImageInput]) -> Tuple[str, str]:
+        """简单判断 mime（便于多模态上传）；传入 ImageInput 时复用已解析的格式"""
+        image = ImageInput.of(image_bytes)
+        return image.mime, image.ext
 
 
-    def analyze_image(
+    async def analyze_image(
         self,
-        image_bytes: bytes,
+        image_bytes: Union[bytes, ImageInput],
         intent: str = "enhance",           # 例如 enhance / replace_bg / recolor ...
         style_preset: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -610,9 +810,8 @@ class DoubaoVLMClient:
         返回字段：
           caption / objects / styles / colors / suggestions / edit_prompt / negative_prompt
         """
-        # 准备图片（base64）
-        mime, ext = DoubaoVLMClient._guess_mime(image_bytes)
-        b64 = base64.b64encode(image_bytes).decode("utf-8")
+        # 准备图片：摆正、缩小到 VLM 够用的分辨率并重编码后再 base64（派生图有缓存）
+        image = await get_image_preprocessor().prepare(ImageInput.of(image_bytes), "vlm")
 
         system_prompt = (
             "你是资深视觉设计师和修图指导，同时也是小红书网红plogger，擅长从图片中提取关键信息并生成适合图像编辑模型的指令。\n"
@@ -633,14 +832,13 @@ class DoubaoVLMClient:
             "只输出 JSON，不要额外解释。"
         )
 
-        data_url = f"data:{mime};base64,{b64}"
-
         # 按 OpenAI 多模态风格组织消息（豆包 ark v3 基本兼容；如有差异仅需微调字段名）
         messages = [
         # system 建议直接用纯字符串，更兼容
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": [
-            {"type": "image_url", "image_url": {"url": data_url}},
+            # 图片在发送时分块 base64 编码写入请求体，不在内存中拼出完整 data URL
+            {"type": "image_url", "image_url": {"url": InlineDataURL(image.data, image.mime)}},
             {"type": "text", "text": user_instruction}
         ]}
         ]
@@ -651,13 +849,15 @@ class DoubaoVLMClient:
             "temperature": 0.2,
             "response_format": {"type": "json_object"}  # 要求走 JSON
         }
+        body = StreamingJSONBody(payload)
         headers = {
             "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
+            **body.headers
         }
 
         try:
-            resp = requests.post(self.completions_url, headers=headers, data=json.dumps(payload), timeout=60)
+            # 共享连接池的异步客户端：TCP/TLS 连接在请求之间复用
+            resp = await get_http_client().post(self.completions_url, headers=headers, content=body)
             resp.raise_for_status()
             data = resp.json()
             # 适配常见返回：choices[0].message.content
@@ -680,6 +880,20 @@ class DoubaoVLMClient:
 
 
 
+# VLM 缓存条目中记录感知哈希的字段：{"scope", "hash"}，重启后据此重建近似重复索引
+_PHASH_FIELD = "_phash"
+
+
+def _with_phash(analysis: Dict[str, Any], scope: str, phash: int) -> Dict[str, Any]:
+    return {**analysis, _PHASH_FIELD: {"scope": scope, "hash": phash}}
+
+
+def _strip_phash(cached: Dict[str, Any]) -> Dict[str, Any]:
+    analysis = dict(cached)
+    analysis.pop(_PHASH_FIELD, None)
+    return analysis
+
+
 class ImageEmotionAnalyzerService:
     """
     改造版：使用豆包 VLM 做图像理解 + 产出编辑 prompt；
@@ -690,6 +904,8 @@ class ImageEmotionAnalyzerService:
         self.config_manager = config_manager
         self.vlm = None           # DoubaoVLMClient
         self.image_editor = None  # 你已有的 i2i 模型适配器
+        self.vlm_cache = None     # VLM 分析结果缓存（按图片内容哈希 + intent + style_preset + 模型）
+        self.phash_index = None   # 感知哈希近似重复索引：值为 vlm_cache 中的缓存键
         self.defaults: Dict[str, Any] = {}
         self._setup()
 
@@ -699,6 +915,17 @@ class ImageEmotionAnalyzerService:
             raise RuntimeError("当前配置未启用 VLM API")
         
         self.vlm = DoubaoVLMClient(self.config_manager)
+        vlm_cache_cfg = (self.config_manager.config.get("cache", {}) or {}).get("vlm") or {}
+        self.vlm_cache = build_tiered_cache("vlm", vlm_cache_cfg)
+        phash_cfg = vlm_cache_cfg.get("perceptual", {}) or {}
+        if self.vlm_cache is not None and phash_cfg.get("enabled", False):
+            self.phash_index = PerceptualHashIndex(
+                max_distance=phash_cfg.get("max_distance", 6),
+                max_entries=phash_cfg.get("max_entries", 1_000_000)
+            )
+            self._near_hits = get_metrics().counter("cache.vlm.near_duplicate_hits")
+            # 索引只在内存中：启动时从持久化的缓存级别重建（后台进行，期间只是少了近似命中）
+            threading.Thread(target=self._rebuild_phash_index, name="vlm-phash-rebuild", daemon=True).start()
 
         # 读取 i2i 默认值（走你已有的 doubao i2i 模型）
         img_defaults = conf.get("defaults", {})
@@ -713,45 +940,98 @@ class ImageEmotionAnalyzerService:
         self.image_editor = ImageEditor(self.config_manager)
         logger.info("ImageEmotionAnalyzer(Doubao) 初始化完成")
 
+    def _rebuild_phash_index(self) -> None:
+        """从 vlm_cache 中带感知哈希的条目重建近似重复索引"""
+        loaded = 0
+        try:
+            for key, value in self.vlm_cache.scan():
+                meta = value.get(_PHASH_FIELD) if isinstance(value, dict) else None
+                if isinstance(meta, dict) and isinstance(meta.get("hash"), int) and meta.get("scope"):
+                    self.phash_index.add(meta["scope"], meta["hash"], key)
+                    loaded += 1
+        except Exception as e:
+            logger.warning(f"重建感知哈希索引失败（已载入 {loaded} 条）: {e}")
+            return
+        logger.info(f"感知哈希索引已从 VLM 缓存重建: {loaded} 条")
+
+    async def _analyze_cached(
+        self,
+        image: ImageInput,
+        intent: str,
+        style_preset: Optional[str]
+    ) -> Tuple[Dict[str, Any], bool]:
+        """调用 VLM 分析图片（先查缓存），返回 (分析结果, 是否命中缓存)"""
+        if self.vlm_cache is None:
+            return await self.vlm.analyze_image(image, intent=intent, style_preset=style_preset), False
+
+        key = make_cache_key(image.content_hash, intent, style_preset, self.vlm.model)
+        cached = await run_io(self.vlm_cache.get, key)
+        if cached is not None:
+            return _strip_phash(cached), True
+
+        # 精确哈希未命中：查感知哈希索引，重新压缩/缩放过的同一张图复用已有分析
+        phash = None
+        if self.phash_index is not None:
+            scope = make_cache_key(intent, style_preset, self.vlm.model)
+            try:
+                phash = await run_cpu(dhash, image.data)
+            except Exception as e:
+                logger.warning(f"计算感知哈希失败，跳过近似查找: {e}")
+            if phash is not None:
+                near = self.phash_index.nearest(scope, phash)
+                if near is not None:
+                    distance, near_key = near
+                    cached = await run_io(self.vlm_cache.get, near_key)
+                    if cached is not None:
+                        self._near_hits.inc()
+                        logger.info(f"近似重复图片命中 VLM 缓存（汉明距离 {distance}）")
+                        analysis = _strip_phash(cached)
+                        await run_io(self.vlm_cache.set, key, _with_phash(analysis, scope, phash))
+                        return analysis, True
+
+        analysis = await self.vlm.analyze_image(image, intent=intent, style_preset=style_preset)
+        if phash is not None:
+            await run_io(self.vlm_cache.set, key, _with_phash(analysis, scope, phash))
+            self.phash_index.add(scope, phash, key)
+        else:
+            await run_io(self.vlm_cache.set, key, dict(analysis))
+        return analysis, False
+
     # ========== 对外 API ==========
 
-    def analyze_image_bytes(
+    async def analyze_image_bytes(
         self,
-        image_bytes: bytes,
+        image_bytes: Union[bytes, ImageInput],
         intent: str = "情感分析，表现力更强，同时真实生动",
         style_preset: Optional[str] = None,
         auto_edit: bool = False
     ) -> Dict[str, Any]:
-        """bytes 入口：返回分析结果；可选直接自动修图。"""
-        if not validate_image_file(image_bytes):
+        """bytes / ImageInput 入口：返回分析结果；可选直接自动修图。"""
+        # 校验、VLM 编码、i2i 提交共用同一个 ImageInput，文件头只解析一次
+        image = ImageInput.of(image_bytes)
+        if not validate_image_file(image):
             raise FileValidationError("无效的图片文件")
-        # 分析
-        analysis = self.vlm.analyze_image(image_bytes, intent=intent, style_preset=style_preset)
+        # 分析：同一张图 + 同样的意图/风格/模型，直接复用缓存结果
+        analysis, cached = await self._analyze_cached(image, intent, style_preset)
 
         result: Dict[str, Any] = {
             "analysis": analysis,  # caption/objects/styles/colors/suggestions/...
+            "cached": cached,
             "status": "ok"
         }
 
         if auto_edit:
-            # 将原图先落盘到 temp，便于 i2i 调用
-            temp_dir = self.config_manager.config.get("paths", {}).get("temp_dir", "data/temp")
-            os.makedirs(temp_dir, exist_ok=True)
-            tmp_path = os.path.join(temp_dir, "i2i_input.png")
-            save_upload_file(image_bytes, tmp_path)
-
             edit_prompt = analysis.get("edit_prompt") or analysis.get("caption") or ""
             neg = analysis.get("negative_prompt", "")
-            # 组装 i2i 参数（你 ImageEditor 的 edit_image(...) 可能有不同签名，这里按你之前示例改）
+            # 组装 i2i 参数：直接提交内存中的原图（ImageEditor.edit_image 不接受 negative_prompt）
             params = {
-                "input_path_or_url": tmp_path,
+                "input_path_or_url": image,
                 "prompt": edit_prompt,
-                "negative_prompt": neg,
                 "guidance_scale": self.defaults["guidance_scale"],
                 "save_local": True
             }
             try:
-                out = self.image_editor.edit_image(**params)
+                out = await self.image_editor.edit_image(**params)
                 result["auto_edit"] = {
                     "prompt": edit_prompt,
                     "negative_prompt": neg,
@@ -762,23 +1042,23 @@ class ImageEmotionAnalyzerService:
                 result["auto_edit"] = {"error": str(e)}
         return result
 
-    def analyze_image_path(
+    async def analyze_image_path(
         self,
         image_path: str,
         intent: str = "情感分析，表现力更强，同时真实生动",
         style_preset: Optional[str] = None,
         auto_edit: bool = False
     ) -> Dict[str, Any]:
-        """文件路径入口：读取为 bytes 后复用逻辑"""
+        """文件路径入口：读取一次为 ImageInput 后复用逻辑（i2i 直接引用该文件）"""
         if not os.path.exists(image_path):
             raise FileNotFoundError(image_path)
-        with open(image_path, "rb") as f:
-            return self.analyze_image_bytes(
-                f.read(),
-                intent=intent,
-                style_preset=style_preset,
-                auto_edit=auto_edit
-            )
+        image = await run_io(ImageInput.from_path, image_path)
+        return await self.analyze_image_bytes(
+            image,
+            intent=intent,
+            style_preset=style_preset,
+            auto_edit=auto_edit
+        )
 
 
 
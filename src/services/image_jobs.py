@@ -0,0 +1,134 @@
+"""
+图像生成 / 编辑的异步任务
+
+同步接口（/images/generate、/images/edit、/images/reedit）与任务接口共用这里的执行与结果组装，
+任务结果与同步接口的响应体完全一致。
+"""
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from src.core.config_manager import ConfigManager
+from src.core.job_queue import JobQueue
+from src.models.image.image2image import ImageEditor
+from src.models.image.text2image import ImageGenerator
+
+logger = logging.getLogger(__name__)
+
+JOB_GENERATE = "image.generate"
+JOB_EDIT = "image.edit"
+
+STATIC_PREFIX = "/static/generated"  # 默认静态文件前缀
+
+
+def local_url(path: str, out_dir: Path) -> str:
+    """生成目录下的本地文件 -> 静态访问 URL"""
+    rel = Path(path).resolve().relative_to(Path(out_dir).resolve())
+    return f"{STATIC_PREFIX}/{str(rel).replace(os.sep, '/')}"
+
+
+def build_enhanced_prompt(prompt: str, emotion_tags: Optional[str], original_text: Optional[str]) -> str:
+    """有情感标签与原始文字时，把两者拼进编辑提示词"""
+    if not (emotion_tags and original_text):
+        return prompt
+    emotion_desc = ", ".join(emotion_tags.split(','))
+    return f"基于文字'{original_text}'和情感'{emotion_desc}'，{prompt}"
+
+
+async def run_generate(config_manager: ConfigManager, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    文生图并组装响应体
+
+    Args:
+        params: prompt / size / guidance_scale / seed / watermark / num_images / save_local
+    """
+    t2i_gen = ImageGenerator(config_manager)
+    save_local = bool(params.get("save_local"))
+    result = await t2i_gen.generate(
+        prompt=params["prompt"],
+        guidance_scale=params.get("guidance_scale"),
+        size=params.get("size"),
+        seed=params.get("seed"),
+        num_images=params.get("num_images"),
+        watermark=params.get("watermark"),
+        save_local=save_local
+    )
+
+    payload: Dict[str, Any] = {"status": "succeeded", "outputs": []}
+    for output in result["outputs"]:
+        item = {"remote_url": output["remote_url"], "prompt": params["prompt"]}
+        # 下载失败的图片没有 local_url，错误见 errors（stage 为 download）
+        if output.get("local_path"):
+            item["local_url"] = local_url(output["local_path"], t2i_gen.out_dir)
+        payload["outputs"].append(item)
+
+    # 部分成功：失败的图片（生成或下载）单独列出，不影响已生成的图片
+    if result.get("errors"):
+        payload["status"] = "partial"
+        payload["errors"] = result["errors"]
+    return payload
+
+
+async def run_edit(config_manager: ConfigManager, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    图生图并组装响应体
+
+    Args:
+        params: source（本地路径或 URL）/ prompt / guidance_scale / size / seed / watermark / save_local，
+            编辑时可带 emotion_tags / original_text，重新编辑时 mode 为 "reedit"
+    """
+    editor = ImageEditor(config_manager)
+    prompt = params["prompt"]
+    reedit = params.get("mode") == "reedit"
+    enhanced_prompt = prompt if reedit else build_enhanced_prompt(
+        prompt, params.get("emotion_tags"), params.get("original_text")
+    )
+    save_local = bool(params.get("save_local"))
+
+    result = await editor.edit_image(
+        params["source"],
+        prompt=enhanced_prompt,
+        guidance_scale=params.get("guidance_scale"),
+        size=params.get("size"),
+        seed=params.get("seed"),
+        watermark=params.get("watermark"),
+        save_local=save_local
+    )
+
+    if reedit:
+        output = {"remote_url": result["remote_url"], "prompt": prompt, "type": "reedit"}
+    else:
+        output = {
+            "remote_url": result["remote_url"],
+            "prompt": enhanced_prompt,
+            "original_prompt": prompt,
+            "emotion_tags": params.get("emotion_tags"),
+            "original_text": params.get("original_text")
+        }
+    # ImageEditor 把下载的文件放在 output_path
+    if save_local and result.get("output_path"):
+        output["local_url"] = local_url(result["output_path"], editor.out_dir)
+    return {"status": "succeeded", "outputs": [output]}
+
+
+def remove_job_upload(params: Dict[str, Any]) -> None:
+    """任务结束后删除为它保存的上传文件"""
+    upload = params.get("upload_path")
+    if upload:
+        try:
+            os.remove(upload)
+        except FileNotFoundError:
+            pass
+
+
+def register_image_jobs(queue: JobQueue, config_manager: ConfigManager) -> None:
+    """把图像生成 / 编辑任务注册到任务队列"""
+    async def generate_job(params: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_generate(config_manager, params)
+
+    async def edit_job(params: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_edit(config_manager, params)
+
+    queue.register(JOB_GENERATE, generate_job)
+    queue.register(JOB_EDIT, edit_job, cleanup=remove_job_upload)
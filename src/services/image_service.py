@@ -10,16 +10,21 @@ from typing import Dict, Any, Optional
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
+import asyncio
 import logging
 import os
-from typing import Dict, Any, Optional
+import uuid
+from typing import Dict, Any, Optional, Union
 from datetime import datetime, timezone
 import time
 
 from src.models.image.image2image import ImageEditor
 from src.models.image.text2image import ImageGenerator
+from src.core.cache import make_cache_key
+from src.core.executors import run_io
 from src.core.config_manager import ConfigManager
-from src.utils.file_utils import validate_image_file, save_uploaded_file
+from src.core.job_queue import TaskResultStore
+from src.utils.image_utils import ImageInput
 from src.core.exceptions import ImageProcessingError, FileValidationError
 
 logger = logging.getLogger(__name__)
@@ -27,9 +32,11 @@ logger = logging.getLogger(__name__)
 class ImageService:
     """图片服务，处理图片编辑和生成相关任务"""
     
-    def __init__(self):
+    BATCH_SCOPE = "batch_edit"
+
+    def __init__(self, config_manager: Optional[ConfigManager] = None):
         # 初始化配置管理器
-        self.config_manager = ConfigManager()
+        self.config_manager = config_manager or ConfigManager()
         
         # 初始化图片编辑模型
         self.image_editor = ImageEditor(self.config_manager)
@@ -44,12 +51,20 @@ class ImageService:
         # 确保目录存在
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.temp_dir, exist_ok=True)
+
+        # 批量编辑：并发上限与按客户端任务 ID 记录结果的幂等表
+        self.batch_settings = self.config_manager.config.get("batch_edit", {}) or {}
+        self.batch_max_concurrency = max(1, int(self.batch_settings.get("max_concurrency", 4)))
+        self.batch_results = TaskResultStore(
+            self.batch_settings.get("results_db", "data/jobs/batch_edit.sqlite3")
+        )
+        self.purge_batch_results()
         
         logger.info("图片服务初始化完成")
     
     async def edit_image_service(
         self,
-        original_image_data: bytes,
+        original_image_data: Union[bytes, ImageInput],
         new_prompt: str,
         edit_style: Optional[str] = None,
         preserve_original: bool = True,
@@ -73,23 +88,24 @@ class ImageService:
         try:
             logger.info(f"开始处理图片编辑，提示词: {new_prompt}")
             
-            # 1. 验证和保存原始图片
+            # 1. 验证和保存原始图片（文件头只解析一次，i2i 回退 base64 时直接用内存中的字节）
             logger.info("验证原始图片...")
-            if not validate_image_file(original_image_data):
+            image = ImageInput.of(original_image_data)
+            if not image.validate():
                 raise FileValidationError("无效的图片文件格式")
             
-            # 生成唯一文件名
+            # 生成唯一文件名（批量编辑时同一秒内会有多个任务）
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            original_filename = f"original_{timestamp}.png"
+            original_filename = f"original_{timestamp}_{uuid.uuid4().hex[:8]}.{image.ext}"
             original_path = os.path.join(self.temp_dir, original_filename)
             
             # 保存原始图片
-            save_uploaded_file(original_image_data, original_path)
+            await run_io(image.save, original_path)
             logger.info(f"原始图片已保存到: {original_path}")
             
             # 2. 构建编辑参数
             edit_params = {
-                'input_path_or_url': original_path,
+                'input_path_or_url': image,
                 'prompt': new_prompt,
                 'guidance_scale': self._calculate_guidance_scale(strength),
                 'save_local': True
@@ -99,12 +115,13 @@ class ImageService:
             
             # 3. 执行图片编辑
             logger.info("开始执行图片编辑...")
-            edit_result = self.image_editor.edit_image(**edit_params)
+            edit_result = await self.image_editor.edit_image(**edit_params)
             
-            if not edit_result or not edit_result.get('local_path'):
+            # ImageEditor 把下载的文件放在 output_path
+            if not edit_result or not edit_result.get('output_path'):
                 raise ImageProcessingError("图片编辑失败，未获得有效结果")
             
-            edited_image_path = edit_result['local_path']
+            edited_image_path = edit_result['output_path']
             remote_url = edit_result.get('remote_url', '')
             
             logger.info(f"图片编辑完成，输出路径: {edited_image_path}")
@@ -183,7 +200,7 @@ class ImageService:
 
             # 3. 执行图片生成
             logger.info("开始执行图片生成...")  
-            generation_result = self.image_generator.generate(**generation_params)
+            generation_result = await self.image_generator.generate(**generation_params)
 
             if not generation_result or not generation_result.get('local_paths'):
                 raise ImageProcessingError("图片生成失败，未获得有效结果")
@@ -240,34 +257,62 @@ class ImageService:
         # 确保在合理范围内
         return max(min_scale, min(max_scale, guidance_scale))
     
+    @staticmethod
+    def _batch_task_fingerprint(task: Dict[str, Any]) -> str:
+        """子任务输入指纹：同一任务 ID 换了图片或参数时不复用旧结果"""
+        return make_cache_key(
+            ImageInput.of(task['original_image_data']).content_hash,
+            task['new_prompt'],
+            task.get('edit_style'),
+            task.get('preserve_original', True),
+            task.get('strength', 0.7)
+        )
+
     async def batch_edit_images(
         self,
-        image_edit_tasks: list
+        image_edit_tasks: list,
+        max_concurrency: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         批量图片编辑服务
         
+        子任务以有限并发执行，每完成一个就写入结果表。带 task_id 的子任务是幂等的：
+        重试同一批次时，已成功且输入未变的子任务直接返回记录的结果（skipped=True），
+        只有失败或未完成的子任务会重新执行。
+        
         Args:
-            image_edit_tasks: 图片编辑任务列表
+            image_edit_tasks: 图片编辑任务列表，每项含 original_image_data（bytes 或 ImageInput）/ new_prompt，
+                可选 task_id（客户端任务 ID）/ edit_style / preserve_original / strength
+            max_concurrency: 并发上限，缺省取配置 batch_edit.max_concurrency
             
         Returns:
             批量编辑结果
         """
         start_time = time.time()
-        results = []
-        failed_tasks = []
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.batch_max_concurrency))
         
-        try:
-            logger.info(f"开始批量图片编辑，任务数量: {len(image_edit_tasks)}")
-            
-            for i, task in enumerate(image_edit_tasks):
-                try:
+        async def run_task(i: int, task: Dict[str, Any]) -> Dict[str, Any]:
+            client_id = task.get('task_id')
+            task_id = client_id if client_id is not None else i
+            # 已有成功记录时失败结果不落库，避免覆盖幂等记录
+            stored_success = False
+            try:
+                # 验证任务参数
+                if not all(key in task for key in ['original_image_data', 'new_prompt']):
+                    raise ValueError(f"任务 {i+1} 缺少必要参数")
+                
+                fingerprint = self._batch_task_fingerprint(task)
+                if client_id is not None:
+                    record = await run_io(self.batch_results.get, self.BATCH_SCOPE, str(client_id))
+                    if record and record['status'] == 'success':
+                        stored_success = True
+                        if record['fingerprint'] != fingerprint:
+                            raise ValueError(f"任务ID {client_id} 已用于不同的图片或参数")
+                        logger.info(f"任务 {client_id} 已完成，跳过")
+                        return {'task_id': task_id, 'status': 'success', 'skipped': True, 'result': record['result']}
+                
+                async with semaphore:
                     logger.info(f"处理第 {i+1} 个任务...")
-                    
-                    # 验证任务参数
-                    if not all(key in task for key in ['original_image_data', 'new_prompt']):
-                        raise ValueError(f"任务 {i+1} 缺少必要参数")
-                    
                     # 执行单个编辑任务
                     edit_result = await self.edit_image_service(
                         original_image_data=task['original_image_data'],
@@ -276,50 +321,66 @@ class ImageService:
                         preserve_original=task.get('preserve_original', True),
                         strength=task.get('strength', 0.7)
                     )
-                    
-                    results.append({
-                        'task_id': i,
-                        'status': 'success',
-                        'result': edit_result
-                    })
-                    
-                    logger.info(f"任务 {i+1} 完成")
-                    
-                except Exception as e:
-                    logger.error(f"任务 {i+1} 失败: {str(e)}")
-                    failed_tasks.append({
-                        'task_id': i,
-                        'error': str(e),
-                        'task_data': task
-                    })
-                    
-                    results.append({
-                        'task_id': i,
-                        'status': 'failed',
-                        'error': str(e)
-                    })
+                
+                if client_id is not None:
+                    await run_io(self.batch_results.put, self.BATCH_SCOPE, str(client_id), fingerprint, 'success', edit_result)
+                logger.info(f"任务 {i+1} 完成")
+                return {'task_id': task_id, 'status': 'success', 'result': edit_result}
+                
+            except Exception as e:
+                logger.error(f"任务 {i+1} 失败: {str(e)}")
+                if client_id is not None and not stored_success and 'original_image_data' in task and 'new_prompt' in task:
+                    try:
+                        await run_io(
+                            self.batch_results.put, self.BATCH_SCOPE, str(client_id),
+                            self._batch_task_fingerprint(task), 'failed', None, str(e)
+                        )
+                    except Exception as store_error:
+                        logger.warning(f"任务 {client_id} 结果写入失败: {store_error}")
+                return {'task_id': task_id, 'status': 'failed', 'error': str(e)}
+        
+        try:
+            logger.info(f"开始批量图片编辑，任务数量: {len(image_edit_tasks)}")
+            
+            results = await asyncio.gather(*(run_task(i, task) for i, task in enumerate(image_edit_tasks)))
+            failed_tasks = [
+                {
+                    'task_id': r['task_id'],
+                    'error': r['error'],
+                    # 原图字节不回传
+                    'task_data': {k: v for k, v in image_edit_tasks[i].items() if k != 'original_image_data'}
+                }
+                for i, r in enumerate(results) if r['status'] == 'failed'
+            ]
             
             # 组装批量结果
             total_time = time.time() - start_time
             success_count = len([r for r in results if r['status'] == 'success'])
+            skipped_count = len([r for r in results if r.get('skipped')])
             failed_count = len(failed_tasks)
             
             batch_result = {
                 'total_tasks': len(image_edit_tasks),
                 'successful_tasks': success_count,
+                'skipped_tasks': skipped_count,
                 'failed_tasks': failed_count,
-                'results': results,
+                'results': list(results),
                 'failed_tasks_details': failed_tasks,
                 'total_processing_time': round(total_time, 3),
                 'status': 'completed'
             }
             
-            logger.info(f"批量图片编辑完成，成功: {success_count}, 失败: {failed_count}")
+            logger.info(f"批量图片编辑完成，成功: {success_count}（跳过 {skipped_count}）, 失败: {failed_count}")
             return batch_result
             
         except Exception as e:
             logger.error(f"批量图片编辑服务错误: {str(e)}", exc_info=True)
             raise ImageProcessingError(f"批量图片编辑失败: {str(e)}")
+
+    def purge_batch_results(self) -> int:
+        """清理超过保留时长的批量编辑结果记录"""
+        retention_hours = float(self.batch_settings.get("retention_hours", 168))
+        return self.batch_results.purge(retention_hours * 3600)
     
     def cleanup_temp_files(self, file_paths: list = None):
         """
@@ -2,15 +2,19 @@
 文案生成服务 - 使用官方OpenAI SDK调用DeepSeek API
 """
 import os
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 from openai import AsyncOpenAI
 from src.core.config_manager import ConfigManager
+from src.core.cache import MemoryCache, build_tiered_cache, make_cache_key, normalize_cache_text
+from src.core.executors import run_io
 import logging
 
 logger = logging.getLogger(__name__)
 
 class TextGenerator:
     """文案生成服务（纯API版本，无降级方案）"""
+
+    SYSTEM_PROMPT = "你是一个专业的PLOG创作助手，拥有3年社交媒体文案策划经验，擅长根据情感标签创作富有感染力的文案。"
     
     def __init__(self, config_manager: ConfigManager):
         """
@@ -21,6 +25,18 @@ class TextGenerator:
         self.api_config = self.config_manager.config.get("text_generation", {})
         self._client = None  # 延迟初始化的API客户端
 
+        defaults = self.api_config.get("defaults", {}) or {}
+        self.model = self.api_config.get("model_name", "deepseek-chat")
+        self.temperature = float(defaults.get("temperature", 0.8))
+        self.max_tokens = int(defaults.get("max_tokens", 300))
+
+        # 响应缓存：deterministic 同一提示词复用同一条文案；variants 每个提示词最多生成 N 条，轮流返回
+        cache_cfg = (self.config_manager.config.get("cache", {}) or {}).get("text_generation") or {}
+        self.response_cache = build_tiered_cache("text_generation", cache_cfg)
+        self.cache_policy = cache_cfg.get("policy", "deterministic")
+        self.cache_variants = max(1, int(cache_cfg.get("variants", 1)))
+        self._variant_cursor = MemoryCache(cache_cfg.get("memory_max_entries", 1024))
+
     @property
     def client(self) -> AsyncOpenAI:
         """获取线程安全的异步OpenAI客户端"""
@@ -77,17 +93,20 @@ class TextGenerator:
             custom_prompt=custom_prompt
         )
 
+        if self.response_cache is None:
+            return await self._complete(prompt)
+        return await self._complete_cached(prompt)
+
+    async def _complete(self, prompt: str) -> str:
+        """调用 API 生成一条文案"""
         response = await self.client.chat.completions.create(
-            model="deepseek-chat",
+            model=self.model,
             messages=[
-                {
-                    "role": "system",
-                    "content": "你是一个专业的PLOG创作助手，拥有3年社交媒体文案策划经验，擅长根据情感标签创作富有感染力的文案。"
-                },
+                {"role": "system", "content": self.SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.8,
-            max_tokens=300,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
             stream=False
         )
         
@@ -95,6 +114,104 @@ class TextGenerator:
         logger.debug(f"生成文案成功，长度: {len(generated_text)}")
         return generated_text.strip()
 
+    async def _stream_completion(self, prompt: str) -> AsyncIterator[str]:
+        """以流式方式调用 API，逐段产出文字"""
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def stream_text(
+        self,
+        text: str,
+        emotion_tags: List[str],
+        style: Optional[str] = None,
+        image_content: Optional[str] = None,
+        custom_prompt: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式生成文案：参数同 generate_text，逐段产出文字（拼接并去掉首尾空白后即完整文案）
+
+        命中响应缓存时一次性产出缓存的文案；否则边收边产出，结束后按缓存策略写入缓存。
+        :raises: 当API调用失败时抛出原始异常
+        """
+        prompt = self._build_prompt(
+            text=text,
+            emotion_tags=emotion_tags,
+            style=style,
+            image_content=image_content,
+            custom_prompt=custom_prompt
+        )
+        key = self._cache_key(prompt) if self.response_cache is not None else None
+        if key is not None:
+            cached = await self._cache_lookup(key)
+            if cached is not None:
+                yield cached
+                return
+
+        parts: List[str] = []
+        async for delta in self._stream_completion(prompt):
+            parts.append(delta)
+            yield delta
+        generated_text = "".join(parts).strip()
+        logger.debug(f"流式生成文案成功，长度: {len(generated_text)}")
+        if key is not None and generated_text:
+            await self._cache_store(key, generated_text)
+
+    def _cache_key(self, prompt: str) -> str:
+        """响应缓存键：归一化提示词 + 模型 + 采样参数 + 策略"""
+        return make_cache_key(
+            normalize_cache_text(self.SYSTEM_PROMPT), normalize_cache_text(prompt),
+            self.model, self.temperature, self.max_tokens, self.cache_policy, self.cache_variants
+        )
+
+    async def _cache_lookup(self, key: str) -> Optional[str]:
+        """
+        查询可复用的文案：deterministic 命中即返回；variants 只有攒满 N 条后才轮流返回，
+        未攒满时返回 None，由调用方生成新的一条
+        """
+        cached = await run_io(self.response_cache.get, key)
+        if self.cache_policy != "variants":
+            return cached
+        variants = list(cached or [])
+        if len(variants) < self.cache_variants:
+            return None
+        cursor = self._variant_cursor.get(key) or 0
+        self._variant_cursor.set(key, cursor + 1)
+        return variants[cursor % len(variants)]
+
+    async def _cache_store(self, key: str, generated_text: str) -> None:
+        """写入新生成的文案（variants 策略下追加到该键的候选列表）"""
+        if self.cache_policy != "variants":
+            await run_io(self.response_cache.set, key, generated_text)
+            return
+        variants = list(await run_io(self.response_cache.get, key) or [])
+        if len(variants) < self.cache_variants:
+            variants.append(generated_text)
+            await run_io(self.response_cache.set, key, variants)
+
+    async def _complete_cached(self, prompt: str) -> str:
+        """按缓存策略复用已生成的文案"""
+        key = self._cache_key(prompt)
+        cached = await self._cache_lookup(key)
+        if cached is not None:
+            return cached
+        generated_text = await self._complete(prompt)
+        await self._cache_store(key, generated_text)
+        return generated_text
+
     def _build_prompt(
         self,
         text: str,
@@ -11,6 +11,8 @@ from typing import Optional, Tuple
 import wave
 import io
 
+from src.core.exceptions import AudioProcessingError
+
 logger = logging.getLogger(__name__)
 
 def get_audio_info(audio_path: str) -> Dict[str, Any]:
@@ -162,6 +164,121 @@ def get_audio_duration_estimate(file_data: bytes) -> Optional[float]:
         logger.error(f"估算音频时长失败: {str(e)}")
         return None
 
+TARGET_SAMPLE_RATE = 16000
+
+
+def decode_audio(file_data: bytes, target_sr: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """
+    在内存中解码音频，重采样为 16kHz 单声道 float32 波形
+
+    解码结果可以直接传给 FunASR 模型（Paraformer / emotion2vec 都接受一维波形），
+    同一份数组在各阶段间共享，不再落盘、不再重复解码。
+
+    Args:
+        file_data: 音频文件数据（wav / mp3 / flac / m4a 等，取决于 torchaudio 后端）
+        target_sr: 目标采样率
+
+    Returns:
+        一维 float32 波形，取值范围 [-1, 1]
+
+    Raises:
+        AudioProcessingError: 解码失败
+    """
+    try:
+        import torchaudio
+    except ImportError:
+        torchaudio = None
+
+    try:
+        if torchaudio is not None:
+            waveform, sample_rate = torchaudio.load(io.BytesIO(file_data))
+            if waveform.shape[0] > 1:
+                waveform = waveform.mean(dim=0, keepdim=True)
+            if sample_rate != target_sr:
+                waveform = torchaudio.functional.resample(waveform, sample_rate, target_sr)
+            samples = waveform.squeeze(0).numpy()
+        else:
+            samples = _decode_pcm_wav(file_data, target_sr)
+    except Exception as e:
+        raise AudioProcessingError(f"音频解码失败: {e}")
+
+    if samples.size == 0:
+        raise AudioProcessingError("音频解码失败: 音频为空")
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+def _decode_pcm_wav(file_data: bytes, target_sr: int) -> np.ndarray:
+    """无 torchaudio 时的兜底：仅支持 PCM WAV，线性插值重采样"""
+    with wave.open(io.BytesIO(file_data), 'rb') as wav_file:
+        channels = wav_file.getnchannels()
+        sample_width = wav_file.getsampwidth()
+        sample_rate = wav_file.getframerate()
+        frames = wav_file.readframes(wav_file.getnframes())
+
+    dtypes = {1: np.uint8, 2: np.int16, 4: np.int32}
+    if sample_width not in dtypes:
+        raise ValueError(f"不支持的采样位宽: {sample_width * 8} bit")
+    samples = np.frombuffer(frames, dtype=dtypes[sample_width]).astype(np.float32)
+    if sample_width == 1:
+        samples = (samples - 128.0) / 128.0
+    else:
+        samples /= float(2 ** (sample_width * 8 - 1))
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+
+    if sample_rate != target_sr and samples.size:
+        duration = samples.size / sample_rate
+        target_len = max(1, int(round(duration * target_sr)))
+        samples = np.interp(
+            np.linspace(0, samples.size - 1, target_len),
+            np.arange(samples.size),
+            samples
+        ).astype(np.float32)
+    return samples
+
+
+def pcm16_to_float32(chunk: bytes) -> np.ndarray:
+    """
+    把流式上传的原始 PCM 分片（16bit 小端、单声道）转为 float32 波形
+
+    Raises:
+        AudioProcessingError: 分片字节数不是 2 的整数倍
+    """
+    if len(chunk) % 2:
+        raise AudioProcessingError(f"PCM 分片长度必须是 2 的整数倍，实际 {len(chunk)} 字节")
+    return np.frombuffer(chunk, dtype='<i2').astype(np.float32) / 32768.0
+
+
+def estimate_audio_seconds(audio_input: Any, sample_rate: int = TARGET_SAMPLE_RATE) -> float:
+    """
+    快速估算音频时长（秒），用于批处理分桶，不解码音频
+
+    Args:
+        audio_input: 音频文件路径，或已解码的一维波形数组
+        sample_rate: 波形数组的采样率
+
+    Returns:
+        估算的时长（秒），无法估算时返回 0.0
+    """
+    if isinstance(audio_input, np.ndarray):
+        return float(audio_input.shape[-1]) / sample_rate if audio_input.size else 0.0
+
+    try:
+        with wave.open(str(audio_input), 'rb') as wav_file:
+            return wav_file.getnframes() / float(wav_file.getframerate())
+    except Exception:
+        pass
+
+    # 非 WAV：按文件头判断格式，用文件大小和常见比特率粗估
+    try:
+        with open(audio_input, 'rb') as f:
+            header = f.read(12)
+        size = os.path.getsize(audio_input)
+    except Exception:
+        return 0.0
+    bitrate_kbps = 1000 if header.startswith(b'fLaC') else 256 if header[4:8] == b'ftyp' else 128
+    return size * 8 / (bitrate_kbps * 1000)
+
 def validate_wav_format(file_data: bytes) -> Tuple[bool, Optional[str]]:
     """
     专门验证WAV格式文件
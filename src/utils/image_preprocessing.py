@@ -0,0 +1,120 @@
+"""
+上传前的图片预处理
+
+VLM 图像理解与 i2i 图生图都把图片以 base64 放进请求体（或让 Ark 从静态 URL 下载）。
+原图往往是几 MB 的手机照片，远超模型实际使用的分辨率；这里在上传前按目标分别：
+
+- 按 EXIF 方向摆正（重编码后方向信息丢失，必须先应用）
+- 等比缩小到最长边不超过 max_side
+- 重新编码为 WEBP / JPEG（质量可配）
+
+派生图按 原图内容哈希 + 目标参数 缓存在进程内 LRU 中，同一张图重复上传不再重复缩放编码；
+同一个 ImageInput 上也会记住已生成的派生图。
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.core.cache import MemoryCache, make_cache_key
+from src.core.executors import run_cpu
+from src.core.metrics import get_metrics
+from src.utils.image_utils import ImageInput, downscale_reencode
+
+logger = logging.getLogger(__name__)
+
+
+class ImagePreprocessor:
+    """按目标（vlm / i2i）生成缩小、重编码后的派生图"""
+
+    DEFAULTS: Dict[str, Any] = {
+        "enabled": True,
+        "cache_max_entries": 256,
+        "targets": {
+            "vlm": {"max_side": 1024, "format": "WEBP", "quality": 85},
+            "i2i": {"max_side": 2048, "format": "JPEG", "quality": 90}
+        }
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.settings: Dict[str, Any] = {}
+        self._cache: Optional[MemoryCache] = None
+        metrics = get_metrics()
+        self._bytes_in = metrics.counter("image_preprocess.bytes_in")
+        self._bytes_out = metrics.counter("image_preprocess.bytes_out")
+        self._cache_hits = metrics.counter("image_preprocess.cache_hits")
+        self._encode_hist = metrics.histogram("image_preprocess.encode_ms")
+        self.configure(None)
+
+    def configure(self, settings: Optional[Dict[str, Any]]) -> None:
+        """应用 config.json 中的 image_preprocessing 配置"""
+        merged = dict(self.DEFAULTS)
+        merged.update({k: v for k, v in (settings or {}).items() if v is not None})
+        targets = {name: dict(conf) for name, conf in self.DEFAULTS["targets"].items()}
+        for name, conf in ((settings or {}).get("targets") or {}).items():
+            targets[name] = {**targets.get(name, {}), **(conf or {})}
+        merged["targets"] = targets
+        with self._lock:
+            self.settings = merged
+            self._cache = MemoryCache(max_entries=int(merged["cache_max_entries"]))
+
+    def target(self, name: str) -> Optional[Dict[str, Any]]:
+        """目标参数；未启用或未配置时返回 None"""
+        if not self.settings.get("enabled", True):
+            return None
+        return self.settings["targets"].get(name)
+
+    async def prepare(self, image: ImageInput, target: str) -> ImageInput:
+        """
+        返回适合上传给 target 的派生图；无需处理或处理失败时返回原 ImageInput
+
+        Args:
+            image: 原图
+            target: "vlm" 或 "i2i"
+        """
+        conf = self.target(target)
+        if conf is None:
+            return image
+        max_side = int(conf.get("max_side", 1024))
+        fmt = str(conf.get("format", "WEBP")).upper()
+        quality = int(conf.get("quality", 85))
+
+        variant_key = (max_side, fmt, quality)
+        variant = image.variants.get(variant_key)
+        if variant is not None:
+            return variant
+
+        key = make_cache_key(image.content_hash, max_side, fmt, quality)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache_hits.inc()
+            # 空字节表示原图无需处理
+            variant = ImageInput(cached, filename=image.filename) if cached else image
+        else:
+            started = time.perf_counter()
+            try:
+                data, changed = await run_cpu(downscale_reencode, image.data, max_side, fmt, quality)
+            except Exception as e:
+                logger.warning(f"图片预处理失败，使用原图上传: {e}")
+                return image
+            self._encode_hist.observe((time.perf_counter() - started) * 1000)
+            self._cache.set(key, data if changed else b"")
+            variant = ImageInput(data, filename=image.filename) if changed else image
+            if changed:
+                logger.info(
+                    f"图片预处理（{target}）: {len(image.data) / 1024:.0f}KB -> {len(data) / 1024:.0f}KB {fmt}"
+                )
+
+        self._bytes_in.inc(len(image.data))
+        self._bytes_out.inc(len(variant.data))
+        image.variants[variant_key] = variant
+        return variant
+
+
+_preprocessor = ImagePreprocessor()
+
+
+def get_image_preprocessor() -> ImagePreprocessor:
+    """获取当前进程的图片预处理器"""
+    return _preprocessor
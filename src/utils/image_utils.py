@@ -2,12 +2,140 @@
 # -*- coding: utf-8 -*-
 import io
 import os
-from typing import Iterable
-from PIL import Image
+from typing import Dict, Iterable, Optional, Tuple, Union
+from PIL import Image, ImageOps
+
+from src.utils.file_utils import get_file_hash
+
+
+class ImageInput:
+    """
+    一次解析、整个请求复用的图片输入
+
+    图片字节只保存一份；第一次用到格式 / 尺寸 / MIME 时打开一次 Pillow，
+    读出文件头并顺带做 verify 完整性检查，结果缓存。内容哈希同样只算一次。
+    校验、VLM 编码、i2i 提交都直接传这个对象，不再重复读盘或重复打开图片。
+    """
+
+    MIME_TYPES = {
+        "JPEG": "image/jpeg",
+        "PNG": "image/png",
+        "WEBP": "image/webp",
+        "GIF": "image/gif",
+        "BMP": "image/bmp",
+    }
+
+    def __init__(self, data: bytes, path: Optional[str] = None, filename: Optional[str] = None):
+        """
+        Args:
+            data: 图片字节
+            path: 磁盘上已有的同内容文件（可选，i2i 可直接引用而不必另存）
+            filename: 原始文件名（仅用于日志）
+        """
+        self.data = bytes(data) if isinstance(data, bytearray) else data
+        self.path = str(path) if path else None
+        self.filename = filename or (os.path.basename(self.path) if self.path else None)
+        self._parsed = False
+        self._format: Optional[str] = None
+        self._size: Optional[Tuple[int, int]] = None
+        self._intact = False
+        self._hash: Optional[str] = None
+        # 预处理生成的派生图（见 image_preprocessing），键为 (max_side, format, quality)
+        self.variants: Dict[Tuple[int, str, int], "ImageInput"] = {}
+
+    def __repr__(self) -> str:
+        return f"ImageInput(format={self._format}, size={self._size}, bytes={len(self.data)}, path={self.path})"
+
+    @classmethod
+    def from_path(cls, path: str) -> "ImageInput":
+        """读取磁盘文件（阻塞，异步代码中放到 io 线程池执行）"""
+        with open(path, "rb") as f:
+            return cls(f.read(), path=path)
+
+    @classmethod
+    def of(cls, source: Union[bytes, "ImageInput"]) -> "ImageInput":
+        """bytes 包装为 ImageInput；已是 ImageInput 则原样返回"""
+        return source if isinstance(source, ImageInput) else cls(source)
+
+    def _parse(self) -> None:
+        if self._parsed:
+            return
+        self._parsed = True
+        try:
+            with Image.open(io.BytesIO(self.data)) as im:
+                fmt = (im.format or "").upper()
+                self._format = "JPEG" if fmt == "JPG" else fmt
+                self._size = im.size
+                # verify() 只检查完整性（文件尾/损坏等），不解码像素
+                im.verify()
+            self._intact = True
+        except Exception:
+            self._intact = False
+
+    @property
+    def format(self) -> Optional[str]:
+        """Pillow 识别的格式（JPEG / PNG / WEBP ...），无法识别时为 None"""
+        self._parse()
+        return self._format or None
+
+    @property
+    def size(self) -> Optional[Tuple[int, int]]:
+        self._parse()
+        return self._size
+
+    @property
+    def mime(self) -> str:
+        return self.MIME_TYPES.get(self.format or "", f"image/{(self.format or 'png').lower()}")
+
+    @property
+    def ext(self) -> str:
+        return (self.format or "PNG").lower()
+
+    @property
+    def content_hash(self) -> str:
+        """内容哈希（缓存键用）"""
+        if self._hash is None:
+            self._hash = get_file_hash(self.data)
+        return self._hash
+
+    def validate(
+        self,
+        *,
+        allowed_formats: Iterable[str] = ("PNG", "JPEG", "JPG", "WEBP"),
+        max_mb: int = 10,
+        min_width: int = 16,
+        min_height: int = 16,
+        max_width: int = 8192,
+        max_height: int = 8192,
+    ) -> bool:
+        """规则同 validate_image_file，复用已解析的文件头"""
+        if not self.data:
+            return False
+        if len(self.data) > max_mb * 1024 * 1024:
+            return False
+
+        self._parse()
+        if not self._intact:
+            return False
+        if self._format not in {f.upper() for f in allowed_formats}:
+            return False
+
+        w, h = self._size
+        if w < min_width or h < min_height:
+            return False
+        if w > max_width or h > max_height:
+            return False
+        return True
+
+    def save(self, target_path: str) -> str:
+        """写入磁盘（原子替换）并记为 path，之后 i2i 直接引用该文件"""
+        save_uploaded_file(self.data, target_path)
+        self.path = str(target_path)
+        return self.path
 
 
 def validate_image_file(
-    image_bytes: bytes,
+    image_bytes: Union[bytes, ImageInput],
     *,
     allowed_formats: Iterable[str] = ("PNG", "JPEG", "JPG", "WEBP"),
     max_mb: int = 10,
@@ -26,44 +154,19 @@ def validate_image_file(
     返回:
         True  通过校验
         False 未通过（原因见代码各分支，外层通常抛 FileValidationError）
-    """
-    # 1) 基础检查
-    if not image_bytes or not isinstance(image_bytes, (bytes, bytearray)):
-        return False
 
-    max_bytes = max_mb * 1024 * 1024
-    if len(image_bytes) > max_bytes:
-        return False
-
-    # 2) 使用 Pillow 进行完整性与格式校验
-    try:
-        bio = io.BytesIO(image_bytes)
-
-        # 先 verify() 做完整性检查（文件尾/损坏等）
-        with Image.open(bio) as im:
-            im.verify()
-
-        # verify() 会把文件指针移到末尾，需重置再打开一次读取信息
-        bio.seek(0)
-        with Image.open(bio) as im:
-            fmt = (im.format or "").upper()
-            if fmt == "JPG":
-                fmt = "JPEG"
-
-            if fmt not in {f.upper() for f in allowed_formats}:
-                return False
-
-            w, h = im.size
-            if w < min_width or h < min_height:
-                return False
-            if w > max_width or h > max_height:
-                return False
-
-    except Exception:
-        # 任何异常都视为验证失败
+    已持有 ImageInput 时直接传入，文件头只解析一次。
+    """
+    if not isinstance(image_bytes, (bytes, bytearray, ImageInput)):
         return False
-
-    return True
+    return ImageInput.of(image_bytes).validate(
+        allowed_formats=allowed_formats,
+        max_mb=max_mb,
+        min_width=min_width,
+        min_height=min_height,
+        max_width=max_width,
+        max_height=max_height,
+    )
 
 
 def save_uploaded_file(image_bytes: bytes, target_path: str) -> None:
@@ -82,4 +185,75 @@ def save_uploaded_file(image_bytes: bytes, target_path: str) -> None:
         f.write(image_bytes)
 
     # 原子替换，避免并发读到不完整文件
-    os.replace(tmp_path, target_path)
\ No newline at end of file
+    os.replace(tmp_path, target_path)
+
+
+def dhash(image_bytes: bytes, hash_size: int = 8) -> int:
+    """
+    计算图片的差值感知哈希（dHash），返回 hash_size*hash_size 位整数。
+
+    对重新压缩、缩放、轻微调色后的同一张图，哈希的汉明距离很小；
+    用于识别近似重复的上传图片。
+    """
+    with Image.open(io.BytesIO(image_bytes)) as im:
+        # JPEG 可在解码时直接按比例缩小，大图无需完整解码
+        im.draft("L", (hash_size * 4, hash_size * 4))
+        small = im.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+        pixels = small.tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def downscale_reencode(
+    image_bytes: bytes,
+    max_side: int = 1024,
+    fmt: str = "WEBP",
+    quality: int = 85,
+) -> Tuple[bytes, bool]:
+    """
+    按 EXIF 方向摆正、等比缩小到最长边不超过 max_side，并重新编码为 WEBP / JPEG。
+
+    返回 (编码后的字节, 是否有变化)。原图已经足够小、方向无需调整且重编码后并不更小时，
+    原样返回原字节（第二项为 False）。重编码不保留 EXIF 等元数据。
+    """
+    fmt = fmt.upper()
+    if fmt == "JPG":
+        fmt = "JPEG"
+
+    with Image.open(io.BytesIO(image_bytes)) as im:
+        orientation = im.getexif().get(0x0112, 1)  # Orientation
+        # JPEG 可在解码时直接按 1/2、1/4、1/8 缩小，大图无需完整解码
+        im.draft("RGB", (max_side, max_side))
+        out = ImageOps.exif_transpose(im)
+        resized = max(out.size) > max_side
+        if resized:
+            out.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        if fmt == "JPEG" or out.mode not in ("RGB", "RGBA"):
+            if out.mode in ("RGBA", "LA", "P"):
+                rgba = out.convert("RGBA")
+                if fmt == "JPEG":
+                    # JPEG 不支持透明：铺白底
+                    background = Image.new("RGB", rgba.size, (255, 255, 255))
+                    background.paste(rgba, mask=rgba.getchannel("A"))
+                    out = background
+                else:
+                    out = rgba
+            else:
+                out = out.convert("RGB")
+
+        buf = io.BytesIO()
+        save_kwargs = {"quality": int(quality)}
+        if fmt == "JPEG":
+            save_kwargs["optimize"] = True
+        out.save(buf, format=fmt, **save_kwargs)
+        encoded = buf.getvalue()
+
+    if not resized and orientation in (None, 1) and len(encoded) >= len(image_bytes):
+        return image_bytes, False
+    return encoded, True
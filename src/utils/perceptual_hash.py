@@ -0,0 +1,152 @@
+"""
+感知哈希近似重复索引（多索引哈希，Multi-Index Hashing）
+
+把 64 位感知哈希（见 image_utils.dhash）切成 m 段，每段建一张 段值 -> 哈希集合 的表。
+由抽屉原理，汉明距离 <= r 的两个哈希至少有一段的距离 <= r // m；查询时只需在每张表里
+探测与查询段值距离 <= r // m 的桶，再对候选逐个精确计算距离。
+m 取 ceil((r + 1) / 2)，使每段探测半径不超过 1：r=6 时为 4 段 x 16 位，
+百万条目下每次查询只检查约千个候选。
+
+PerceptualHashIndex 按作用域（如 intent + style_preset + 模型）分别建索引，按 LRU 限制总条目数。
+"""
+import threading
+from collections import OrderedDict
+from itertools import combinations
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+
+_MISSING = object()
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHash:
+    """汉明距离近邻索引：查询距离不超过 max_distance 的哈希"""
+
+    def __init__(self, max_distance: int = 6, bits: int = 64):
+        self.max_distance = max(0, int(max_distance))
+        self.bits = bits
+        chunks = min(bits, max(1, (self.max_distance + 2) // 2))
+        self.radius = self.max_distance // chunks
+        # 每段 (起始位, 位宽)
+        base, extra = divmod(bits, chunks)
+        self._chunks: List[Tuple[int, int]] = []
+        start = 0
+        for i in range(chunks):
+            width = base + (1 if i < extra else 0)
+            self._chunks.append((start, width))
+            start += width
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in self._chunks]
+        self._values: Dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _parts(self, hash_value: int) -> Iterator[Tuple[int, int, int]]:
+        for i, (start, width) in enumerate(self._chunks):
+            yield i, (hash_value >> start) & ((1 << width) - 1), width
+
+    def add(self, hash_value: int, value: Any) -> None:
+        """插入一个哈希；已存在时覆盖其 value"""
+        if hash_value not in self._values:
+            for i, part, _ in self._parts(hash_value):
+                self._tables[i].setdefault(part, set()).add(hash_value)
+        self._values[hash_value] = value
+
+    def remove(self, hash_value: int) -> None:
+        if self._values.pop(hash_value, _MISSING) is _MISSING:
+            return
+        for i, part, _ in self._parts(hash_value):
+            bucket = self._tables[i].get(part)
+            if bucket is not None:
+                bucket.discard(hash_value)
+                if not bucket:
+                    del self._tables[i][part]
+
+    def _candidates(self, hash_value: int) -> Set[int]:
+        found: Set[int] = set()
+        for i, part, width in self._parts(hash_value):
+            table = self._tables[i]
+            for r in range(self.radius + 1):
+                for flips in combinations(range(width), r):
+                    probe = part
+                    for bit in flips:
+                        probe ^= 1 << bit
+                    bucket = table.get(probe)
+                    if bucket:
+                        found.update(bucket)
+        return found
+
+    def search(self, hash_value: int) -> List[Tuple[int, Any]]:
+        """返回阈值内的所有 (distance, value)，按距离升序"""
+        results = []
+        for candidate in self._candidates(hash_value):
+            distance = hamming_distance(hash_value, candidate)
+            if distance <= self.max_distance:
+                results.append((distance, self._values[candidate]))
+        results.sort(key=lambda item: item[0])
+        return results
+
+    def get(self, hash_value: int) -> Any:
+        return self._values.get(hash_value)
+
+    def nearest_hash(self, hash_value: int) -> Optional[Tuple[int, int]]:
+        """返回阈值内最近的 (distance, 已索引的哈希)，没有则 None"""
+        if hash_value in self._values:
+            return 0, hash_value
+        best: Optional[Tuple[int, int]] = None
+        for candidate in self._candidates(hash_value):
+            distance = hamming_distance(hash_value, candidate)
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, candidate)
+        return best
+
+    def nearest(self, hash_value: int) -> Optional[Tuple[int, Any]]:
+        """返回阈值内最近的 (distance, value)，没有则 None"""
+        best = self.nearest_hash(hash_value)
+        return (best[0], self._values[best[1]]) if best else None
+
+
+class PerceptualHashIndex:
+    """按作用域划分的近似重复索引（线程安全），超过 max_entries 时淘汰最久未命中的条目"""
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 1_000_000):
+        self.max_distance = int(max_distance)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, MultiIndexHash] = {}
+        self._lru: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def add(self, scope: str, hash_value: int, value: Any) -> None:
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                index = self._indexes[scope] = MultiIndexHash(self.max_distance)
+            index.add(hash_value, value)
+            self._lru[(scope, hash_value)] = None
+            self._lru.move_to_end((scope, hash_value))
+            while len(self._lru) > self.max_entries:
+                (old_scope, old_hash), _ = self._lru.popitem(last=False)
+                old_index = self._indexes[old_scope]
+                old_index.remove(old_hash)
+                if not len(old_index):
+                    del self._indexes[old_scope]
+
+    def nearest(self, scope: str, hash_value: int) -> Optional[Tuple[int, Any]]:
+        """返回同一作用域内阈值内最近的 (distance, value)"""
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                return None
+            best = index.nearest_hash(hash_value)
+            if best is None:
+                return None
+            distance, matched = best
+            # 命中的条目刷新为最近使用
+            self._lru.move_to_end((scope, matched))
+            return distance, index.get(matched)
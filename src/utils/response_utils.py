@@ -6,7 +6,7 @@ from pathlib import Path
 from fastapi import HTTPException
 from fastapi.responses import JSONResponse
 
-from src.core.exceptions import MoodCanvasError
+from src.core.exceptions import MoodCanvasError, ServiceUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -87,6 +87,32 @@ def handle_moodcanvas_error(error: MoodCanvasError) -> JSONResponse:
     logger.error(f"MoodCanvas异常: {error.message}", extra=error.details)
     return JSONResponse(content=error_response, status_code=400)
 
+def service_unavailable_exception(error: ServiceUnavailableError) -> HTTPException:
+    """
+    把过载/背压异常转换为 503，并带上 Retry-After 头
+    
+    Args:
+        error: 服务不可用异常（队列已满、排队超过 SLO 等）
+        
+    Returns:
+        可直接 raise 的 HTTPException
+    """
+    retry_after = error.details.get("retry_after_seconds", 1)
+    logger.warning(f"服务繁忙，拒绝请求: {error.message}")
+    return HTTPException(status_code=503, detail=error.message, headers={"Retry-After": str(retry_after)})
+
+SSE_KEEPALIVE = ": keep-alive\n\n"
+
+def format_sse_event(event: str, data: Any) -> str:
+    """
+    格式化一条 Server-Sent Events 消息
+
+    Args:
+        event: 事件名
+        data: 事件数据（序列化为单行 JSON）
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 def handle_generic_error(error: Exception) -> JSONResponse:
     """
     处理通用异常
@@ -177,7 +203,9 @@ def create_processing_status_response(
     task_id: str,
     status: str,
     progress: Optional[float] = None,
-    estimated_time: Optional[float] = None
+    estimated_time: Optional[float] = None,
+    result: Any = None,
+    error: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     创建处理状态响应
@@ -187,6 +215,8 @@ def create_processing_status_response(
         status: 任务状态
         progress: 进度百分比（0-100）
         estimated_time: 预估剩余时间（秒）
+        result: 任务结果（已完成时）
+        error: 失败原因（失败时）
         
     Returns:
         状态响应字典
@@ -203,6 +233,12 @@ def create_processing_status_response(
     if estimated_time is not None:
         status_data["estimated_time_remaining"] = estimated_time
     
+    if result is not None:
+        status_data["result"] = result
+    
+    if error is not None:
+        status_data["error"] = error
+    
     return create_success_response(
         data=status_data,
         message="状态查询成功"
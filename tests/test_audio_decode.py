@@ -0,0 +1,66 @@
+"""
+内存音频解码测试
+"""
+import io
+import wave
+import numpy as np
+import pytest
+
+from src.core.exceptions import AudioProcessingError
+from src.utils.audio_utils import decode_audio, pcm16_to_float32
+
+
+def make_wav(samples: np.ndarray, sample_rate: int, channels: int = 1) -> bytes:
+    """生成 16bit PCM WAV 数据"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes((samples * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+class TestDecodeAudio:
+    """测试音频解码为 16kHz 单声道 float32 波形"""
+
+    def test_resample_to_16k(self):
+        """测试 8kHz 音频重采样到 16kHz"""
+        data = make_wav(np.zeros(8000, dtype=np.float32), 8000)
+
+        waveform = decode_audio(data)
+
+        assert waveform.dtype == np.float32
+        assert waveform.ndim == 1
+        assert abs(waveform.shape[0] - 16000) <= 1
+
+    def test_stereo_downmix(self):
+        """测试双声道混为单声道"""
+        left = np.full(1600, 0.5, dtype=np.float32)
+        right = np.zeros(1600, dtype=np.float32)
+        interleaved = np.stack([left, right], axis=1).reshape(-1)
+
+        waveform = decode_audio(make_wav(interleaved, 16000, channels=2))
+
+        assert waveform.shape == (1600,)
+        assert waveform.mean() == pytest.approx(0.25, abs=1e-3)
+
+    def test_invalid_data(self):
+        """测试无法解码的数据抛出 AudioProcessingError"""
+        with pytest.raises(AudioProcessingError):
+            decode_audio(b"not audio")
+
+
+class TestPcm16ToFloat32:
+    """测试流式 PCM 分片转换"""
+
+    def test_scale(self):
+        """测试 16bit 采样缩放到 [-1, 1)"""
+        chunk = np.array([0, 16384, -32768], dtype="<i2").tobytes()
+
+        assert pcm16_to_float32(chunk).tolist() == [0.0, 0.5, -1.0]
+
+    def test_odd_length(self):
+        """测试半个采样的分片被拒绝"""
+        with pytest.raises(AudioProcessingError):
+            pcm16_to_float32(b"\x00\x01\x02")
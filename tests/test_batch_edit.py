@@ -0,0 +1,123 @@
+"""
+批量图片编辑测试
+"""
+import asyncio
+
+from src.core.job_queue import JobQueue
+from src.services.image_service import ImageService
+
+
+class StubConfigManager:
+    """最小配置：只提供 ImageService 需要的字段"""
+
+    def __init__(self, tmp_path, max_concurrency=2):
+        self.out_dir = tmp_path / "generated"
+        self.config = {
+            "batch_edit": {
+                "max_concurrency": max_concurrency,
+                "results_db": str(tmp_path / "batch_edit.sqlite3")
+            }
+        }
+
+    def get_image_cfg(self, kind):
+        return {"defaults": {}}
+
+    def get_model_api_key(self, kind):
+        return "test-key"
+
+    def get_generated_images_dir(self):
+        return str(self.out_dir)
+
+
+class FakeImageService(ImageService):
+    """替换单张编辑：记录调用次数与并发度，指定提示词的任务失败"""
+
+    def __init__(self, config_manager, fail_prompts=()):
+        super().__init__(config_manager)
+        self.fail_prompts = set(fail_prompts)
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def edit_image_service(self, original_image_data, new_prompt, **kwargs):
+        self.calls.append(new_prompt)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if new_prompt in self.fail_prompts:
+            raise RuntimeError("Ark API 调用异常: 限流")
+        return {"edit_result": {"remote_url": f"https://example.com/{new_prompt}.png"}, "status": "success"}
+
+
+def _tasks(*prompts):
+    return [{"task_id": f"t-{p}", "original_image_data": b"img", "new_prompt": p} for p in prompts]
+
+
+class TestBatchEdit:
+    """测试批量编辑的并发上限与幂等重试"""
+
+    def test_bounded_concurrency(self, tmp_path, monkeypatch):
+        """测试子任务并发执行且不超过上限"""
+        monkeypatch.chdir(tmp_path)
+        service = FakeImageService(StubConfigManager(tmp_path, max_concurrency=2))
+        result = asyncio.run(service.batch_edit_images(_tasks("a", "b", "c", "d", "e")))
+
+        assert result["successful_tasks"] == 5
+        assert service.peak == 2
+        assert [r["task_id"] for r in result["results"]] == ["t-a", "t-b", "t-c", "t-d", "t-e"]
+
+    def test_retry_skips_finished_tasks(self, tmp_path, monkeypatch):
+        """测试重试同一批次时只重新执行失败的子任务"""
+        monkeypatch.chdir(tmp_path)
+        config_manager = StubConfigManager(tmp_path)
+        first = FakeImageService(config_manager, fail_prompts={"b"})
+        result = asyncio.run(first.batch_edit_images(_tasks("a", "b")))
+        assert result["failed_tasks"] == 1
+        assert "original_image_data" not in result["failed_tasks_details"][0]["task_data"]
+
+        # 新实例模拟进程重启：已完成的结果来自 SQLite
+        retry = FakeImageService(config_manager)
+        result = asyncio.run(retry.batch_edit_images(_tasks("a", "b")))
+
+        assert retry.calls == ["b"]
+        assert result["successful_tasks"] == 2
+        assert result["skipped_tasks"] == 1
+        assert result["results"][0]["result"]["edit_result"]["remote_url"] == "https://example.com/a.png"
+
+    def test_reused_task_id_with_different_input(self, tmp_path, monkeypatch):
+        """测试同一任务 ID 换了输入时报错而不是返回旧结果"""
+        monkeypatch.chdir(tmp_path)
+        service = FakeImageService(StubConfigManager(tmp_path))
+        asyncio.run(service.batch_edit_images(_tasks("a")))
+
+        changed = [{"task_id": "t-a", "original_image_data": b"other", "new_prompt": "a"}]
+        result = asyncio.run(service.batch_edit_images(changed))
+
+        assert result["failed_tasks"] == 1
+        assert "t-a" in result["results"][0]["error"]
+        assert service.calls == ["a"]
+
+        # 冲突不覆盖已成功的记录：用原输入重试仍直接返回之前的结果
+        result = asyncio.run(service.batch_edit_images(_tasks("a")))
+        assert result["skipped_tasks"] == 1
+        assert service.calls == ["a"]
+
+    def test_expired_results_purged_by_queue_maintenance(self, tmp_path, monkeypatch):
+        """测试结果记录超过保留时长后随任务队列维护清理，之后同一任务 ID 重新执行"""
+        monkeypatch.chdir(tmp_path)
+        config = StubConfigManager(tmp_path)
+        config.config["batch_edit"]["retention_hours"] = 1
+        service = FakeImageService(config)
+        asyncio.run(service.batch_edit_images(_tasks("a")))
+        service.batch_results._conn.execute("UPDATE task_results SET updated_at = updated_at - 7200")
+
+        queue = JobQueue()
+        queue.configure({"db_path": str(tmp_path / "jobs.sqlite3")})
+        queue.add_maintenance(service.purge_batch_results)
+        asyncio.run(queue.run_maintenance())
+
+        assert service.batch_results.get(ImageService.BATCH_SCOPE, "t-a") is None
+        result = asyncio.run(service.batch_edit_images(_tasks("a")))
+        assert result["skipped_tasks"] == 0
+        assert service.calls == ["a", "a"]
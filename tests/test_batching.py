@@ -0,0 +1,163 @@
+"""
+动态微批处理测试
+"""
+import gc
+import threading
+import time
+import wave
+import numpy as np
+import pytest
+
+from src.core.batching import MicroBatcher
+from src.core.exceptions import ServiceUnavailableError
+from src.utils.audio_utils import estimate_audio_seconds
+from src.core.metrics import MetricsRegistry, Histogram, get_metrics
+
+
+class TestMicroBatcher:
+    """测试微批处理器"""
+
+    def test_concurrent_requests_are_batched(self):
+        """测试并发请求合并为一批且结果按调用方分发"""
+        batches = []
+
+        def batch_fn(items):
+            batches.append(list(items))
+            return [item.upper() for item in items]
+
+        batcher = MicroBatcher("test_concurrent", batch_fn, max_batch_size=8, max_wait_ms=50)
+        results = {}
+
+        def worker(text):
+            results[text] = batcher.submit(text).result(timeout=5)
+
+        threads = [threading.Thread(target=worker, args=(f"t{i}",)) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert results == {f"t{i}": f"T{i}" for i in range(6)}
+        assert len(batches) < 6
+
+    def test_max_batch_size(self):
+        """测试批大小不超过上限"""
+        sizes = []
+
+        def batch_fn(items):
+            sizes.append(len(items))
+            return items
+
+        batcher = MicroBatcher("test_max_size", batch_fn, max_batch_size=2, max_wait_ms=20)
+        futures = [batcher.submit(i) for i in range(5)]
+
+        assert [f.result(timeout=5) for f in futures] == list(range(5))
+        assert max(sizes) <= 2
+
+    def test_batch_error_propagates(self):
+        """测试批处理异常传递给每个调用方"""
+        def batch_fn(items):
+            raise ValueError("推理失败")
+
+        batcher = MicroBatcher("test_error", batch_fn, max_batch_size=4, max_wait_ms=1)
+
+        with pytest.raises(ValueError, match="推理失败"):
+            batcher.submit("x").result(timeout=5)
+
+    def test_bucket_fn_groups_similar_items(self):
+        """测试只有同一分桶的条目才会合批"""
+        batches = []
+
+        def batch_fn(items):
+            batches.append(sorted(items))
+            return items
+
+        batcher = MicroBatcher(
+            "test_bucket", batch_fn, max_batch_size=8, max_wait_ms=50,
+            bucket_fn=lambda seconds: int(seconds // 2)
+        )
+        futures = [batcher.submit(s) for s in (0.5, 3.0, 1.5, 3.5)]
+
+        assert [f.result(timeout=5) for f in futures] == [0.5, 3.0, 1.5, 3.5]
+        assert sorted(batches) == [[0.5, 1.5], [3.0, 3.5]]
+
+    def test_rejects_when_queue_full(self):
+        """测试积压达到队列上限时拒绝新请求"""
+        release = threading.Event()
+
+        def batch_fn(items):
+            release.wait(timeout=5)
+            return items
+
+        batcher = MicroBatcher("test_queue_full", batch_fn, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+        futures = [batcher.submit(i) for i in range(2)]
+
+        with pytest.raises(ServiceUnavailableError):
+            batcher.submit(2)
+        release.set()
+        assert [f.result(timeout=5) for f in futures] == [0, 1]
+
+    def test_rejects_when_estimated_wait_exceeds_slo(self):
+        """测试预计排队时间超过 SLO 时拒绝新请求"""
+        def batch_fn(items):
+            time.sleep(0.05)
+            return items
+
+        batcher = MicroBatcher("test_slo", batch_fn, max_batch_size=1, max_wait_ms=0, max_queue_wait_ms=120)
+        batcher.submit("warmup").result(timeout=5)
+        futures = [batcher.submit(i) for i in range(2)]
+
+        with pytest.raises(ServiceUnavailableError) as exc_info:
+            for i in range(2, 10):
+                futures.append(batcher.submit(i))
+        assert exc_info.value.details["estimated_wait_ms"] > 120
+        for f in futures:
+            f.result(timeout=5)
+
+    def test_estimate_audio_seconds(self, tmp_path):
+        """测试音频时长估算（WAV 头 / 波形数组）"""
+        path = tmp_path / "clip.wav"
+        with wave.open(str(path), "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(16000)
+            wav_file.writeframes(b"\x00\x00" * 24000)
+
+        assert estimate_audio_seconds(str(path)) == pytest.approx(1.5)
+        assert estimate_audio_seconds(np.zeros(32000, dtype=np.float32)) == pytest.approx(2.0)
+        assert estimate_audio_seconds(str(tmp_path / "missing.wav")) == 0.0
+
+
+class TestMetrics:
+    """测试指标注册表"""
+
+    def test_histogram_snapshot(self):
+        """测试直方图累计分桶"""
+        hist = Histogram(buckets=(1, 10))
+        for value in (0.5, 5, 50):
+            hist.observe(value)
+
+        snapshot = hist.snapshot()
+
+        assert snapshot["count"] == 3
+        assert snapshot["buckets"] == {"1": 1, "10": 2, "+Inf": 3}
+
+    def test_registry_reuses_metric(self):
+        """测试同名指标复用"""
+        registry = MetricsRegistry()
+        registry.counter("hits").inc()
+        registry.counter("hits").inc(2)
+
+        assert registry.snapshot()["hits"]["value"] == 3
+
+    def test_gauge_sums_instances_without_keeping_them_alive(self):
+        """测试同名批处理器的积压数求和，实例被回收后不再计入"""
+        first = MicroBatcher("gauge_test", lambda items: items)
+        second = MicroBatcher("gauge_test", lambda items: items)
+        first._backlog, second._backlog = 3, 4
+        gauge = get_metrics().gauge("gauge_test.queue_depth")
+        assert gauge.value == 7
+
+        del first
+        gc.collect()
+        assert gauge.value == 4
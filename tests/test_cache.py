@@ -0,0 +1,154 @@
+"""
+结果缓存测试
+"""
+import time
+
+import pytest
+
+from src.core.cache import (
+    DiskCache, MemoryCache, SQLiteCache, TieredCache, build_tiered_cache, make_cache_key, normalize_cache_text
+)
+from src.core.metrics import get_metrics
+
+
+class TestMemoryCache:
+    """测试内存 LRU 缓存"""
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        cache = MemoryCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_ttl_expiry(self):
+        """测试条目过期后不再返回"""
+        cache = MemoryCache(ttl_seconds=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestDiskCache:
+    """测试磁盘缓存"""
+
+    def test_roundtrip_and_expiry(self, tmp_path):
+        """测试写入读取与过期清理"""
+        cache = DiskCache(str(tmp_path), ttl_seconds=60)
+        key = make_cache_key("hash", "intent")
+        cache.set(key, {"caption": "海边"})
+        cache.set("ff" + key[2:], {"caption": "旧"}, ttl=0.01)
+        time.sleep(0.02)
+
+        assert DiskCache(str(tmp_path)).get(key) == {"caption": "海边"}
+        assert cache.purge_expired() == 1
+        assert len(list(tmp_path.glob("*/*.json"))) == 1
+
+    def test_corrupt_entry_dropped(self, tmp_path):
+        """测试损坏的缓存文件被丢弃"""
+        cache = DiskCache(str(tmp_path))
+        cache.set("abc", {"x": 1})
+        (tmp_path / "ab" / "abc.json").write_text("{broken", encoding="utf-8")
+
+        assert cache.get("abc") is None
+        assert not (tmp_path / "ab" / "abc.json").exists()
+
+
+class TestSQLiteCache:
+    """测试 SQLite 缓存"""
+
+    def test_persists_across_instances(self, tmp_path):
+        """测试重新打开后仍能读到缓存"""
+        path = str(tmp_path / "cache.sqlite3")
+        cache = SQLiteCache(path)
+        cache.set("k", ["文案一", "文案二"])
+        cache.close()
+
+        assert SQLiteCache(path).get("k") == ["文案一", "文案二"]
+
+    def test_expiry_and_trim(self, tmp_path):
+        """测试过期清理与条目数上限"""
+        cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+        cache.set("old", 1, ttl=0.01)
+        for i in range(3):
+            cache.set(f"k{i}", i)
+        time.sleep(0.02)
+
+        assert cache.purge_expired() == 2
+        assert len(cache) == 2
+        assert cache.get("k0") is None
+        assert cache.get("k2") == 2
+
+
+class TestTieredCache:
+    """测试多级缓存"""
+
+    def test_backfill_and_metrics(self, tmp_path):
+        """测试磁盘命中回填内存，并记录命中/未命中指标"""
+        disk = DiskCache(str(tmp_path))
+        disk.set("k", {"v": 1})
+        memory = MemoryCache()
+        cache = TieredCache("test_tiered", [memory, disk])
+
+        assert cache.get("k") == {"v": 1}
+        assert memory.get("k") == {"v": 1}
+        assert cache.get("missing") is None
+
+        snapshot = get_metrics().snapshot()
+        assert snapshot["cache.test_tiered.hits"]["value"] == 1
+        assert snapshot["cache.test_tiered.hits.disk"]["value"] == 1
+        assert snapshot["cache.test_tiered.misses"]["value"] == 1
+
+    def test_backfill_keeps_remaining_ttl(self, tmp_path):
+        """测试回填内存时沿用下层条目的剩余有效期，不过期的条目回填后也不过期"""
+        sqlite = SQLiteCache(str(tmp_path / "cache.db"), ttl_seconds=3600)
+        sqlite.set("near", "v", ttl=5)
+        sqlite.set("forever", "v", ttl=0)
+        memory = MemoryCache(ttl_seconds=3600)
+        cache = TieredCache("test_tiered_ttl", [memory, sqlite])
+
+        assert cache.get("near") == "v"
+        assert cache.get("forever") == "v"
+        assert memory.get_entry("near")[1] == pytest.approx(sqlite.get_entry("near")[1], abs=1)
+        assert memory.get_entry("forever")[1] == 0
+        sqlite.close()
+
+    def test_scan_skips_expired(self, tmp_path):
+        """测试各级缓存遍历只返回未过期的条目，多级缓存遍历最后一级"""
+        disk = DiskCache(str(tmp_path / "disk"))
+        sqlite = SQLiteCache(str(tmp_path / "cache.db"))
+        memory = MemoryCache()
+        for tier in (memory, disk, sqlite):
+            tier.set("live", {"v": 1})
+            tier.set("dead", {"v": 2}, ttl=0.01)
+        time.sleep(0.02)
+
+        for tier in (memory, disk, sqlite):
+            assert list(tier.scan()) == [("live", {"v": 1})]
+        assert list(sqlite.scan(batch_size=1)) == [("live", {"v": 1})]
+        assert list(TieredCache("test_scan", [memory, disk]).scan()) == [("live", {"v": 1})]
+        sqlite.close()
+
+    def test_build_disabled(self):
+        """测试未启用时不构建缓存"""
+        assert build_tiered_cache("off", {"enabled": False}) is None
+        assert build_tiered_cache("off", None) is None
+
+    def test_key_depends_on_all_parts(self):
+        """测试缓存键区分 intent / style_preset / 模型"""
+        base = make_cache_key("md5", "情感分析", None, "model-a")
+
+        assert base == make_cache_key("md5", "情感分析", None, "model-a")
+        assert base != make_cache_key("md5", "情感分析", "vivid", "model-a")
+        assert base != make_cache_key("md5", "情感分析", None, "model-b")
+
+    def test_normalize_cache_text(self):
+        """测试全角字符与空白差异归一化后一致"""
+        assert normalize_cache_text("  情感标签：ｊｏｙ，\n\n  happy ") == normalize_cache_text("情感标签:joy, happy")
@@ -0,0 +1,165 @@
+"""
+多模型情感分析流水线测试
+"""
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("funasr")
+pytest.importorskip("transformers")
+
+from src.core.cache import DiskCache, MemoryCache, TieredCache
+from src.core.metrics import get_metrics
+from src.services.emotion_analyzer import ImageEmotionAnalyzerService, MultiModelEmotionAnalyzer
+from src.utils.image_utils import ImageInput
+from src.utils.perceptual_hash import PerceptualHashIndex
+
+
+class StubTextEmotionModel:
+    """替代文本情感模型：返回固定结果"""
+
+    def __init__(self, result):
+        self.result = result
+
+    def analyze(self, text):
+        return self.result
+
+
+class StubAudioEmotionModel:
+    """替代 emotion2vec：返回固定结果"""
+
+    def __init__(self, result):
+        self.result = result
+
+    def analyze(self, audio):
+        return self.result
+
+
+class StubASRModel:
+    """替代 Paraformer：返回固定转写"""
+
+    def transcribe(self, audio):
+        return "今天很开心"
+
+
+class StubConfigManager:
+    config = {"settings": {}}
+
+
+class StubImageGenerator:
+    """替代文生图：记录提示词"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return {"remote_urls": ["https://example.com/a.png"]}
+
+
+def make_analyzer(text_result=None) -> MultiModelEmotionAnalyzer:
+    # 不经过 __init__：跳过模型注册表与远程客户端
+    analyzer = MultiModelEmotionAnalyzer.__new__(MultiModelEmotionAnalyzer)
+    analyzer.text_emotion_model = StubTextEmotionModel(
+        [{"label": "joy", "score": 0.9}] if text_result is None else text_result
+    )
+    analyzer.audio_emotion_model = None
+    analyzer.image_generator = StubImageGenerator()
+    return analyzer
+
+
+class TestProcessTextService:
+    """测试文字处理服务"""
+
+    def test_end_to_end(self):
+        """测试文字 -> 情感 -> 文案 -> 图片完整走通"""
+        analyzer = make_analyzer()
+        result = asyncio.run(analyzer.process_text_service("今天很开心"))
+
+        assert result["status"] == "success"
+        assert result["generated_content"]["image_url"] == ["https://example.com/a.png"]
+        assert "joy" in result["generated_content"]["text"]
+        assert "今天很开心" in analyzer.image_generator.prompts[0]
+
+
+class TestEmotionStages:
+    """测试情感阶段的失败回退"""
+
+    def test_empty_model_result_is_failure(self):
+        """测试模型内部出错返回空列表时回退为 neutral 并记入 failures"""
+        analyzer = make_analyzer(text_result=[])
+        analyzer.audio_emotion_model = StubAudioEmotionModel([])
+        failures = []
+
+        assert asyncio.run(analyzer._text_emotion_stage("你好", failures)) == ["neutral"]
+        assert asyncio.run(analyzer._audio_emotion_stage(np.zeros(16000, dtype=np.float32), failures)) == ["neutral"]
+        assert failures == ["text_emotion", "audio_emotion"]
+
+    def test_fallback_result_not_cached(self):
+        """测试有阶段回退时三阶段结果不写入缓存，模型恢复后重新分析"""
+        analyzer = make_analyzer(text_result=[])
+        analyzer.asr_model = StubASRModel()
+        analyzer.config_manager = StubConfigManager()
+        analyzer.three_stage_cache = MemoryCache(max_entries=8)
+        waveform = np.zeros(16000, dtype=np.float32)
+
+        first = asyncio.run(analyzer.run_three_stage_analysis(waveform))
+        assert first["emotion_analysis"]["text_emotion"] == ["neutral"]
+
+        analyzer.text_emotion_model.result = [{"label": "joy", "score": 0.9}]
+        second = asyncio.run(analyzer.run_three_stage_analysis(waveform))
+        assert not second["cached"]
+        assert second["emotion_analysis"]["text_emotion"] == ["joy"]
+
+
+class StubVLMClient:
+    """替代豆包 VLM：记录调用次数"""
+
+    model = "stub-vlm"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def analyze_image(self, image, intent, style_preset=None):
+        self.calls += 1
+        return {"caption": "色块"}
+
+
+def make_image(size=(256, 192), fmt="PNG", quality=95) -> bytes:
+    rng = np.random.default_rng(1)
+    blocks = rng.integers(0, 255, size=(6, 8, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(blocks).resize(size, Image.Resampling.BILINEAR).save(buffer, format=fmt, quality=quality)
+    return buffer.getvalue()
+
+
+def make_image_service(cache_dir) -> ImageEmotionAnalyzerService:
+    # 不经过 __init__：模拟一个新进程，内存级别与感知哈希索引都是空的
+    service = ImageEmotionAnalyzerService.__new__(ImageEmotionAnalyzerService)
+    service.vlm = StubVLMClient()
+    service.vlm_cache = TieredCache("vlm_test", [MemoryCache(), DiskCache(str(cache_dir))])
+    service.phash_index = PerceptualHashIndex()
+    service._near_hits = get_metrics().counter("cache.vlm_test.near_duplicate_hits")
+    return service
+
+
+class TestVLMPerceptualCache:
+    """测试 VLM 近似重复缓存"""
+
+    def test_index_rebuilt_after_restart(self, tmp_path):
+        """测试重启后从磁盘缓存重建感知哈希索引，重新压缩的同一张图仍命中"""
+        first = make_image_service(tmp_path)
+        analysis, cached = asyncio.run(first._analyze_cached(ImageInput(make_image()), "意图", None))
+        assert not cached and "_phash" not in analysis
+
+        second = make_image_service(tmp_path)
+        second._rebuild_phash_index()
+        recompressed = ImageInput(make_image(size=(128, 96), fmt="JPEG", quality=60))
+        analysis, cached = asyncio.run(second._analyze_cached(recompressed, "意图", None))
+
+        assert cached
+        assert analysis == {"caption": "色块"}
+        assert second.vlm.calls == 0
@@ -0,0 +1,74 @@
+"""
+执行层（cpu / io 线程池）测试
+"""
+import asyncio
+import threading
+import pytest
+
+from src.core.exceptions import ServiceUnavailableError
+from src.core.executors import BoundedExecutor, ExecutionLayer
+
+
+class TestBoundedExecutor:
+    """测试有界线程池"""
+
+    def test_runs_off_event_loop(self):
+        """测试阻塞函数在线程池中执行，不占用事件循环线程"""
+        pool = BoundedExecutor("test_offload", max_workers=2)
+
+        async def main():
+            loop_thread = threading.get_ident()
+            worker_thread = await pool.run(threading.get_ident)
+            return loop_thread, worker_thread
+
+        loop_thread, worker_thread = asyncio.run(main())
+        pool.shutdown()
+
+        assert loop_thread != worker_thread
+
+    def test_rejects_when_queue_full(self):
+        """测试排队数达到上限时拒绝新任务"""
+        pool = BoundedExecutor("test_reject", max_workers=1, max_queue=1)
+        release = threading.Event()
+
+        async def main():
+            running = asyncio.ensure_future(pool.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+            await asyncio.sleep(0)
+            assert pool.snapshot()["saturation"] == 2.0
+            with pytest.raises(ServiceUnavailableError):
+                await pool.run(lambda: "rejected")
+            release.set()
+            return await running, await queued
+
+        assert asyncio.run(main()) == (True, "queued")
+        pool.shutdown()
+
+    def test_exception_propagates(self):
+        """测试任务异常传回调用方且计数恢复"""
+        pool = BoundedExecutor("test_error", max_workers=1)
+
+        def fail():
+            raise RuntimeError("远程调用失败")
+
+        with pytest.raises(RuntimeError, match="远程调用失败"):
+            asyncio.run(pool.run(fail))
+        pool.shutdown()
+
+        assert pool.snapshot()["active"] == 0
+        assert pool.snapshot()["queued"] == 0
+
+
+class TestExecutionLayer:
+    """测试执行层配置"""
+
+    def test_configure_pool_sizes(self):
+        """测试按配置创建 cpu / io 线程池"""
+        layer = ExecutionLayer()
+        layer.configure({"cpu_workers": 2, "io_workers": 6, "io_max_queue": 10})
+
+        assert layer.cpu.max_workers == 2
+        assert layer.io.max_workers == 6
+        assert layer.io.max_queue == 10
+        layer.shutdown()
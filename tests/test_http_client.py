@@ -0,0 +1,149 @@
+"""
+共享 HTTP 客户端测试
+"""
+import asyncio
+import base64
+import json
+import os
+
+import httpx
+
+from src.core.http_client import (
+    HostLimitedTransport, HttpClientManager, InlineDataURL, StreamingJSONBody
+)
+
+
+class TestHostLimitedTransport:
+    """测试按主机限制并发"""
+
+    def test_per_host_limit(self):
+        """测试同一主机同时在途请求数不超过上限，不同主机互不影响"""
+        in_flight = {}
+        peak = {}
+
+        async def handler(request):
+            host = request.url.host
+            in_flight[host] = in_flight.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+            # 流式响应体：与真实传输层一样，读完后关闭流才释放名额
+            return httpx.Response(200, stream=httpx.ByteStream(b"ok"))
+
+        transport = HostLimitedTransport(
+            httpx.MockTransport(handler), per_host_limit=2, host_limits={"b.example.com": 4}
+        )
+
+        async def main():
+            async with httpx.AsyncClient(transport=transport) as client:
+                urls = ["https://a.example.com/x"] * 6 + ["https://b.example.com/y"] * 6
+                responses = await asyncio.gather(*(client.get(url) for url in urls))
+                return [r.text for r in responses]
+
+        assert asyncio.run(main()) == ["ok"] * 12
+        assert transport._semaphore("a.example.com")._value == 2
+        assert peak["a.example.com"] == 2
+        assert peak["b.example.com"] == 4
+
+    def test_slot_released_on_error(self):
+        """测试上游异常时释放并发名额"""
+        async def handler(request):
+            raise httpx.ConnectError("连接失败", request=request)
+
+        transport = HostLimitedTransport(httpx.MockTransport(handler), per_host_limit=1)
+
+        async def main():
+            async with httpx.AsyncClient(transport=transport) as client:
+                for _ in range(3):
+                    try:
+                        await client.get("https://a.example.com/")
+                    except httpx.ConnectError:
+                        pass
+            return transport._semaphore("a.example.com")._value
+
+        assert asyncio.run(main()) == 1
+
+
+class TestHttpClientManager:
+    """测试共享客户端管理"""
+
+    def test_client_shared_within_loop(self):
+        """测试同一事件循环内复用同一客户端"""
+        manager = HttpClientManager()
+        manager.configure({"timeouts": {"read": 5}})
+
+        async def main():
+            first = manager.get_client()
+            second = manager.get_client()
+            await manager.aclose()
+            return first, second
+
+        first, second = asyncio.run(main())
+
+        assert first is second
+        assert first.timeout.read == 5
+        assert first.timeout.connect == HttpClientManager.DEFAULTS["timeouts"]["connect"]
+
+    def test_http2_requires_h2(self, monkeypatch, caplog):
+        """测试启用 HTTP/2 但缺少 h2 时告警并退回 HTTP/1.1"""
+        manager = HttpClientManager()
+        manager.configure({"http2": True})
+        monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+
+        assert not manager.http2_enabled
+        assert "HTTP/1.1" in caplog.text
+
+        manager.configure({"http2": False})
+        assert not manager.http2_enabled
+
+
+
+class TestStreamingJSONBody:
+    """测试内嵌图片的流式 JSON 请求体"""
+
+    def _collect(self, body) -> bytes:
+        async def main():
+            return b"".join([chunk async for chunk in body])
+        return asyncio.run(main())
+
+    def test_matches_json_dumps(self):
+        """测试输出与拼出完整 data URL 后 json.dumps 的结果逐字节一致"""
+        images = [os.urandom(n) for n in (0, 1, 2, StreamingJSONBody.CHUNK_SIZE * 2 + 1)]
+        payload = {
+            "model": "m",
+            "items": [{"url": InlineDataURL(data, "image/png")} for data in images],
+            "text": "提示词 \"quoted\""
+        }
+        expected = json.dumps({
+            "model": "m",
+            "items": [{"url": f"data:image/png;base64,{base64.b64encode(data).decode('ascii')}"} for data in images],
+            "text": "提示词 \"quoted\""
+        }).encode("utf-8")
+
+        body = StreamingJSONBody(payload)
+        assert self._collect(body) == expected
+        assert body.content_length == len(expected)
+        # 可重复迭代（重定向 / 重试时重新发送）
+        assert self._collect(body) == expected
+
+    def test_sent_with_content_length(self):
+        """测试按 Content-Length 发送，不使用分块传输编码"""
+        data = os.urandom(100_000)
+        received = {}
+
+        async def handler(request):
+            received["headers"] = request.headers
+            received["body"] = b"".join([chunk async for chunk in request.stream])
+            return httpx.Response(200)
+
+        async def main():
+            body = StreamingJSONBody({"image": InlineDataURL(data, "image/jpeg")})
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                await client.post("https://a.example.com/", content=body, headers=body.headers)
+
+        asyncio.run(main())
+        assert "transfer-encoding" not in received["headers"]
+        assert int(received["headers"]["content-length"]) == len(received["body"])
+        assert json.loads(received["body"])["image"] == (
+            f"data:image/jpeg;base64,{base64.b64encode(data).decode('ascii')}"
+        )
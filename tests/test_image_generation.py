@@ -0,0 +1,122 @@
+"""
+文生图并发生成测试
+"""
+import asyncio
+import pytest
+
+from src.models.image.text2image import ImageGenerator
+from src.services import image_jobs
+
+
+class StubConfigManager:
+    """最小配置：只提供 ImageGenerator 需要的字段"""
+
+    def __init__(self, out_dir, max_concurrency=2):
+        self.out_dir = out_dir
+        self.max_concurrency = max_concurrency
+
+    def get_image_cfg(self, kind):
+        return {"max_concurrency": self.max_concurrency, "defaults": {"num_images": 1}}
+
+    def get_model_api_key(self, kind):
+        return "test-key"
+
+    def get_generated_images_dir(self):
+        return str(self.out_dir)
+
+
+class FakeGenerator(ImageGenerator):
+    """替换远程调用：记录并发度，指定序号的调用失败"""
+
+    def __init__(self, config_manager, fail_calls=(), fail_downloads=()):
+        super().__init__(config_manager)
+        self.fail_calls = set(fail_calls)
+        self.fail_downloads = set(fail_downloads)
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    def _ark_client(self):
+        return None
+
+    async def _one_call(self, client, prompt, guidance_scale, size, seed, watermark):
+        call = self.calls
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if call in self.fail_calls:
+            raise RuntimeError("Ark API 调用异常: 限流")
+        return f"https://example.com/{call}.png"
+
+    async def _download(self, url, out_path):
+        if url in self.fail_downloads:
+            raise RuntimeError("连接被重置")
+        return str(out_path)
+
+
+class TestImageGenerator:
+    """测试多张图并发生成"""
+
+    def test_concurrency_cap(self, tmp_path):
+        """测试并发数不超过 max_concurrency"""
+        generator = FakeGenerator(StubConfigManager(tmp_path, max_concurrency=2))
+
+        result = asyncio.run(generator.generate("海边日落", num_images=5, save_local=True))
+
+        assert len(result["remote_urls"]) == 5
+        assert len(result["local_paths"]) == 5
+        assert generator.peak == 2
+        assert "errors" not in result
+
+    def test_partial_success(self, tmp_path):
+        """测试单张失败不影响其它图片"""
+        generator = FakeGenerator(StubConfigManager(tmp_path, max_concurrency=4), fail_calls={1})
+
+        result = asyncio.run(generator.generate("海边日落", num_images=3))
+
+        assert len(result["remote_urls"]) == 2
+        assert len(result["errors"]) == 1
+        assert result["errors"][0]["stage"] == "generate"
+        assert "限流" in result["errors"][0]["error"]
+
+    def test_download_failure_keeps_remote_url(self, tmp_path):
+        """测试已生成的图片下载失败时仍返回 remote_url，错误单独记录"""
+        generator = FakeGenerator(
+            StubConfigManager(tmp_path, max_concurrency=1), fail_downloads={"https://example.com/1.png"}
+        )
+
+        result = asyncio.run(generator.generate("海边日落", num_images=2, save_local=True))
+
+        assert result["remote_urls"] == ["https://example.com/0.png", "https://example.com/1.png"]
+        assert len(result["local_paths"]) == 1
+        assert "local_path" not in result["outputs"][1]
+        assert result["errors"] == [{"index": 1, "stage": "download", "error": "图片下载失败: 连接被重置"}]
+
+    def test_run_generate_local_url_per_output(self, tmp_path, monkeypatch):
+        """测试任务结果按图片给出 local_url，下载失败的图片只有 remote_url"""
+        config = StubConfigManager(tmp_path, max_concurrency=1)
+        monkeypatch.setattr(
+            image_jobs, "ImageGenerator",
+            lambda cm: FakeGenerator(cm, fail_downloads={"https://example.com/0.png"})
+        )
+
+        payload = asyncio.run(image_jobs.run_generate(
+            config, {"prompt": "海边日落", "num_images": 2, "save_local": True}
+        ))
+
+        assert payload["status"] == "partial"
+        assert [o["remote_url"] for o in payload["outputs"]] == [
+            "https://example.com/0.png", "https://example.com/1.png"
+        ]
+        assert "local_url" not in payload["outputs"][0]
+        assert payload["outputs"][1]["local_url"].startswith(image_jobs.STATIC_PREFIX)
+        assert payload["errors"][0]["stage"] == "download"
+
+    def test_all_failed_raises(self, tmp_path):
+        """测试全部失败时抛出异常"""
+        generator = FakeGenerator(StubConfigManager(tmp_path), fail_calls={0, 1})
+
+        with pytest.raises(RuntimeError, match="限流"):
+            asyncio.run(generator.generate("海边日落", num_images=2))
@@ -0,0 +1,66 @@
+"""
+ImageInput 单次解析测试
+"""
+import io
+
+from PIL import Image
+
+from src.utils import image_utils
+from src.utils.image_utils import ImageInput, validate_image_file
+
+
+def _image_bytes(fmt="PNG", size=(64, 48)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 80, 40)).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+class TestImageInput:
+    """测试图片输入的解析缓存与校验"""
+
+    def test_header_parsed_once(self, monkeypatch):
+        """测试格式、尺寸、MIME、校验共用一次 Pillow 打开"""
+        opened = []
+        real_open = image_utils.Image.open
+
+        def counting_open(fp, *args, **kwargs):
+            opened.append(fp)
+            return real_open(fp, *args, **kwargs)
+
+        monkeypatch.setattr(image_utils.Image, "open", counting_open)
+        image = ImageInput(_image_bytes("JPEG"))
+
+        assert image.format == "JPEG"
+        assert image.size == (64, 48)
+        assert image.mime == "image/jpeg"
+        assert image.ext == "jpeg"
+        assert image.validate()
+        assert validate_image_file(image)
+        assert len(opened) == 1
+
+    def test_hash_cached(self):
+        """测试内容哈希只计算一次"""
+        image = ImageInput(_image_bytes("PNG"))
+
+        assert image.content_hash is image.content_hash
+
+    def test_validate_rejects_bad_input(self):
+        """测试损坏、过小与不允许的格式"""
+        assert not ImageInput(b"not an image").validate()
+        assert ImageInput(b"not an image").mime == "image/png"
+        assert not ImageInput(_image_bytes(size=(8, 8))).validate()
+        assert not ImageInput(_image_bytes("GIF")).validate()
+        assert not validate_image_file(b"")
+        assert not validate_image_file("path.png")
+        assert validate_image_file(_image_bytes())
+
+    def test_of_and_save(self, tmp_path):
+        """测试 of 不重复包装，save 后记录路径"""
+        image = ImageInput(_image_bytes())
+        assert ImageInput.of(image) is image
+
+        target = tmp_path / "sub" / "a.png"
+        image.save(str(target))
+        assert image.path == str(target)
+        assert target.read_bytes() == image.data
+        assert ImageInput.from_path(str(target)).format == "PNG"
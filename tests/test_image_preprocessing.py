@@ -0,0 +1,107 @@
+"""
+图片预处理（摆正、缩小、重编码）测试
+"""
+import asyncio
+import io
+
+from PIL import Image
+
+from src.utils import image_preprocessing
+from src.utils.image_preprocessing import ImagePreprocessor
+from src.utils.image_utils import ImageInput, downscale_reencode
+
+
+def _jpeg_bytes(size=(400, 200), orientation=None, quality=95) -> bytes:
+    buf = io.BytesIO()
+    im = Image.effect_noise(size, 64).convert("RGB")
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    im.save(buf, format="JPEG", quality=quality, exif=exif)
+    return buf.getvalue()
+
+
+class TestDownscaleReencode:
+    """测试单张图片的缩放与重编码"""
+
+    def test_downscale_and_exif_orientation(self):
+        """测试按 EXIF 方向摆正后再等比缩小，且不保留 EXIF"""
+        data, changed = downscale_reencode(_jpeg_bytes((400, 200), orientation=6), max_side=100, fmt="WEBP")
+
+        assert changed
+        with Image.open(io.BytesIO(data)) as im:
+            assert im.format == "WEBP"
+            assert im.size == (50, 100)
+            assert im.getexif().get(0x0112) is None
+
+    def test_small_image_kept(self):
+        """测试已足够小、方向正常且重编码不更小时返回原字节"""
+        buf = io.BytesIO()
+        Image.new("RGB", (32, 32), (10, 20, 30)).save(buf, format="WEBP", quality=10)
+        original = buf.getvalue()
+
+        data, changed = downscale_reencode(original, max_side=1024, fmt="JPEG", quality=95)
+        assert not changed
+        assert data is original
+
+    def test_transparent_png_to_jpeg(self):
+        """测试透明 PNG 转 JPEG 时铺白底"""
+        buf = io.BytesIO()
+        Image.new("RGBA", (300, 300), (0, 0, 0, 0)).save(buf, format="PNG")
+
+        data, changed = downscale_reencode(buf.getvalue(), max_side=100, fmt="JPEG")
+        assert changed
+        with Image.open(io.BytesIO(data)) as im:
+            assert im.mode == "RGB"
+            assert im.getpixel((50, 50)) == (255, 255, 255)
+
+
+class TestImagePreprocessor:
+    """测试按目标生成派生图与缓存"""
+
+    def _preprocessor(self, **vlm) -> ImagePreprocessor:
+        preprocessor = ImagePreprocessor()
+        preprocessor.configure({"targets": {"vlm": {"max_side": 100, "format": "WEBP", **vlm}}})
+        return preprocessor
+
+    def test_variant_cached_across_inputs(self, monkeypatch):
+        """测试同一内容的第二次上传直接命中派生图缓存"""
+        calls = []
+        real = image_preprocessing.downscale_reencode
+
+        def counting(*args):
+            calls.append(args[1:])
+            return real(*args)
+
+        monkeypatch.setattr(image_preprocessing, "downscale_reencode", counting)
+        preprocessor = self._preprocessor()
+        data = _jpeg_bytes()
+
+        first = asyncio.run(preprocessor.prepare(ImageInput(data), "vlm"))
+        second = asyncio.run(preprocessor.prepare(ImageInput(data), "vlm"))
+
+        assert calls == [(100, "WEBP", 85)]
+        assert first.format == "WEBP"
+        assert first.size == (100, 50)
+        assert second.data == first.data
+        assert len(first.data) < len(data)
+
+    def test_variant_memoized_on_input(self):
+        """测试同一个 ImageInput 重复预处理返回同一个派生图"""
+        preprocessor = self._preprocessor()
+        image = ImageInput(_jpeg_bytes())
+
+        variant = asyncio.run(preprocessor.prepare(image, "vlm"))
+        assert asyncio.run(preprocessor.prepare(image, "vlm")) is variant
+
+    def test_disabled_or_invalid_returns_original(self):
+        """测试未启用、未知目标或无法解码时返回原图"""
+        preprocessor = self._preprocessor()
+        image = ImageInput(_jpeg_bytes())
+        assert asyncio.run(preprocessor.prepare(image, "unknown")) is image
+
+        broken = ImageInput(b"not an image")
+        assert asyncio.run(preprocessor.prepare(broken, "vlm")) is broken
+
+        preprocessor.configure({"enabled": False})
+        assert asyncio.run(preprocessor.prepare(image, "vlm")) is image
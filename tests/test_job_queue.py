@@ -0,0 +1,173 @@
+"""
+持久化任务队列测试
+"""
+import asyncio
+import time
+
+import pytest
+
+from src.core.job_queue import (
+    JobQueue, JobStore, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED
+)
+
+
+class TestJobStore:
+    """测试 SQLite 任务表"""
+
+    def test_claim_in_submission_order(self, tmp_path):
+        """测试按提交顺序领取，且同一任务不会被领取两次"""
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        first = store.submit("echo", {"n": 1})
+        second = store.submit("echo", {"n": 2})
+
+        claimed = store.claim(["echo"], lease_seconds=60)
+        assert claimed["id"] == first
+        assert claimed["status"] == JOB_RUNNING
+        assert claimed["attempts"] == 1
+        assert claimed["payload"] == {"n": 1}
+        assert store.claim(["echo"], lease_seconds=60)["id"] == second
+        assert store.claim(["echo"], lease_seconds=60) is None
+        assert store.claim(["other"], lease_seconds=60) is None
+
+    def test_finish_records_result_and_error(self, tmp_path):
+        """测试成功与失败结果写回"""
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        ok = store.submit("echo", {})
+        bad = store.submit("echo", {})
+        store.finish(ok, {"outputs": ["x"]})
+        store.finish(bad, error="boom")
+
+        assert store.get(ok)["status"] == JOB_SUCCEEDED
+        assert store.get(ok)["result"] == {"outputs": ["x"]}
+        assert store.get(bad)["status"] == JOB_FAILED
+        assert store.get(bad)["error"] == "boom"
+        assert store.get("missing") is None
+
+    def test_recover_expired_lease(self, tmp_path):
+        """测试租约过期的任务重新排队，重试次数用尽后置为失败"""
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        job_id = store.submit("echo", {})
+
+        store.claim(["echo"], lease_seconds=-1)
+        assert store.recover_expired(max_attempts=2) == 1
+        assert store.get(job_id)["status"] == JOB_QUEUED
+
+        store.claim(["echo"], lease_seconds=-1)
+        store.recover_expired(max_attempts=2)
+        assert store.get(job_id)["status"] == JOB_FAILED
+
+    def test_purge_finished(self, tmp_path):
+        """测试只清理已结束且超过保留时长的任务"""
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        done = store.submit("echo", {"path": "a"})
+        pending = store.submit("echo", {})
+        store.finish(done, {})
+        time.sleep(0.01)
+
+        purged = store.purge_finished(older_than_seconds=0)
+        assert [job["id"] for job in purged] == [done]
+        assert store.get(done) is None
+        assert store.get(pending) is not None
+
+
+class TestJobQueue:
+    """测试 worker 执行任务"""
+
+    def _queue(self, tmp_path) -> JobQueue:
+        queue = JobQueue()
+        queue.configure({"db_path": str(tmp_path / "jobs.sqlite3"), "workers": 2, "poll_interval_seconds": 0.05})
+        return queue
+
+    def test_worker_runs_handler_and_cleanup(self, tmp_path):
+        """测试提交后由 worker 执行，成功与失败都会调用清理函数"""
+        cleaned = []
+
+        async def handler(payload):
+            if payload.get("fail"):
+                raise ValueError("bad input")
+            return {"echo": payload["n"]}
+
+        async def scenario():
+            queue = self._queue(tmp_path)
+            queue.register("echo", handler, cleanup=lambda payload: cleaned.append(payload["n"]))
+            await queue.start()
+            try:
+                ok = await queue.submit("echo", {"n": 1})
+                bad = await queue.submit("echo", {"n": 2, "fail": True})
+                for job_id in (ok, bad):
+                    for _ in range(100):
+                        if (await queue.get(job_id))["status"] in (JOB_SUCCEEDED, JOB_FAILED):
+                            break
+                        await queue.wait_for_change(job_id, 0.05)
+                return await queue.get(ok), await queue.get(bad)
+            finally:
+                await queue.stop()
+
+        ok, bad = asyncio.run(scenario())
+        assert ok["status"] == JOB_SUCCEEDED
+        assert ok["result"] == {"echo": 1}
+        assert bad["status"] == JOB_FAILED
+        assert bad["error"] == "bad input"
+        assert sorted(cleaned) == [1, 2]
+
+    def test_wait_for_change_cleans_up(self, tmp_path):
+        """测试等待结束（超时或被通知）后不残留等待条目"""
+        queue = self._queue(tmp_path)
+
+        async def scenario():
+            await queue.wait_for_change("other-process", 0.01)
+            waiters = [asyncio.ensure_future(queue.wait_for_change("local", 1)) for _ in range(2)]
+            await asyncio.sleep(0)
+            queue._notify("local")
+            await asyncio.gather(*waiters)
+
+        asyncio.run(scenario())
+        assert queue._changed == {}
+
+    def test_maintenance_runs_hooks(self, tmp_path):
+        """测试维护时执行注册的清理函数，单个函数失败不影响其他函数"""
+        queue = self._queue(tmp_path)
+        calls = []
+
+        def broken():
+            raise RuntimeError("boom")
+
+        queue.add_maintenance(broken)
+        queue.add_maintenance(lambda: calls.append(1))
+        asyncio.run(queue.run_maintenance())
+        asyncio.run(queue.run_maintenance())
+        assert calls == [1, 1]
+
+    def test_submit_unknown_kind(self, tmp_path):
+        """测试提交未注册的任务类型"""
+        queue = self._queue(tmp_path)
+        with pytest.raises(ValueError):
+            asyncio.run(queue.submit("missing", {}))
+
+    def test_start_requeues_interrupted_jobs(self, tmp_path):
+        """测试启动时恢复上次进程中断的任务"""
+        path = str(tmp_path / "jobs.sqlite3")
+        store = JobStore(path)
+        job_id = store.submit("echo", {"n": 7})
+        store.claim(["echo"], lease_seconds=-1)
+        store.close()
+
+        async def handler(payload):
+            return payload["n"]
+
+        async def scenario():
+            queue = self._queue(tmp_path)
+            queue.register("echo", handler)
+            await queue.start()
+            try:
+                for _ in range(100):
+                    job = await queue.get(job_id)
+                    if job["status"] == JOB_SUCCEEDED:
+                        return job
+                    await asyncio.sleep(0.02)
+            finally:
+                await queue.stop()
+
+        job = asyncio.run(scenario())
+        assert job["result"] == 7
+        assert job["attempts"] == 2
@@ -0,0 +1,158 @@
+"""
+模型注册表测试
+"""
+import threading
+import time
+import pytest
+
+from src.core.model_registry import ModelRegistry
+from src.models.emotion.base import BaseEmotionModel
+
+
+class FakeModel(BaseEmotionModel):
+    """模拟本地模型：记录加载次数"""
+
+    load_calls = 0
+
+    def load_model(self):
+        FakeModel.load_calls += 1
+        self.model = object()
+        self.is_loaded = True
+        return True
+
+    def analyze(self, input_data, during=None):
+        with self._lock:
+            if not self.ensure_loaded():
+                return []
+            if during is not None:
+                during()
+            # 推理中模型被卸载时这里会失败
+            assert self.model is not None
+            return [{"label": "joy", "score": 1.0}]
+
+
+@pytest.fixture(autouse=True)
+def reset_load_calls():
+    FakeModel.load_calls = 0
+    yield
+
+
+class TestModelRegistry:
+    """测试进程级模型注册表"""
+
+    def test_same_config_loads_once(self):
+        """测试相同配置只加载一次并返回同一实例"""
+        registry = ModelRegistry()
+        config = {"name": "paraformer-zh", "local_path": "src/data/models/paraformer-zh"}
+
+        first = registry.get_model("paraformer", config, FakeModel)
+        second = registry.get_model("paraformer", dict(config), FakeModel)
+
+        assert first is second
+        assert FakeModel.load_calls == 1
+
+    def test_different_device_is_separate_entry(self):
+        """测试不同 device 对应不同模型实例"""
+        registry = ModelRegistry()
+        cpu = registry.get_model("text_emotion", {"name": "m", "device": "cpu"}, FakeModel)
+        gpu = registry.get_model("text_emotion", {"name": "m", "device": "cuda:0"}, FakeModel)
+
+        assert cpu is not gpu
+        assert FakeModel.load_calls == 2
+
+    def test_concurrent_get_loads_once(self):
+        """测试并发获取时只加载一次"""
+        registry = ModelRegistry()
+        results = []
+
+        def worker():
+            results.append(registry.get_model("emotion2vec", {"name": "e2v"}, FakeModel))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len({id(m) for m in results}) == 1
+        assert FakeModel.load_calls == 1
+
+    def test_snapshot(self):
+        """测试注册表状态导出"""
+        registry = ModelRegistry()
+        registry.get_model("paraformer", {"name": "p"}, FakeModel)
+        registry.get_model("emotion2vec", {"name": "e"}, FakeModel, load=False)
+
+        snapshot = registry.snapshot()
+
+        assert snapshot["loaded_count"] == 1
+        kinds = {m["kind"]: m for m in snapshot["models"]}
+        assert kinds["paraformer"]["loaded"] is True
+        assert kinds["emotion2vec"]["loaded"] is False
+        assert "total_memory_mb" in snapshot
+
+    def test_lazy_loading(self):
+        """测试懒加载：注册时不加载，首次使用时加载"""
+        registry = ModelRegistry()
+        registry.configure({"lazy_loading": True})
+        model = registry.get_model("text_emotion", {"name": "m"}, FakeModel)
+
+        assert not model.is_model_ready()
+        assert model.analyze("你好") == [{"label": "joy", "score": 1.0}]
+        assert model.is_model_ready()
+        assert registry.snapshot()["models"][0]["load_count"] == 1
+
+    def test_evict_idle_and_reload(self):
+        """测试空闲淘汰后再次使用会重新加载"""
+        registry = ModelRegistry()
+        registry.idle_timeout_seconds = 0.01
+        model = registry.get_model("paraformer", {"name": "p"}, FakeModel)
+        time.sleep(0.02)
+
+        assert registry.evict_idle() == 1
+        assert not model.is_model_ready()
+
+        model.analyze("再次使用")
+        assert model.is_model_ready()
+        assert FakeModel.load_calls == 2
+
+    def test_evict_skips_model_in_use(self):
+        """测试模型推理期间空闲淘汰跳过该模型"""
+        registry = ModelRegistry()
+        registry.idle_timeout_seconds = 0.01
+        model = registry.get_model("paraformer", {"name": "p"}, FakeModel)
+        time.sleep(0.02)
+        evicted = []
+
+        def evict_from_reaper():
+            # 从另一个线程淘汰，与真实的空闲回收线程一致
+            worker = threading.Thread(target=lambda: evicted.append(registry.evict_idle()))
+            worker.start()
+            worker.join()
+
+        # 使用时会刷新 last_used，这里把它拨回到超时之前
+        def stale_then_evict():
+            model.last_used = time.monotonic() - 1
+            evict_from_reaper()
+
+        assert model.analyze("推理中", during=stale_then_evict) == [{"label": "joy", "score": 1.0}]
+        assert evicted == [0]
+        assert model.is_model_ready()
+
+    def test_memory_budget_evicts_lru(self):
+        """测试超出内存预算时按 LRU 顺序卸载模型"""
+        registry = ModelRegistry()
+        a = registry.get_model("paraformer", {"name": "a"}, FakeModel)
+        b = registry.get_model("emotion2vec", {"name": "b"}, FakeModel)
+        c = registry.get_model("text_emotion", {"name": "c"}, FakeModel)
+        for entry in registry.entries():
+            entry.memory_bytes = 100
+        for model in (b, a, c):
+            model.analyze("按顺序使用")
+            time.sleep(0.001)
+
+        registry.memory_budget_bytes = 250
+        assert registry._enforce_budget() == 1
+
+        assert not b.is_model_ready()
+        assert a.is_model_ready() and c.is_model_ready()
@@ -0,0 +1,54 @@
+"""
+流式 ASR 会话测试
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("funasr")
+
+from src.models.asr.paraformer_streaming import ParaformerStreamingModel
+
+
+class FakeStreamingAutoModel:
+    """替代 FunASR 流式模型：记录每次送入的采样数，按调用序号返回文字"""
+
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, input, cache, is_final, **kwargs):
+        self.calls.append((input.shape[0], is_final))
+        cache["steps"] = cache.get("steps", 0) + 1
+        return [{"text": f"字{len(self.calls)}"}]
+
+
+def make_model():
+    model = ParaformerStreamingModel({"chunk_size": [0, 10, 5]})
+    model.model = FakeStreamingAutoModel()
+    model.is_loaded = True
+    return model
+
+
+class TestStreamingASRSession:
+    """测试流式识别会话"""
+
+    def test_chunking(self):
+        """测试凑满 600ms 才识别，余下的采样在结束时送入"""
+        model = make_model()
+        session = model.create_session()
+
+        assert session.feed(np.zeros(5000, dtype=np.float32)) == ""
+        assert session.feed(np.zeros(15000, dtype=np.float32)) == "字1字2"
+        assert session.finish() == "字3"
+
+        assert model.model.calls == [(9600, False), (9600, False), (800, True)]
+        assert session.transcript == "字1字2字3"
+        assert session.waveform.shape == (20000,)
+        assert session.cache["steps"] == 3
+
+    def test_feed_after_finish(self):
+        """测试结束后不能继续送入"""
+        session = make_model().create_session()
+        session.finish()
+
+        with pytest.raises(RuntimeError):
+            session.feed(np.zeros(10, dtype=np.float32))
@@ -0,0 +1,99 @@
+"""
+感知哈希与近似重复索引测试
+"""
+import io
+import random
+
+import numpy as np
+from PIL import Image
+
+from src.utils.image_utils import dhash
+from src.utils.perceptual_hash import MultiIndexHash, PerceptualHashIndex, hamming_distance
+
+
+def make_image(seed: int, size=(256, 192), fmt="PNG", quality=95) -> bytes:
+    """生成带随机色块的测试图片"""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 255, size=(6, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(blocks).resize(size, Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=quality)
+    return buffer.getvalue()
+
+
+class TestDHash:
+    """测试差值感知哈希"""
+
+    def test_recompressed_copy_is_close(self):
+        """测试缩放 + 重新压缩后的同一张图哈希距离很小"""
+        original = dhash(make_image(1))
+        copy = dhash(make_image(1, size=(128, 96), fmt="JPEG", quality=60))
+
+        assert hamming_distance(original, copy) <= 6
+
+    def test_different_images_are_far(self):
+        """测试不同图片哈希距离较大"""
+        assert hamming_distance(dhash(make_image(1)), dhash(make_image(2))) > 10
+
+
+class TestMultiIndexHash:
+    """测试多索引哈希查询"""
+
+    def test_matches_brute_force(self):
+        """测试查询结果与暴力扫描一致"""
+        rng = random.Random(0)
+        hashes = [rng.getrandbits(64) for _ in range(2000)]
+        index = MultiIndexHash(max_distance=8)
+        for i, h in enumerate(hashes):
+            index.add(h, i)
+
+        for _ in range(20):
+            query = hashes[rng.randrange(len(hashes))]
+            for _ in range(rng.randint(1, 8)):
+                query ^= 1 << rng.randrange(64)
+            expected = sorted(hamming_distance(query, h) for h in hashes if hamming_distance(query, h) <= 8)
+
+            assert [d for d, _ in index.search(query)] == expected
+            assert index.nearest(query)[0] == expected[0]
+
+    def test_remove(self):
+        """测试删除后不再命中"""
+        index = MultiIndexHash(max_distance=6)
+        index.add(0b1011, "a")
+        index.remove(0b1011)
+        index.remove(0b1011)
+
+        assert index.nearest(0b1010) is None
+        assert len(index) == 0
+
+    def test_nearest_none_outside_threshold(self):
+        """测试超出阈值时返回 None"""
+        index = MultiIndexHash(max_distance=6)
+        index.add(0, "a")
+
+        assert index.nearest((1 << 7) - 1) is None
+
+
+class TestPerceptualHashIndex:
+    """测试按作用域划分的索引"""
+
+    def test_scopes_are_isolated(self):
+        """测试不同作用域互不命中"""
+        index = PerceptualHashIndex(max_distance=4)
+        index.add("intent-a", 0b1111, "key-a")
+
+        assert index.nearest("intent-a", 0b1110) == (1, "key-a")
+        assert index.nearest("intent-b", 0b1110) is None
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未命中的条目"""
+        index = PerceptualHashIndex(max_distance=0, max_entries=2)
+        index.add("s", 1 << 8, "key-1")
+        index.add("s", 2 << 8, "key-2")
+        index.nearest("s", 1 << 8)
+        index.add("s", 3 << 8, "key-3")
+
+        assert len(index) == 2
+        assert index.nearest("s", 2 << 8) is None
+        assert index.nearest("s", 1 << 8) == (0, "key-1")
+        assert index.nearest("s", 3 << 8) == (0, "key-3")
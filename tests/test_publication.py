@@ -0,0 +1,131 @@
+"""
+图片发布目录（内容寻址 + 签名 URL）测试
+"""
+import io
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+from src.core.publication import PUBLISHED_URL_PREFIX, PublicationStore
+from src.utils.image_utils import ImageInput
+
+
+def _image_bytes(color=(200, 80, 40)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _store(tmp_path, **settings) -> PublicationStore:
+    store = PublicationStore()
+    store.configure({"root": str(tmp_path / "published"), "secret": "s3cret", **settings})
+    return store
+
+
+class TestPublicationStore:
+    """测试发布、签名与过期清理"""
+
+    def test_publish_links_local_file(self, tmp_path):
+        """测试本地文件以硬链接发布，同一内容重复发布不新增文件"""
+        src = tmp_path / "upload.png"
+        src.write_bytes(_image_bytes())
+        store = _store(tmp_path)
+
+        name = store.publish(ImageInput.from_path(str(src)))
+        path = store.path_for(name)
+        assert name.endswith(".png") and len(name) == 64 + 4
+        assert path.read_bytes() == src.read_bytes()
+        assert os.stat(path).st_ino == os.stat(src).st_ino
+
+        # 内存中的同一内容：命中已发布文件；刷新有效期不改动原文件的 mtime
+        stale = time.time() - 3600
+        os.utime(src, (stale, stale))
+        assert store.publish(ImageInput(src.read_bytes())) == name
+        assert len(list(store.root.glob("*/*.png"))) == 1
+        assert os.stat(src).st_mtime == stale
+
+    def test_publish_falls_back_to_copy_or_memory(self, tmp_path, monkeypatch):
+        """测试不支持硬链接时复制，原文件已删除时写入内存中的字节"""
+        src = tmp_path / "upload.png"
+        src.write_bytes(_image_bytes())
+        image = ImageInput.from_path(str(src))
+        store = _store(tmp_path)
+
+        def no_link(*args):
+            raise OSError("跨设备")
+
+        monkeypatch.setattr(os, "link", no_link)
+        path = store.path_for(store.publish(image))
+        assert not path.is_symlink()
+        assert os.stat(path).st_ino != os.stat(src).st_ino
+        assert path.read_bytes() == image.data
+
+        path.unlink()
+        src.unlink()
+        assert store.path_for(store.publish(image)).read_bytes() == image.data
+
+    def test_publish_in_memory_image(self, tmp_path):
+        """测试没有本地路径的图片直接写入"""
+        store = _store(tmp_path)
+        data = _image_bytes((1, 2, 3))
+        assert store.path_for(store.publish(ImageInput(data))).read_bytes() == data
+
+    def test_signed_path_verification(self, tmp_path):
+        """测试签名校验：篡改名称、签名或过期都会被拒绝"""
+        store = _store(tmp_path)
+        name = store.publish(ImageInput(_image_bytes()))
+        url = urlsplit(store.signed_path(name))
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        exp, sig = int(query["exp"]), query["sig"]
+
+        assert url.path == f"{PUBLISHED_URL_PREFIX}/{name}"
+        assert store.verify(name, exp, sig)
+        assert not store.verify(name, exp + 1, sig)
+        assert not store.verify(name, exp, "0" * len(sig))
+        assert not store.verify("../" + name, exp, sig)
+        assert not _store(tmp_path, secret="other").verify(name, exp, sig)
+
+        expired = int(time.time()) - 1
+        assert not store.verify(name, expired, store._sign(name, expired))
+
+    def test_generated_secret_shared(self, tmp_path, monkeypatch):
+        """测试未配置密钥时生成并持久化，其他实例共用"""
+        monkeypatch.delenv("PUBLICATION_SECRET", raising=False)
+        first = _store(tmp_path, secret="")
+        second = _store(tmp_path, secret="")
+        assert first._sign("a.png", 1) == second._sign("a.png", 1)
+
+    def test_sweep_removes_expired(self, tmp_path):
+        """测试只清理超过有效期的文件，重新发布会刷新有效期"""
+        store = _store(tmp_path, ttl_seconds=60)
+        old = store.publish(ImageInput(_image_bytes((1, 1, 1))))
+        fresh = store.publish(ImageInput(_image_bytes((2, 2, 2))))
+        stale = time.time() - 120
+        for name in (old, fresh):
+            os.utime(store._stamp_path(name), (stale, stale))
+        store.publish(ImageInput(_image_bytes((2, 2, 2))))
+
+        assert store.sweep() == 1
+        assert store.path_for(old) is None
+        assert store.path_for(fresh) is not None
+        assert not store._stamp_path(old).exists()
+
+    def test_sweep_keeps_file_republished_meanwhile(self, tmp_path, monkeypatch):
+        """测试清理过程中被重新发布的文件会被放回"""
+        store = _store(tmp_path, ttl_seconds=60)
+        image = ImageInput(_image_bytes())
+        name = store.publish(image)
+        stale = time.time() - 120
+        os.utime(store._stamp_path(name), (stale, stale))
+
+        real_rename = os.rename
+
+        def rename_then_republish(src, dst):
+            real_rename(src, dst)
+            store.publish(image)
+
+        monkeypatch.setattr(os, "rename", rename_then_republish)
+        assert store.sweep() == 0
+        assert store.path_for(name).read_bytes() == image.data
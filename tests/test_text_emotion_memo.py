@@ -0,0 +1,67 @@
+"""
+文本情感结果记忆化测试
+"""
+import pytest
+
+pytest.importorskip("transformers")
+
+from src.core.metrics import get_metrics
+from src.models.emotion.text_emotion import TextEmotionModel
+
+
+class CountingPipeline:
+    """替代 transformers pipeline：记录调用次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text, **kwargs):
+        self.calls += 1
+        return [{"label": "joy", "score": 0.9}]
+
+
+def make_model(memo=True, version=None):
+    config = {"local_path": "models/text", "name": "distilbert", "memo": {"enabled": memo, "max_entries": 2}}
+    if version:
+        config["version"] = version
+    model = TextEmotionModel(config)
+    model.pipeline = CountingPipeline()
+    model.is_loaded = True
+    return model
+
+
+class TestTextEmotionMemo:
+    """测试文本情感记忆化缓存"""
+
+    def test_normalized_text_hits(self):
+        """测试全角 / 空白差异的文本命中同一条缓存"""
+        model = make_model()
+        hits_before = get_metrics().snapshot().get("cache.text_emotion.hits", {}).get("value", 0)
+
+        first = model.analyze("I am so happy!")
+        second = model.analyze("  Ｉ am so  happy！ ")
+
+        assert first == second
+        assert model.pipeline.calls == 1
+        assert get_metrics().snapshot()["cache.text_emotion.hits"]["value"] == hits_before + 1
+
+    def test_result_is_copied(self):
+        """测试修改返回结果不影响缓存"""
+        model = make_model()
+        model.analyze("hello")[0]["label"] = "changed"
+
+        assert model.analyze("hello")[0]["label"] == "joy"
+
+    def test_version_in_key(self):
+        """测试模型版本不同的实例不共享缓存键"""
+        a, b = make_model(version="v1"), make_model(version="v2")
+
+        assert a.model_version != b.model_version
+
+    def test_disabled(self):
+        """测试关闭记忆化时每次都推理"""
+        model = make_model(memo=False)
+        model.analyze("hello")
+        model.analyze("hello")
+
+        assert model.pipeline.calls == 2
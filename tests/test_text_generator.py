@@ -0,0 +1,113 @@
+"""
+文案生成响应缓存测试
+"""
+import asyncio
+
+from src.services.text_generator import TextGenerator
+
+
+class StubConfigManager:
+    """最小配置：只提供 TextGenerator 读取的字段"""
+
+    def __init__(self, cache_cfg):
+        self.config = {
+            "text_generation": {"model_name": "deepseek-chat", "defaults": {"temperature": 0.8}},
+            "cache": {"text_generation": cache_cfg}
+        }
+
+
+class FakeTextGenerator(TextGenerator):
+    """替换远程调用：每次返回带序号的文案，流式调用时按字符逐个产出"""
+
+    def __init__(self, config_manager):
+        super().__init__(config_manager)
+        self.calls = 0
+
+    async def _complete(self, prompt):
+        self.calls += 1
+        return f"文案{self.calls}"
+
+    async def _stream_completion(self, prompt):
+        self.calls += 1
+        for char in f" 文案{self.calls}\n第二行 ":
+            yield char
+
+
+def stream_many(generator, prompts):
+    async def main():
+        results = []
+        for p in prompts:
+            results.append([delta async for delta in generator.stream_text("", [], custom_prompt=p)])
+        return results
+    return asyncio.run(main())
+
+
+def generate_many(generator, prompts):
+    async def main():
+        return [await generator.generate_text("", [], custom_prompt=p) for p in prompts]
+    return asyncio.run(main())
+
+
+class TestTextGeneratorCache:
+    """测试文案响应缓存策略"""
+
+    def test_deterministic_reuse(self, tmp_path):
+        """测试 deterministic 策略：归一化后相同的提示词只调用一次 API"""
+        generator = FakeTextGenerator(StubConfigManager({
+            "enabled": True, "policy": "deterministic", "sqlite_path": str(tmp_path / "t.sqlite3")
+        }))
+
+        results = generate_many(generator, ["海边 日落", "  海边　日落\n", "山间清晨"])
+
+        assert results == ["文案1", "文案1", "文案2"]
+        assert generator.calls == 2
+
+    def test_variants_round_robin(self, tmp_path):
+        """测试 variants 策略：先生成 N 条，之后轮流返回"""
+        generator = FakeTextGenerator(StubConfigManager({
+            "enabled": True, "policy": "variants", "variants": 2
+        }))
+
+        results = generate_many(generator, ["海边日落"] * 5)
+
+        assert results == ["文案1", "文案2", "文案1", "文案2", "文案1"]
+        assert generator.calls == 2
+
+    def test_persistent_tier_survives_restart(self, tmp_path):
+        """测试 SQLite 持久层在重建生成器后仍命中"""
+        cfg = {"enabled": True, "policy": "deterministic", "sqlite_path": str(tmp_path / "t.sqlite3")}
+        generate_many(FakeTextGenerator(StubConfigManager(cfg)), ["海边日落"])
+
+        restarted = FakeTextGenerator(StubConfigManager(cfg))
+
+        assert generate_many(restarted, ["海边日落"]) == ["文案1"]
+        assert restarted.calls == 0
+
+    def test_cache_disabled(self):
+        """测试未启用缓存时每次都调用 API"""
+        generator = FakeTextGenerator(StubConfigManager({"enabled": False}))
+
+        assert generate_many(generator, ["海边日落"] * 2) == ["文案1", "文案2"]
+
+
+class TestTextGeneratorStream:
+    """测试流式文案生成"""
+
+    def test_stream_yields_deltas(self):
+        """测试未命中缓存时逐段产出"""
+        generator = FakeTextGenerator(StubConfigManager({"enabled": False}))
+
+        [deltas] = stream_many(generator, ["海边日落"])
+
+        assert len(deltas) > 1
+        assert "".join(deltas).strip() == "文案1\n第二行"
+
+    def test_stream_fills_and_hits_cache(self):
+        """测试流式结果写入缓存，之后流式 / 非流式调用都直接复用"""
+        generator = FakeTextGenerator(StubConfigManager({"enabled": True, "policy": "deterministic"}))
+
+        first, second = stream_many(generator, ["海边日落", "海边日落"])
+
+        assert second == ["文案1\n第二行"]
+        assert generate_many(generator, ["海边日落"]) == ["文案1\n第二行"]
+        assert generator.calls == 1